@@ -11,6 +11,8 @@ from app.api.deps import get_current_user_optional, get_db
 from app.models.song import Song
 from app.models.song_like import SongLike
 from app.models.user import User
+from app.services.image_variants import thumbnail_url
+from app.services.waveform import waveform_url
 
 router = APIRouter()
 
@@ -35,6 +37,13 @@ def _rows_to_payload(
                 "lyrics": song.lyrics,
                 "audio_url": song.audio_url,
                 "cover_image_url": song.cover_image_url,
+                # Cards should use the thumbnail; the full-size cover is for the player view.
+                "cover_thumbnail_url": thumbnail_url(song.cover_variants, song.cover_image_url),
+                "cover_variants": song.cover_variants,
+                # Hover previews use the short clip; playback prefers the HLS ladder when present.
+                "preview_url": (song.audio_renditions or {}).get("preview"),
+                "hls_url": (song.audio_renditions or {}).get("hls"),
+                "waveform_url": waveform_url(song.waveform),
                 "duration": song.duration,
                 "genre": song.genre,
                 "bpm": song.bpm,
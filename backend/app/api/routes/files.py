@@ -1,14 +1,21 @@
 from __future__ import annotations
 
+import stat
 from pathlib import Path
 
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
+from fastapi import APIRouter, Depends, File, HTTPException, Request, Response, UploadFile, status
 from fastapi.responses import RedirectResponse
+from pydantic import BaseModel
 
 from app.api.deps import get_current_user
+from app.core.config import get_settings
+from app.core.responses import SendfileResponse
 from app.models.file_object import FileObject
 from app.models.user import User
-from app.services.storage_service import get_storage, get_signed_url
+from app.services.direct_upload_service import get_direct_upload_service
+from app.services.local_storage import LocalStorageBackend, local_etag
+from app.services.signed_url_cache import get_cached_signed_url_async
+from app.services.storage_service import UploadTooLargeError, get_storage
 from sqlmodel import Session
 
 from app.api.deps import get_db
@@ -16,32 +23,125 @@ from app.api.deps import get_db
 router = APIRouter()
 
 
+class UploadUrlRequest(BaseModel):
+    filename: str
+    content_type: str
+    size: int
+
+
+class UploadConfirmRequest(BaseModel):
+    key: str
+
+
+def issue_upload_url(*, user: User, purpose: str, payload: UploadUrlRequest) -> dict:
+    """Shared by /files/upload-url and the avatar/background upload-url routes."""
+    try:
+        ticket = get_direct_upload_service().create_upload(
+            user_id=user.id,
+            purpose=purpose,
+            filename=payload.filename,
+            content_type=payload.content_type,
+            size=payload.size,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return {
+        "key": ticket.key,
+        "upload_url": ticket.upload_url,
+        "method": ticket.method,
+        "headers": ticket.headers,
+        "expires_in": ticket.expires_in,
+        "max_bytes": ticket.max_bytes,
+    }
+
+
+def confirm_direct_upload(*, user: User, purpose: str, key: str):
+    """Verify a direct upload; maps service errors to HTTP errors."""
+    try:
+        return get_direct_upload_service().confirm_upload(user_id=user.id, key=key, purpose=purpose)
+    except LookupError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except PermissionError as e:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/upload-url")
+def create_file_upload_url(
+    payload: UploadUrlRequest,
+    user: User = Depends(get_current_user),
+) -> dict:
+    """Step 1 of a direct upload: presigned PUT URL the browser sends the file to."""
+    return issue_upload_url(user=user, purpose="file", payload=payload)
+
+
+@router.post("/upload-confirm")
+def confirm_file_upload(
+    payload: UploadConfirmRequest,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+) -> dict:
+    """Step 2 of a direct upload: verify the object in R2 and record the FileObject."""
+    uploaded = confirm_direct_upload(user=user, purpose="file", key=payload.key)
+    fo = FileObject(
+        user_id=user.id,
+        key=uploaded.key,
+        content_type=uploaded.content_type,
+        original_filename=uploaded.original_filename,
+        status="draft",
+    )
+    db.add(fo)
+    db.commit()
+    db.refresh(fo)
+
+    return {
+        "id": str(fo.id),
+        "key": fo.key,
+        "status": fo.status,
+        "content_type": fo.content_type,
+        "original_filename": fo.original_filename,
+        "size": uploaded.size,
+    }
+
+
 @router.post("/upload")
 async def upload_file(
     file: UploadFile = File(...),
+    db: Session = Depends(get_db),
     user: User = Depends(get_current_user),
 ) -> dict:
-    # NOTE: `user` is currently unused; we still require auth to prevent anonymous uploads.
+    """
+    Proxied upload for clients that cannot PUT to R2 directly (e.g. WeChat webviews).
+    The body is streamed to R2 in multipart parts off the event loop, hashed as it goes.
+    """
     if not file.filename:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Missing filename")
 
-    content = await file.read()
-    if not content:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Empty file")
-
     suffix = Path(file.filename).suffix or ""
+    content_type = file.content_type or "application/octet-stream"
     try:
-        stored = get_storage().store_bytes(
-            content=content, suffix=suffix, content_type=file.content_type or "application/octet-stream"
+        stored = await get_storage().store_stream_async(
+            file.file,
+            suffix=suffix,
+            content_type=content_type,
+            max_bytes=get_settings().upload_max_file_mb * 1024 * 1024,
         )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
     except RuntimeError as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-    db: Session = get_db()
     fo = FileObject(
         user_id=user.id,
         key=stored.key,
-        content_type=file.content_type or "application/octet-stream",
+        content_type=content_type,
         original_filename=file.filename,
         status="draft",
     )
@@ -55,17 +155,53 @@ async def upload_file(
         "status": fo.status,
         "content_type": fo.content_type,
         "original_filename": fo.original_filename,
+        "size": stored.size,
+        "sha256": stored.sha256,
     }
 
 
-@router.get("/{key}")
-async def get_file(key: str):
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return etag in tags or f"W/{etag}" in tags
+
+
+def _serve_local_file(request: Request, storage: LocalStorageBackend, key: str) -> Response:
+    try:
+        path = storage.path_for(key)
+        stat_result = path.stat()
+    except (ValueError, FileNotFoundError):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+    if not stat.S_ISREG(stat_result.st_mode):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+
+    etag = local_etag(stat_result)
+    # Keys are unique per upload, so content under a key never changes in place.
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return SendfileResponse(path, stat_result=stat_result, headers=headers)
+
+
+@router.api_route("/{key:path}", methods=["GET", "HEAD"])
+async def get_file(key: str, request: Request):
     """
-    Serve R2 files via short-lived signed URL redirect.
-    Raises 500 if R2 credentials are missing or signing fails.
+    Serve a stored file.
+
+    Local storage: streamed from disk with Range, ETag and If-None-Match support.
+    R2: redirect to a short-lived signed URL. The signed URL is cached, so repeat
+    requests get the same redirect and Cache-Control lets browsers/CDNs reuse it
+    until shortly before it expires. Raises 500 if R2 credentials are missing or
+    signing fails.
     """
+    storage = get_storage()
+    if isinstance(storage, LocalStorageBackend):
+        return _serve_local_file(request, storage, key)
+
     try:
-        url = get_signed_url(key)
+        signed = await get_cached_signed_url_async(key)
     except RuntimeError as e:
         raise HTTPException(status_code=500, detail=str(e))
-    return RedirectResponse(url)
+    return RedirectResponse(signed.url, headers={"Cache-Control": signed.cache_control()})
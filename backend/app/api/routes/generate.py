@@ -1,6 +1,5 @@
 from __future__ import annotations
 
-import asyncio
 import json
 import os
 import time
@@ -13,7 +12,8 @@ from sqlmodel import Session
 
 from app.api.deps import get_current_user, get_db
 from app.models.user import User
-from app.services.progress_service import get_task, init_task
+from app.services.progress_service import event_id_key, get_task_async, init_task, read_task_events, subscribe_task
+from app.services.worker_registry import generation_worker_available
 from app.tasks.music_generation import run_generation_task
 
 router = APIRouter()
@@ -146,6 +146,13 @@ def create_generation(
             else:
                 genre = None
 
+    # Celery jobs need a warm worker to pick them up (RUNPOD mode runs in this process).
+    if os.getenv("FLUXSCHNELL", "").strip().upper() != "RUNPOD" and not generation_worker_available():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="No generation worker is ready yet. Please try again shortly.",
+        )
+
     # Simple credits gate for MVP - each song costs 2 credits
     if user.credits_balance < 2:
         raise HTTPException(status_code=status.HTTP_402_PAYMENT_REQUIRED, detail="Insufficient credits. Each song costs 2 credits.")
@@ -236,50 +243,97 @@ async def generation_events(
     request: Request,
     user: User = Depends(get_current_user),
 ) -> EventSourceResponse:
+    # EventSource sends Last-Event-ID on automatic reconnects; allow a query param for manual resumes.
+    last_event_id = request.headers.get("last-event-id") or request.query_params.get("last_event_id")
+    if last_event_id and event_id_key(last_event_id) < (0, 0):
+        last_event_id = None
+
     async def event_gen() -> AsyncGenerator[dict, None]:
         last_payload: Optional[str] = None
+        last_sent_id = event_id_key(last_event_id) if last_event_id else None
         max_wait_seconds = 300  # 5 minutes timeout
         start_time = time.time()
-        
-        try:
-            while True:
-                if await request.is_disconnected():
-                    break
+        subscription = None
 
-                # Timeout check
-                elapsed = time.time() - start_time
-                if elapsed > max_wait_seconds:
-                    yield {"event": "error", "data": json.dumps({"detail": "timeout waiting for task completion"})}
-                    break
+        def _progress_event(st: Dict[str, Any]) -> dict:
+            event = {"event": "progress", "data": json.dumps(st, ensure_ascii=False)}
+            if st.get("event_id"):
+                event["id"] = st["event_id"]
+            return event
 
+        try:
+            # Subscribe before reading the snapshot so no update published in between is lost.
+            try:
+                subscription = await subscribe_task(task_id)
+                state = await get_task_async(task_id)
+            except Exception as e:
+                yield {"event": "error", "data": json.dumps({"detail": f"failed to get task: {str(e)}"})}
+                return
+
+            if state is None:
+                yield {"event": "error", "data": json.dumps({"detail": "task not found"})}
+                return
+
+            # Basic ownership check
+            if str(state.get("user_id")) != str(user.id):
+                yield {"event": "error", "data": json.dumps({"detail": "not found"})}
+                return
+
+            if last_event_id:
+                # Resume: replay transitions the client missed while disconnected.
                 try:
-                    state = get_task(task_id)
-                except Exception as e:
-                    yield {"event": "error", "data": json.dumps({"detail": f"failed to get task: {str(e)}"})}
-                    break
-
-                if state is None:
-                    yield {"event": "error", "data": json.dumps({"detail": "task not found"})}
-                    break
-
-                # Basic ownership check
-                if str(state.get("user_id")) != str(user.id):
-                    yield {"event": "error", "data": json.dumps({"detail": "not found"})}
-                    break
+                    missed = await read_task_events(task_id, after_id=last_event_id)
+                except Exception:
+                    missed = []
+                for st in missed:
+                    yield _progress_event(st)
+                    last_sent_id = event_id_key(st.get("event_id"))
+                    last_payload = json.dumps(st, ensure_ascii=False)
+                    state = st
+                if missed and state.get("status") in ("completed", "failed"):
+                    return
+                if not missed and event_id_key(state.get("event_id")) <= last_sent_id:
+                    # Nothing new since the client's last event; don't resend the snapshot.
+                    last_payload = json.dumps(state, ensure_ascii=False)
+                    if state.get("status") in ("completed", "failed"):
+                        return
 
+            while True:
                 data = json.dumps(state, ensure_ascii=False)
-                # Always yield on first iteration, then only when state changes
+                # Always yield the snapshot, then only when state changes
                 if last_payload is None or data != last_payload:
-                    yield {"event": "progress", "data": data}
+                    yield _progress_event(state)
                     last_payload = data
 
                 if state.get("status") in ("completed", "failed"):
                     break
 
-                await asyncio.sleep(1.0)
+                # Wait for the next published state; wake up at least once a second
+                # to notice client disconnects and the overall timeout.
+                next_state = None
+                while next_state is None:
+                    if await request.is_disconnected():
+                        return
+                    if time.time() - start_time > max_wait_seconds:
+                        yield {"event": "error", "data": json.dumps({"detail": "timeout waiting for task completion"})}
+                        return
+                    next_state = await subscription.get(timeout=1.0)
+                    if (
+                        next_state is not None
+                        and last_sent_id is not None
+                        and next_state.get("event_id")
+                        and event_id_key(next_state["event_id"]) <= last_sent_id
+                    ):
+                        # Already delivered during replay.
+                        next_state = None
+                state = next_state
         except Exception as e:
             yield {"event": "error", "data": json.dumps({"detail": f"unexpected error: {str(e)}"})}
+        finally:
+            if subscription is not None:
+                try:
+                    await subscription.aclose()
+                except Exception:
+                    pass
 
     return EventSourceResponse(event_gen())
-
-
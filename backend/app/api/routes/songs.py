@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from pydantic import BaseModel
 from sqlalchemy import delete, or_
 from sqlmodel import Session, select
@@ -12,6 +12,12 @@ from app.models.playlist_song import PlaylistSong
 from app.models.song import Song, SongCreate, SongPublic
 from app.models.song_like import SongLike
 from app.models.user import User
+from app.services.audio_renditions import rendition_urls
+from app.services.content_store import key_from_url, release_url
+from app.services.image_variants import variant_urls
+from app.services.storage_service import get_storage
+from app.services.waveform import CONTENT_TYPE as WAVEFORM_CONTENT_TYPE
+from app.services.waveform import waveform_url, waveform_urls
 
 router = APIRouter()
 
@@ -114,6 +120,34 @@ def get_song(
     return song_public
 
 
+@router.get("/{song_id}/waveform")
+def get_song_waveform(
+    song_id: UUID,
+    points: int | None = None,
+    db: Session = Depends(get_db),
+    user: User | None = Depends(get_current_user_optional),
+) -> Response:
+    """
+    Min/max peaks as an audiowaveform .dat blob (a few KB), so players can draw the
+    waveform without downloading the audio. `points` picks a resolution (default: smallest).
+    """
+    song = db.get(Song, song_id)
+    if not song or (not song.is_public and (not user or song.user_id != user.id)):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Song not found")
+    url = waveform_url(song.waveform, points)
+    storage = get_storage()
+    key = key_from_url(storage, url)
+    blob = storage.get_bytes(key) if key else None
+    if blob is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Waveform not available")
+    scope = "public" if song.is_public else "private"
+    return Response(
+        content=blob,
+        media_type=WAVEFORM_CONTENT_TYPE,
+        headers={"Cache-Control": f"{scope}, max-age=86400"},
+    )
+
+
 @router.post("/{song_id}/like")
 def toggle_like_song(
     song_id: UUID,
@@ -212,9 +246,21 @@ def delete_song(
     # Explicitly remove likes in one statement so rows are cleaned up before deleting the song.
     db.exec(delete(SongLike).where(SongLike.song_id == song_id))
 
+    stored_urls = (
+        song.audio_url,
+        song.cover_image_url,
+        *variant_urls(song.cover_variants),
+        *rendition_urls(song.audio_renditions),
+        *waveform_urls(song.waveform),
+    )
     db.delete(song)
     db.commit()
 
+    # Content-addressed objects may be shared; drop this song's references and let GC decide.
+    storage = get_storage()
+    for url in stored_urls:
+        release_url(storage, url)
+
 
 @router.get("/user/{user_id}/public", response_model=list[SongPublic])
 def get_public_songs_by_user(
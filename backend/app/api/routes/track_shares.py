@@ -18,6 +18,7 @@ from sqlmodel import Session, select
 
 from app.api.deps import get_current_user, get_db
 from app.core.config import get_settings
+from app.core.http_clients import get_http_client
 from app.models.song import Song
 from app.models.user import User
 
@@ -220,12 +221,10 @@ def revalidate_share(
 
     # Purge Vercel CDN cache for this specific path
     try:
-        import httpx
         revalidate_url = f"{site_url}/api/revalidate"
-        httpx.post(
+        get_http_client("share_app").post(
             revalidate_url,
             json={"slug": slug},
-            timeout=10,
         )
     except Exception:
         # Non-fatal: log but don't fail the request
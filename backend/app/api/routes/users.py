@@ -4,14 +4,20 @@ from uuid import UUID
 from pathlib import Path
 
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy import text
 from sqlalchemy.exc import IntegrityError
 from sqlmodel import Session, select
 
 from app.api.deps import get_current_user, get_current_user_optional, get_db
+from app.api.routes.files import UploadConfirmRequest, UploadUrlRequest, confirm_direct_upload, issue_upload_url
+from app.core.config import get_settings
 from app.models.user import User, UserPublic, UserPublicProfile, UserPublicCompact, UserUpdate
 from app.models.user_follow import UserFollow
-from app.services.storage_service import get_storage
+from app.services.content_store import release_url
+from app.services.image_variants import variant_urls
+from app.services.storage_service import UploadTooLargeError, get_storage
+from app.tasks.image_variants import schedule_image_variants
 
 router = APIRouter()
 
@@ -77,6 +83,44 @@ def update_me(
         )
 
 
+def _replace_profile_image(db: Session, user: User, attr: str, url: str) -> None:
+    """
+    Point `attr` (avatar_url / background_url) at the new image, queue its resized
+    variants, and hand the previous image and variants to storage GC.
+    """
+    kind = attr.removesuffix("_url")
+    variants_attr = f"{kind}_variants"
+    previous = getattr(user, attr)
+    previous_variants = getattr(user, variants_attr)
+    setattr(user, attr, url)
+    setattr(user, variants_attr, None)
+    db.add(user)
+    db.commit()
+    db.refresh(user)
+    schedule_image_variants(kind, user.id, url)
+    if previous and previous != url:
+        storage = get_storage()
+        for old_url in [previous, *variant_urls(previous_variants)]:
+            release_url(storage, old_url)
+
+
+async def _store_image_upload(file: UploadFile, suffix: str):
+    """Stream an image upload to storage, enforcing upload_max_image_mb."""
+    try:
+        return await get_storage().store_stream_async(
+            file.file,
+            suffix=suffix,
+            content_type=file.content_type or "image/jpeg",
+            max_bytes=get_settings().upload_max_image_mb * 1024 * 1024,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.post("/me/avatar")
 async def upload_avatar(
     file: UploadFile = File(...),
@@ -89,17 +133,10 @@ async def upload_avatar(
     if not file.content_type or not file.content_type.startswith("image/"):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Only image files are allowed")
 
-    content = await file.read()
-    if not content:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Empty file")
-
     suffix = Path(file.filename).suffix or ".jpg"
-    stored = get_storage().store_bytes(content=content, suffix=suffix, content_type=file.content_type or "image/jpeg")
+    stored = await _store_image_upload(file, suffix)
 
-    user.avatar_url = stored.url
-    db.add(user)
-    db.commit()
-    db.refresh(user)
+    await run_in_threadpool(_replace_profile_image, db, user, "avatar_url", stored.url)
 
     return {"avatar_url": user.avatar_url}
 
@@ -116,17 +153,54 @@ async def upload_background(
     if not file.content_type or not file.content_type.startswith("image/"):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Only image files are allowed")
 
-    content = await file.read()
-    if not content:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Empty file")
-
     suffix = Path(file.filename).suffix or ".jpg"
-    stored = get_storage().store_bytes(content=content, suffix=suffix, content_type=file.content_type or "image/jpeg")
+    stored = await _store_image_upload(file, suffix)
 
-    user.background_url = stored.url
-    db.add(user)
-    db.commit()
-    db.refresh(user)
+    await run_in_threadpool(_replace_profile_image, db, user, "background_url", stored.url)
+
+    return {"background_url": user.background_url}
+
+
+@router.post("/me/avatar/upload-url")
+def create_avatar_upload_url(
+    payload: UploadUrlRequest,
+    user: User = Depends(get_current_user),
+) -> dict:
+    """Presigned PUT URL for uploading an avatar straight to storage."""
+    return issue_upload_url(user=user, purpose="avatar", payload=payload)
+
+
+@router.post("/me/avatar/confirm")
+def confirm_avatar_upload(
+    payload: UploadConfirmRequest,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+) -> dict:
+    """Verify a direct avatar upload and set it on the current user."""
+    uploaded = confirm_direct_upload(user=user, purpose="avatar", key=payload.key)
+    _replace_profile_image(db, user, "avatar_url", uploaded.url)
+
+    return {"avatar_url": user.avatar_url}
+
+
+@router.post("/me/background/upload-url")
+def create_background_upload_url(
+    payload: UploadUrlRequest,
+    user: User = Depends(get_current_user),
+) -> dict:
+    """Presigned PUT URL for uploading a profile background straight to storage."""
+    return issue_upload_url(user=user, purpose="background", payload=payload)
+
+
+@router.post("/me/background/confirm")
+def confirm_background_upload(
+    payload: UploadConfirmRequest,
+    db: Session = Depends(get_db),
+    user: User = Depends(get_current_user),
+) -> dict:
+    """Verify a direct background upload and set it on the current user."""
+    uploaded = confirm_direct_upload(user=user, purpose="background", key=payload.key)
+    _replace_profile_image(db, user, "background_url", uploaded.url)
 
     return {"background_url": user.background_url}
 
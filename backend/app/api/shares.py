@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlmodel import Session
 
 from app.api.deps import get_current_user, get_db
@@ -50,14 +50,21 @@ def revoke_share(
 @router.get("/{slug}")
 def resolve_share(
     slug: str,
+    response: Response,
     db: Session = Depends(get_db),
 ) -> dict:
     service = ShareService(db)
     try:
-        return service.resolve(slug)
+        resolved = service.resolve(slug)
     except LookupError as e:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
     except PermissionError as e:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=str(e))
 
+    # Clients may reuse the resolved content URL while both the signature and the
+    # share are still valid; local-storage URLs carry no expiry and are not cached.
+    max_age = resolved.get("content_url_max_age")
+    response.headers["Cache-Control"] = f"private, max-age={max_age}" if max_age else "no-store"
+    return resolved
+
 
@@ -5,11 +5,11 @@ import secrets
 import time
 from typing import Optional
 
-import httpx
 from fastapi import APIRouter, Depends, HTTPException, Query, status
 
 from app.core.cache import get_redis
 from app.core.config import get_settings
+from app.core.http_clients import get_async_http_client
 
 router = APIRouter()
 
@@ -20,12 +20,11 @@ async def _get_wechat_access_token(app_id: str, app_secret: str) -> str:
     if cached:
         return cached
 
-    async with httpx.AsyncClient(timeout=5.0) as client:
-        resp = await client.get(
-            "https://api.weixin.qq.com/cgi-bin/token",
-            params={"grant_type": "client_credential", "appid": app_id, "secret": app_secret},
-        )
-        data = resp.json()
+    resp = await get_async_http_client("wechat").get(
+        "https://api.weixin.qq.com/cgi-bin/token",
+        params={"grant_type": "client_credential", "appid": app_id, "secret": app_secret},
+    )
+    data = resp.json()
     if "access_token" not in data:
         raise HTTPException(
             status_code=status.HTTP_502_BAD_GATEWAY,
@@ -43,12 +42,11 @@ async def _get_wechat_jsapi_ticket(access_token: str) -> str:
     if cached:
         return cached
 
-    async with httpx.AsyncClient(timeout=5.0) as client:
-        resp = await client.get(
-            "https://api.weixin.qq.com/cgi-bin/ticket/getticket",
-            params={"access_token": access_token, "type": "jsapi"},
-        )
-        data = resp.json()
+    resp = await get_async_http_client("wechat").get(
+        "https://api.weixin.qq.com/cgi-bin/ticket/getticket",
+        params={"access_token": access_token, "type": "jsapi"},
+    )
+    data = resp.json()
     if data.get("errcode") != 0:
         raise HTTPException(
             status_code=status.HTTP_502_BAD_GATEWAY,
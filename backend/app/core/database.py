@@ -60,6 +60,16 @@ def run_migrations() -> None:
         inspector = inspect(raw_engine)
         songs_columns = {col["name"] for col in inspector.get_columns("songs")}
         users_columns = {col["name"] for col in inspector.get_columns("users")}
+        columns_by_table = {"songs": songs_columns, "users": users_columns}
+
+        def has_columns(table: str, column_hint) -> bool:
+            # A hint is one column or a tuple of them; "table.column" names a column in another table.
+            hints = (column_hint,) if isinstance(column_hint, str) else column_hint
+            for hint in hints:
+                hint_table, _, column = hint.rpartition(".")
+                if column not in columns_by_table[hint_table or table]:
+                    return False
+            return True
 
         migration_modules = [
             ("migrate_add_username_unique", "users", None),
@@ -67,14 +77,21 @@ def run_migrations() -> None:
             ("migrate_add_background_url_column", "users", "background_url"),
             ("migrate_update_credits_to_1000", None, None),
             ("migrate_add_track_share_slug", "songs", "share_slug"),
+            (
+                "migrate_add_image_variant_columns",
+                "users",
+                ("avatar_variants", "background_variants", "songs.cover_variants"),
+            ),
+            ("migrate_add_audio_renditions_column", "songs", "audio_renditions"),
+            ("migrate_add_waveform_column", "songs", "waveform"),
         ]
 
         for migration_name, table, column_hint in migration_modules:
             # Skip if the migration's target column already exists
             if column_hint:
-                table_columns = songs_columns if table == "songs" else users_columns
-                if column_hint in table_columns:
-                    logger.info(f"Migration {migration_name}: column '{column_hint}' already exists, skipping")
+                if has_columns(table, column_hint):
+                    label = column_hint if isinstance(column_hint, str) else ", ".join(column_hint)
+                    logger.info(f"Migration {migration_name}: column '{label}' already exists, skipping")
                     continue
             try:
                 logger.info(f"Running migration: {migration_name}")
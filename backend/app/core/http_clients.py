@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+from typing import Dict, Tuple
+
+import httpx
+
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Outbound providers that get their own connection pool. Keeping them apart means
+# a burst of slow downloads cannot exhaust the connections RunPod status polls need.
+PROVIDERS = ("runpod", "llm", "wechat", "download", "share_app")
+
+_lock = threading.Lock()
+_clients: Dict[str, httpx.Client] = {}
+# Async pools belong to the event loop that opened them, so async clients are keyed by loop.
+_async_clients: Dict[Tuple[str, asyncio.AbstractEventLoop], httpx.AsyncClient] = {}
+_http2_checked = False
+_http2_available = False
+
+
+def _http2_enabled() -> bool:
+    """HTTP/2 needs the optional `h2` package (httpx[http2]); fall back to HTTP/1.1 without it."""
+    global _http2_checked, _http2_available
+    if not get_settings().http2_enabled:
+        return False
+    if not _http2_checked:
+        try:
+            import h2  # noqa: F401
+
+            _http2_available = True
+        except ImportError:
+            logger.warning("[http_clients] h2 is not installed; outbound HTTP uses HTTP/1.1 (pip install 'httpx[http2]')")
+            _http2_available = False
+        _http2_checked = True
+    return _http2_available
+
+
+def _client_options(provider: str) -> dict:
+    if provider not in PROVIDERS:
+        raise ValueError(f"unknown HTTP provider: {provider}")
+    s = get_settings()
+    timeout_seconds = {
+        "runpod": float(s.runpod_request_timeout_seconds or 30),
+        "llm": float(s.http_llm_timeout_seconds),
+        "wechat": float(s.http_wechat_timeout_seconds),
+        "download": float(s.http_download_timeout_seconds),
+        "share_app": float(s.http_share_app_timeout_seconds),
+    }[provider]
+    max_connections = {
+        "runpod": s.http_runpod_max_connections,
+        "llm": s.http_llm_max_connections,
+        "wechat": s.http_wechat_max_connections,
+        "download": s.http_download_max_connections,
+        "share_app": s.http_share_app_max_connections,
+    }[provider]
+    return {
+        "timeout": httpx.Timeout(timeout_seconds, connect=min(timeout_seconds, 10.0)),
+        "limits": httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=float(s.http_keepalive_expiry_seconds),
+        ),
+        "http2": _http2_enabled(),
+        "follow_redirects": provider == "download",
+    }
+
+
+def get_http_client(provider: str) -> httpx.Client:
+    """Long-lived, pooled sync client for `provider`. Safe to share across threads."""
+    client = _clients.get(provider)
+    if client is not None and not client.is_closed:
+        return client
+    with _lock:
+        client = _clients.get(provider)
+        if client is None or client.is_closed:
+            client = httpx.Client(**_client_options(provider))
+            _clients[provider] = client
+        return client
+
+
+def get_async_http_client(provider: str) -> httpx.AsyncClient:
+    """
+    Long-lived, pooled async client for `provider` on the running event loop.
+
+    Async connection pools belong to the event loop that opened them, so each loop
+    gets its own client; close them with aclose_http_clients() before the loop exits.
+    """
+    loop = asyncio.get_running_loop()
+    key = (provider, loop)
+    client = _async_clients.get(key)
+    if client is not None and not client.is_closed:
+        return client
+    options = _client_options(provider)
+    with _lock:
+        client = _async_clients.get(key)
+        if client is None or client.is_closed:
+            _drop_dead_loops()
+            client = httpx.AsyncClient(**options)
+            _async_clients[key] = client
+        return client
+
+
+def _drop_dead_loops() -> None:
+    # Caller holds _lock. A client whose loop has closed can no longer be aclose()d;
+    # forget it so it is not kept alive here, and say so: its owner skipped aclose_http_clients().
+    for (provider, loop), client in list(_async_clients.items()):
+        if loop.is_closed():
+            del _async_clients[(provider, loop)]
+            if not client.is_closed:
+                logger.warning("[http_clients] async %s client outlived its event loop without aclose_http_clients()", provider)
+
+
+def _close_async_client(loop: asyncio.AbstractEventLoop, client: httpx.AsyncClient) -> None:
+    """Close `client` on the loop that owns it, from a thread that is not running that loop."""
+    if client.is_closed or loop.is_closed():
+        return
+    try:
+        if loop.is_running():
+            asyncio.run_coroutine_threadsafe(client.aclose(), loop).result(timeout=5)
+        else:
+            loop.run_until_complete(client.aclose())
+    except Exception as e:
+        logger.warning("[http_clients] error closing async client: %s", e)
+
+
+def close_http_clients() -> None:
+    """
+    Close the sync clients and the async clients of every loop other than the running
+    one (Celery worker shutdown, FastAPI shutdown via aclose_http_clients).
+    """
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+        async_clients = [(loop, c) for (_, loop), c in _async_clients.items() if loop is not running]
+        for key in [k for k in _async_clients if k[1] is not running]:
+            del _async_clients[key]
+    for client in clients:
+        try:
+            client.close()
+        except Exception as e:
+            logger.warning("[http_clients] error closing client: %s", e)
+    for loop, client in async_clients:
+        _close_async_client(loop, client)
+
+
+async def aclose_http_clients() -> None:
+    """Close the async clients that belong to the running loop, then everything else."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        own = [(key, c) for key, c in _async_clients.items() if key[1] is loop]
+        for key, _ in own:
+            del _async_clients[key]
+    for _, client in own:
+        try:
+            await client.aclose()
+        except Exception as e:
+            logger.warning("[http_clients] error closing async client: %s", e)
+    close_http_clients()
@@ -0,0 +1,187 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Set
+
+from app.core.cache import get_redis_async
+
+logger = logging.getLogger(__name__)
+
+
+class HubSubscription:
+    """
+    One consumer's view of a hub key.
+
+    Frames are buffered in a bounded deque. When the buffer is full the oldest
+    non-terminal frame is dropped (every frame carries the full state, so the
+    consumer only loses intermediate steps). Terminal frames are never dropped.
+    """
+
+    def __init__(self, hub: "PubSubHub", key: str, *, max_frames: int) -> None:
+        self.hub = hub
+        self.key = key
+        self.max_frames = max_frames
+        self.dropped = 0
+        self._frames: Deque[tuple[Any, bool]] = deque()
+        self._ready = asyncio.Event()
+        self._closed = False
+
+    def _push(self, frame: Any, *, terminal: bool) -> int:
+        dropped = 0
+        while len(self._frames) >= self.max_frames:
+            idx = next((i for i, (_, t) in enumerate(self._frames) if not t), None)
+            if idx is None:
+                break
+            del self._frames[idx]
+            dropped += 1
+        if not terminal and len(self._frames) >= self.max_frames:
+            # Buffer is full of terminal frames; the new intermediate frame is the one to go.
+            dropped += 1
+        else:
+            self._frames.append((frame, terminal))
+        self.dropped += dropped
+        self._ready.set()
+        return dropped
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Any]:
+        """Return the next frame, or None if nothing arrived within `timeout` seconds."""
+        if not self._frames:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                return None
+        if not self._frames:
+            return None
+        frame, _ = self._frames.popleft()
+        return frame
+
+    async def aclose(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        await self.hub.unsubscribe(self)
+
+
+class PubSubHub:
+    """
+    Per-process Redis pub/sub multiplexer.
+
+    Holds a single pattern subscription (`{prefix}*`) and fans decoded messages
+    out to in-process subscribers keyed by the channel suffix. The Redis reader
+    runs only while at least one subscriber is registered.
+    """
+
+    def __init__(
+        self,
+        *,
+        prefix: str,
+        max_frames: int = 32,
+        is_terminal: Optional[Callable[[Any], bool]] = None,
+        reconnect_delay_seconds: float = 1.0,
+    ) -> None:
+        self.prefix = prefix
+        self.max_frames = max_frames
+        self.is_terminal = is_terminal or (lambda _frame: False)
+        self.reconnect_delay_seconds = reconnect_delay_seconds
+        self._subs: Dict[str, Set[HubSubscription]] = {}
+        self._reader: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._connected: Optional[asyncio.Event] = None
+        self.dropped_frames = 0
+        self.delivered_frames = 0
+        self.received_messages = 0
+
+    def _bind_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # A new event loop (e.g. a fresh TestClient); asyncio state from the old one is unusable.
+            self._loop = loop
+            self._subs = {}
+            self._reader = None
+            self._connected = asyncio.Event()
+
+    async def subscribe(self, key: str) -> HubSubscription:
+        self._bind_loop()
+        sub = HubSubscription(self, key, max_frames=self.max_frames)
+        self._subs.setdefault(key, set()).add(sub)
+        if self._reader is None or self._reader.done():
+            self._connected.clear()
+            self._reader = asyncio.create_task(self._run(), name=f"pubsub-hub:{self.prefix}")
+        # Wait for the pattern subscription so frames published right after this call are seen.
+        try:
+            await asyncio.wait_for(self._connected.wait(), timeout=5.0)
+        except asyncio.TimeoutError:
+            await sub.aclose()
+            raise RuntimeError(f"pubsub hub failed to subscribe to {self.prefix}*")
+        return sub
+
+    async def unsubscribe(self, sub: HubSubscription) -> None:
+        subs = self._subs.get(sub.key)
+        if subs is not None:
+            subs.discard(sub)
+            if not subs:
+                del self._subs[sub.key]
+        if not self._subs and self._reader is not None and not self._reader.done():
+            self._reader.cancel()
+            try:
+                await self._reader
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._reader = None
+
+    def publish_local(self, key: str, frame: Any) -> None:
+        """Deliver an already-decoded frame to every subscriber of `key`."""
+        subs = self._subs.get(key)
+        if not subs:
+            return
+        terminal = bool(self.is_terminal(frame))
+        for sub in list(subs):
+            self.dropped_frames += sub._push(frame, terminal=terminal)
+            self.delivered_frames += 1
+
+    async def _run(self) -> None:
+        pattern = f"{self.prefix}*"
+        while True:
+            pubsub = get_redis_async().pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.psubscribe(pattern)
+                self._connected.set()
+                while True:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message is None or message.get("type") != "pmessage":
+                        continue
+                    self.received_messages += 1
+                    channel = message.get("channel") or ""
+                    key = channel[len(self.prefix):]
+                    if key not in self._subs:
+                        continue
+                    try:
+                        frame = json.loads(message["data"])
+                    except (TypeError, ValueError):
+                        continue
+                    self.publish_local(key, frame)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("[pubsub_hub] reader for %s failed, reconnecting: %s", pattern, e)
+                await asyncio.sleep(self.reconnect_delay_seconds)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+
+    def metrics(self) -> dict:
+        return {
+            "prefix": self.prefix,
+            "running": self._reader is not None and not self._reader.done(),
+            "keys": len(self._subs),
+            "subscribers": sum(len(s) for s in self._subs.values()),
+            "received_messages": self.received_messages,
+            "delivered_frames": self.delivered_frames,
+            "dropped_frames": self.dropped_frames,
+        }
@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+from starlette.responses import FileResponse
+from starlette.types import Receive, Scope, Send
+
+_ZEROCOPY = "http.response.zerocopysend"
+
+
+class SendfileResponse(FileResponse):
+    """
+    FileResponse that hands the file descriptor to the server (ASGI zerocopysend
+    extension, i.e. sendfile(2)) when the server offers it, so bytes never pass
+    through Python. Other servers get FileResponse's chunked reads with a larger
+    chunk size. Range, If-Range and ETag handling is inherited from FileResponse.
+    """
+
+    chunk_size = 256 * 1024
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self._zerocopy = _ZEROCOPY in (scope.get("extensions") or {})
+        await super().__call__(scope, receive, send)
+
+    async def _send_zerocopy(self, send: Send, offset: int, count: int) -> None:
+        with open(self.path, "rb") as file:
+            await send({"type": _ZEROCOPY, "file": file, "offset": offset, "count": count, "more_body": False})
+
+    async def _handle_simple(self, send: Send, send_header_only: bool) -> None:
+        if send_header_only or not self._zerocopy or self.stat_result is None:
+            return await super()._handle_simple(send, send_header_only)
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        await self._send_zerocopy(send, 0, self.stat_result.st_size)
+
+    async def _handle_single_range(
+        self, send: Send, start: int, end: int, file_size: int, send_header_only: bool
+    ) -> None:
+        if send_header_only or not self._zerocopy:
+            return await super()._handle_single_range(send, start, end, file_size, send_header_only)
+        self.headers["content-range"] = f"bytes {start}-{end - 1}/{file_size}"
+        self.headers["content-length"] = str(end - start)
+        await send({"type": "http.response.start", "status": 206, "headers": self.raw_headers})
+        await self._send_zerocopy(send, start, end - start)
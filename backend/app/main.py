@@ -14,6 +14,10 @@ from app.api import api_router
 from app.core.cache import check_redis
 from app.core.config import get_settings
 from app.core.database import check_db, init_db
+from app.core.http_clients import aclose_http_clients
+from app.services.progress_service import get_progress_hub
+from app.services.runpod_poller import get_runpod_poller
+from app.services.worker_registry import readiness_summary
 
 
 def create_app() -> FastAPI:
@@ -32,11 +36,35 @@ def create_app() -> FastAPI:
     def _startup() -> None:
         init_db()
 
+    def _runpod_poller_wanted() -> bool:
+        return settings.runpod_poller_enabled and (settings.music_generation_backend or "").lower() == "runpod"
+
+    @app.on_event("startup")
+    async def _start_runpod_poller() -> None:
+        if _runpod_poller_wanted():
+            await get_runpod_poller().start()
+
+    @app.on_event("shutdown")
+    async def _stop_runpod_poller() -> None:
+        if _runpod_poller_wanted():
+            await get_runpod_poller().stop()
+
+    @app.on_event("shutdown")
+    async def _close_http_clients() -> None:
+        await aclose_http_clients()
+
     @app.get("/health")
     def health() -> dict:
         db_ok = check_db()
         redis_ok = check_redis()
-        return {"status": "ok" if (db_ok and redis_ok) else "degraded", "db": db_ok, "redis": redis_ok}
+        return {
+            "status": "ok" if (db_ok and redis_ok) else "degraded",
+            "db": db_ok,
+            "redis": redis_ok,
+            "progress_hub": get_progress_hub().metrics(),
+            "runpod_poller": get_runpod_poller().metrics(),
+            "workers": readiness_summary() if redis_ok else {},
+        }
 
     app.include_router(api_router, prefix=settings.api_prefix)
     return app
@@ -5,6 +5,7 @@ from typing import TYPE_CHECKING, Any, ClassVar, Optional
 from uuid import UUID, uuid4
 
 from pydantic import ConfigDict
+from sqlalchemy import JSON, Column
 from sqlmodel import Field, SQLModel
 
 from app.models.playlist_song import PlaylistSong
@@ -27,6 +28,12 @@ class Song(SQLModel, table=True):
 
     audio_url: Optional[str] = None
     cover_image_url: Optional[str] = None
+    # Resized cover variants: {"webp": {"64": url, "256": url, "768": url}, "avif": {...}}
+    cover_variants: Optional[dict] = Field(default=None, sa_column=Column(JSON))
+    # Streaming renditions: {"hls": master.m3u8 url, "preview": 30s clip url, "bitrates": [64, ...], "files": [...]}
+    audio_renditions: Optional[dict] = Field(default=None, sa_column=Column(JSON))
+    # Min/max peaks as audiowaveform .dat blobs: {"sample_rate": 22050, "peaks": {"256": url, "1024": url, ...}}
+    waveform: Optional[dict] = Field(default=None, sa_column=Column(JSON))
 
     duration: int = Field(default=30)  # seconds
     genre: Optional[str] = None
@@ -67,6 +74,9 @@ class SongPublic(SQLModel):
     lyrics: Optional[str] = None
     audio_url: Optional[str] = None
     cover_image_url: Optional[str] = None
+    cover_variants: Optional[dict[str, dict[str, str]]] = None
+    audio_renditions: Optional[dict] = None
+    waveform: Optional[dict] = None
     duration: int
     genre: Optional[str] = None
     bpm: Optional[int] = None
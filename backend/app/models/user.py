@@ -4,6 +4,7 @@ from datetime import datetime, timezone
 from typing import Optional
 from uuid import UUID, uuid4
 
+from sqlalchemy import JSON, Column
 from sqlmodel import Field, SQLModel
 
 
@@ -20,6 +21,9 @@ class User(SQLModel, table=True):
 
     avatar_url: Optional[str] = None
     background_url: Optional[str] = None
+    # Resized variants, same shape as Song.cover_variants
+    avatar_variants: Optional[dict] = Field(default=None, sa_column=Column(JSON))
+    background_variants: Optional[dict] = Field(default=None, sa_column=Column(JSON))
     details: Optional[str] = Field(default="")
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
@@ -57,6 +61,8 @@ class UserPublic(SQLModel):
     username: str
     avatar_url: Optional[str] = None
     background_url: Optional[str] = None
+    avatar_variants: Optional[dict[str, dict[str, str]]] = None
+    background_variants: Optional[dict[str, dict[str, str]]] = None
     details: Optional[str] = None
     subscription_tier: str
     credits_balance: int
@@ -69,6 +75,8 @@ class UserPublicProfile(SQLModel):
     username: str
     avatar_url: Optional[str] = None
     background_url: Optional[str] = None
+    avatar_variants: Optional[dict[str, dict[str, str]]] = None
+    background_variants: Optional[dict[str, dict[str, str]]] = None
     details: Optional[str] = None
     subscription_tier: str
     created_at: datetime
@@ -83,6 +91,7 @@ class UserPublicCompact(SQLModel):
     id: UUID
     username: str
     avatar_url: Optional[str] = None
+    avatar_variants: Optional[dict[str, dict[str, str]]] = None
     details: Optional[str] = None
 
 
@@ -9,7 +9,7 @@ from typing import Callable, Optional
 import replicate
 from dotenv import dotenv_values
 
-from app.services.storage_service import AudioStorageResult, get_storage
+from app.services.storage_service import get_storage
 
 logger = logging.getLogger(__name__)
 
@@ -124,32 +124,13 @@ def _build_replicate_input(params: AceStepApiParams) -> dict:
     return inp
 
 
-def generate_music_via_api(
-    params: AceStepApiParams,
-    *,
-    progress_cb: Optional[ProgressCb] = None,
-    api_base_url: Optional[str] = None,
-) -> tuple[bytes, str]:
+def prepare_replicate_input(params: AceStepApiParams, *, progress_cb: Optional[ProgressCb] = None) -> dict:
     """
-    Generate music using fishaudio/ace-step-1.5 via Replicate API,
-    then upload the result directly to R2 (or local storage).
-
-    Uses replicate.run() which blocks until the prediction completes,
-    polling internally — no manual polling loop needed.
-
-    Args:
-        params:         AceStepApiParams with generation settings.
-        progress_cb:    Optional (progress_pct: int, message: str) callback.
-        api_base_url:   Deprecated — kept for compatibility, ignored.
+    Resolve the generation mode into the final Replicate input dict.
 
-    Returns:
-        (audio_bytes, r2_url) where:
-          - audio_bytes: raw bytes of the generated audio (MP3/WAV/etc.)
-          - r2_url:      public R2/storage URL for direct playback
+    In simple mode without instrumental this calls the LLM to expand
+    sample_query into caption, lyrics and metadata.
     """
-    if api_base_url is not None:
-        logger.warning("[ace_step_api_service] api_base_url is deprecated; using Replicate")
-
     # ── Mode routing ────────────────────────────────────────────────────────────
     # simple + instrumental=True  → [Instrumental]
     # simple + instrumental=False → LLM expand sample_query into caption + lyrics + metas
@@ -222,6 +203,36 @@ def generate_music_via_api(
     if duration != params.audio_duration:
         inp["duration"] = duration
 
+    return inp
+
+
+def generate_music_via_api(
+    params: AceStepApiParams,
+    *,
+    progress_cb: Optional[ProgressCb] = None,
+    api_base_url: Optional[str] = None,
+) -> str:
+    """
+    Generate music using fishaudio/ace-step-1.5 via Replicate API,
+    then stream the result directly into R2 (or local storage).
+
+    Uses replicate.run() which blocks until the prediction completes,
+    polling internally — no manual polling loop needed.
+
+    Args:
+        params:         AceStepApiParams with generation settings.
+        progress_cb:    Optional (progress_pct: int, message: str) callback.
+        api_base_url:   Deprecated — kept for compatibility, ignored.
+
+    Returns:
+        r2_url: public R2/storage URL for direct playback. The audio is piped
+        from Replicate into an R2 multipart upload and never held in memory.
+    """
+    if api_base_url is not None:
+        logger.warning("[ace_step_api_service] api_base_url is deprecated; using Replicate")
+
+    inp = prepare_replicate_input(params, progress_cb=progress_cb)
+
     logger.info(f"[ace_step_api_service] Submitting {params.mode} mode to Replicate ace-step-1.5")
     print(f"[ace_step_api_service] Replicate input: {inp}", flush=True)
 
@@ -246,31 +257,60 @@ def generate_music_via_api(
         raise AceStepApiError(f"Replicate prediction failed: {str(e)}") from e
 
     # Parse output — replicate.run returns a list of file objects
-    try:
-        if not isinstance(output, list) or len(output) == 0:
-            raise AceStepApiError("Unexpected output from Replicate: expected non-empty list")
-
-        audio_file = output[0]
-        audio_bytes = audio_file.read()
-        replicate_url = audio_file.url
-        logger.info(f"[ace_step_api_service] Audio read, size: {len(audio_bytes)} bytes")
-        logger.info(f"[ace_step_api_service] Replicate URL: {replicate_url}")
-    except AceStepApiError:
-        raise
-    except Exception as e:
-        raise AceStepApiError(f"Failed to read prediction output: {str(e)}") from e
+    if not isinstance(output, list) or len(output) == 0:
+        raise AceStepApiError("Unexpected output from Replicate: expected non-empty list")
+    audio_file = output[0]
+    logger.info(f"[ace_step_api_service] Replicate URL: {getattr(audio_file, 'url', audio_file)}")
 
-    # Upload directly to R2 with date-based folder path
+    # Stream directly to R2 with date-based folder path; FileOutput iterates the download in chunks.
     suffix = f".{params.audio_format}"
     content_type = f"audio/{params.audio_format}" if params.audio_format in ["mp3", "wav", "flac"] else "audio/mpeg"
-    storage_result: AudioStorageResult = get_storage().upload_to_r2(
-        content=audio_bytes,
-        suffix=suffix,
-        content_type=content_type,
-    )
-    logger.info(f"[ace_step_api_service] R2 upload complete: {storage_result.r2_url}")
+    try:
+        stored = get_storage().upload_stream_to_r2(iter(audio_file), suffix, content_type)
+    except Exception as e:
+        raise AceStepApiError(f"Failed to copy prediction output to storage: {str(e)}") from e
+    logger.info(f"[ace_step_api_service] R2 upload complete: {stored.url}")
 
     if progress_cb:
         progress_cb(100, "replicate: completed")
 
-    return audio_bytes, storage_result.r2_url
+    return stored.url
+
+
+def create_replicate_prediction(
+    params: AceStepApiParams,
+    *,
+    webhook_url: str,
+    progress_cb: Optional[ProgressCb] = None,
+) -> str:
+    """
+    Start an ACE-Step prediction without waiting for it.
+
+    Replicate POSTs the finished prediction to webhook_url; returns the prediction id.
+    """
+    inp = prepare_replicate_input(params, progress_cb=progress_cb)
+
+    logger.info(f"[ace_step_api_service] Creating {params.mode} mode prediction on Replicate ace-step-1.5 (webhook)")
+    _get_replicate_token()
+
+    try:
+        prediction = replicate.predictions.create(
+            version=ACE_STEP_MODEL_VERSION,
+            input=inp,
+            webhook=webhook_url,
+            webhook_events_filter=["completed"],
+        )
+    except Exception as e:
+        raise AceStepApiError(f"Replicate prediction create failed: {str(e)}") from e
+
+    logger.info(f"[ace_step_api_service] Prediction created: {prediction.id}")
+    return str(prediction.id)
+
+
+def prediction_output_url(output: object) -> Optional[str]:
+    """First audio URL from a prediction's `output` (a list of URLs or a single URL)."""
+    if isinstance(output, list):
+        output = output[0] if output else None
+    if isinstance(output, str) and output:
+        return output
+    return None
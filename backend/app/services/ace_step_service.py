@@ -3,14 +3,15 @@ from __future__ import annotations
 import logging
 import os
 import sys
-import threading
-import wave
-from array import array
-from io import BytesIO
+from contextlib import ExitStack
 from dataclasses import dataclass
 from typing import Callable, Optional
 
+import numpy as np
+
 from app.core.config import get_settings
+from app.services.audio_codec import EncodedAudio, as_channels, encode_audio, encode_wav
+from app.services.model_residency import ModelResidencyManager, get_model_residency, offload_modules, restore_modules
 
 logger = logging.getLogger(__name__)
 
@@ -24,17 +25,19 @@ class AceStepGenerateParams:
     lyrics: Optional[str]
     duration: int
     sample_rate: int = 44100
+    # Target format for the encoded result (see audio_codec.AUDIO_FORMATS).
+    audio_format: str = "wav"
+    # Use the 5Hz LM for chain-of-thought metadata; False leaves the LM unloaded/evictable.
+    thinking: bool = True
 
 
 class AceStepNotInstalledError(RuntimeError):
     pass
 
 
-# Handler manager to initialize and reuse handlers
-_handler_lock = threading.Lock()
-_dit_handler = None
-_llm_handler = None
-_handlers_initialized = False
+# Residency-manager names of the two ACE-Step models (see app/services/model_residency.py).
+_DIT = "ace-step-dit"
+_LM = "ace-step-lm"
 
 
 def _get_project_root() -> str:
@@ -115,81 +118,106 @@ def _get_safe_device() -> str:
     return device
 
 
-def _ensure_handlers_initialized(progress_cb: Optional[ProgressCb] = None) -> tuple:
-    """Initialize and return DiT and LLM handlers. Thread-safe singleton."""
-    global _dit_handler, _llm_handler, _handlers_initialized
-    
-    with _handler_lock:
-        if _handlers_initialized and _dit_handler is not None:
-            return _dit_handler, _llm_handler
-        
-        # Import here to avoid errors if acestep is not installed
-        try:
-            # Add project root to path for imports
-            project_root = _get_project_root()
-            if project_root not in sys.path:
-                sys.path.insert(0, project_root)
-            
-            from acestep.handler import AceStepHandler
-            from acestep.llm_inference import LLMHandler
-        except ImportError as e:
-            raise AceStepNotInstalledError(
-                "ACE-Step python package not found. Install the ACE-Step repo as a python package.\n"
-                f"Project root: {project_root}\n"
-                f"Error: {str(e)}"
-            ) from e
-        
-        if progress_cb:
-            progress_cb(10, "ace-step: initializing handlers")
-        
-        # Initialize DiT handler
+def _import_handlers() -> tuple:
+    """Import AceStepHandler and LLMHandler from the ACE-Step checkout."""
+    try:
+        # Add project root to path for imports
         project_root = _get_project_root()
-        checkpoint_dir = os.path.join(project_root, "checkpoints")
-        config_path = os.getenv("ACESTEP_CONFIG_PATH", "acestep-v15-turbo")
-        device = _get_safe_device()
-        
-        if progress_cb:
-            progress_cb(12, "ace-step: initializing DiT")
-        
-        _dit_handler = AceStepHandler()
-        status_dit, ok_dit = _dit_handler.initialize_service(
-            project_root=project_root,
-            config_path=config_path,
-            device=device,
-            use_flash_attention=True,
-            compile_model=False,
-        )
-        
-        if not ok_dit:
-            raise AceStepNotInstalledError(f"DiT initialization failed: {status_dit}")
+        if project_root not in sys.path:
+            sys.path.insert(0, project_root)
         
+        from acestep.handler import AceStepHandler
+        from acestep.llm_inference import LLMHandler
+    except ImportError as e:
+        raise AceStepNotInstalledError(
+            "ACE-Step python package not found. Install the ACE-Step repo as a python package.\n"
+            f"Project root: {project_root}\n"
+            f"Error: {str(e)}"
+        ) from e
+    return AceStepHandler, LLMHandler
+
+
+def _load_dit(progress_cb: Optional[ProgressCb] = None):
+    AceStepHandler, _ = _import_handlers()
+    
+    if progress_cb:
+        progress_cb(10, "ace-step: initializing handlers")
+    
+    # Initialize DiT handler
+    project_root = _get_project_root()
+    config_path = os.getenv("ACESTEP_CONFIG_PATH", "acestep-v15-turbo")
+    device = _get_safe_device()
+    
+    if progress_cb:
+        progress_cb(12, "ace-step: initializing DiT")
+    
+    dit_handler = AceStepHandler()
+    status_dit, ok_dit = dit_handler.initialize_service(
+        project_root=project_root,
+        config_path=config_path,
+        device=device,
+        use_flash_attention=True,
+        compile_model=False,
+    )
+    
+    if not ok_dit:
+        raise AceStepNotInstalledError(f"DiT initialization failed: {status_dit}")
+    
+    if progress_cb:
+        progress_cb(15, "ace-step: DiT ready")
+    return dit_handler
+
+
+def _load_llm(progress_cb: Optional[ProgressCb] = None):
+    """Initialize the 5Hz LM. Failure is not fatal: the handler comes back with llm_initialized=False."""
+    _, LLMHandler = _import_handlers()
+    checkpoint_dir = os.path.join(_get_project_root(), "checkpoints")
+    llm_handler = LLMHandler()
+    lm_model = os.getenv("ACESTEP_LM_MODEL_PATH", "acestep-5Hz-lm-0.6B")
+    lm_backend = os.getenv("ACESTEP_LM_BACKEND", "vllm")
+    
+    if progress_cb:
+        progress_cb(17, "ace-step: initializing LLM")
+    
+    status_llm, ok_llm = llm_handler.initialize(
+        checkpoint_dir=checkpoint_dir,
+        lm_model_path=lm_model,
+        backend=lm_backend,
+        device=_get_safe_device(),
+    )
+    
+    if ok_llm:
         if progress_cb:
-            progress_cb(15, "ace-step: DiT ready")
-        
-        # Initialize LLM handler (optional)
-        _llm_handler = LLMHandler()
-        lm_model = os.getenv("ACESTEP_LM_MODEL_PATH", "acestep-5Hz-lm-0.6B")
-        lm_backend = os.getenv("ACESTEP_LM_BACKEND", "vllm")
-        
+            progress_cb(20, "ace-step: LLM ready")
+    else:
         if progress_cb:
-            progress_cb(17, "ace-step: initializing LLM")
-        
-        status_llm, ok_llm = _llm_handler.initialize(
-            checkpoint_dir=checkpoint_dir,
-            lm_model_path=lm_model,
-            backend=lm_backend,
-            device=device,
-        )
-        
-        if ok_llm:
-            if progress_cb:
-                progress_cb(20, "ace-step: LLM ready")
-        else:
-            if progress_cb:
-                progress_cb(20, f"ace-step: LLM init failed (optional): {status_llm}")
-        
-        _handlers_initialized = True
-        return _dit_handler, _llm_handler
+            progress_cb(20, f"ace-step: LLM init failed (optional): {status_llm}")
+    return llm_handler
+
+
+def _unload_llm(llm_handler) -> None:
+    if getattr(llm_handler, "llm_initialized", False):
+        llm_handler.unload()
+
+
+def _residency() -> ModelResidencyManager:
+    """
+    The shared residency manager with both ACE-Step models registered. The DiT can be
+    parked in host RAM between jobs; the LM (often a vLLM engine) can only be unloaded.
+    """
+    residency = get_model_residency()
+    residency.register(_DIT, load=_load_dit, offload=offload_modules, restore=restore_modules)
+    residency.register(_LM, load=_load_llm, unload=_unload_llm)
+    return residency
+
+
+def _ensure_handlers_initialized(progress_cb: Optional[ProgressCb] = None) -> tuple:
+    """Make the DiT and LLM handlers resident and return them (used for warm-up)."""
+    residency = _residency()
+    with residency.use(_DIT, progress_cb=progress_cb) as dit_handler, residency.use(
+        _LM, progress_cb=progress_cb
+    ) as llm_handler:
+        return dit_handler, llm_handler
 
 
 def _default_model_dir() -> str:
@@ -200,56 +228,20 @@ def _default_model_dir() -> str:
 
 def _write_wav_bytes(*, audio_f32, sample_rate: int) -> bytes:
     """
-    Write mono float audio in [-1, 1] to 16-bit PCM WAV bytes.
+    Write float audio in [-1, 1] to 16-bit PCM mono WAV bytes.
 
-    Accepts:
-    - torch.Tensor (1D/2D)
-    - list/tuple/iterable of floats
+    Accepts torch.Tensor (1D/2D), NumPy arrays or a flat sequence of floats;
+    see app/services/audio_codec.py.
     """
-    # Torch is optional; only handle it if present.
-    if hasattr(audio_f32, "detach") and hasattr(audio_f32, "cpu"):
-        t = audio_f32.detach().cpu().float()
-        # Downmix / squeeze common shapes
-        if hasattr(t, "ndim") and t.ndim == 2:
-            if t.shape[0] == 1:
-                t = t[0]
-            elif t.shape[1] == 1:
-                t = t[:, 0]
-            else:
-                t = t.mean(dim=0)
-        audio_list = t.clamp(-1.0, 1.0).tolist()
-    else:
-        # Try to interpret as a flat iterable
-        audio_list = list(audio_f32)
+    return encode_wav(audio_f32, sample_rate=sample_rate)
 
-    pcm = array("h")
-    for x in audio_list:
-        try:
-            xf = float(x)
-        except Exception:
-            xf = 0.0
-        if xf > 1.0:
-            xf = 1.0
-        elif xf < -1.0:
-            xf = -1.0
-        pcm.append(int(xf * 32767.0))
-
-    buf = BytesIO()
-    with wave.open(buf, "wb") as wf:
-        wf.setnchannels(1)
-        wf.setsampwidth(2)  # int16
-        wf.setframerate(int(sample_rate))
-        wf.writeframes(pcm.tobytes())
-    return buf.getvalue()
-
-
-def _read_audio_file_to_wav_bytes(audio_path: str) -> bytes:
-    """Read an audio file (mp3, wav, flac, etc.) and convert to WAV bytes."""
+
+def _load_audio_file(audio_path: str) -> tuple[np.ndarray, int]:
+    """Read an audio file (mp3, wav, flac, etc.) as float samples [channels, samples]."""
     # Use torchaudio for MP3 files (soundfile doesn't support MP3)
     # For WAV/FLAC, we can use either torchaudio or soundfile
     try:
         import torchaudio
-        import numpy as np
     except ImportError:
         raise AceStepNotInstalledError(
             "torchaudio is required to read audio files. Install with: pip install torchaudio"
@@ -279,42 +271,61 @@ def _read_audio_file_to_wav_bytes(audio_path: str) -> bytes:
         # Convert tensor to numpy for processing
         # audio_tensor is [channels, samples] format
         audio_np = audio_tensor.cpu().numpy()
-    
-    # Process numpy array (from either torchaudio or soundfile)
-    
-    # Convert to mono if stereo (average channels)
-    if audio_np.shape[0] > 1:
-        audio_data = np.mean(audio_np, axis=0)  # Average across channels
-    else:
-        audio_data = audio_np[0]  # Take first (and only) channel
-    
-    # Ensure audio is in [-1, 1] range (torchaudio already normalizes to this range)
-    audio_data = np.clip(audio_data, -1.0, 1.0).astype(np.float32)
-    
-    # Convert to 16-bit PCM
-    pcm = array("h")
-    for x in audio_data:
-        xf = float(x)
-        pcm.append(int(xf * 32767.0))
-    
-    # Write WAV bytes
-    buf = BytesIO()
-    with wave.open(buf, "wb") as wf:
-        wf.setnchannels(1)
-        wf.setsampwidth(2)  # int16
-        wf.setframerate(int(sample_rate))
-        wf.writeframes(pcm.tobytes())
-    return buf.getvalue()
+    return audio_np, int(sample_rate)
 
 
-def generate_wav_bytes(params: AceStepGenerateParams, *, progress_cb: Optional[ProgressCb] = None) -> bytes:
+def generate_audio(params: AceStepGenerateParams, *, progress_cb: Optional[ProgressCb] = None) -> EncodedAudio:
+    """
+    Run generate_waveform in this process and encode the result once, in memory, to
+    params.audio_format. The inference sidecar (app/services/inference_server.py) does
+    the same split across two processes.
+    """
+    samples, sample_rate = generate_waveform(params, progress_cb=progress_cb)
+    if progress_cb:
+        progress_cb(85, "ace-step: encoding audio")
+    encoded = encode_audio(samples, sample_rate=sample_rate, fmt=params.audio_format)
+    logger.info(
+        f"[ace_step_service] Encoded {encoded.format}: {len(encoded.data)} bytes at {sample_rate} Hz"
+    )
+    if progress_cb:
+        progress_cb(90, "ace-step: done")
+    return encoded
+
+
+def warm_up(*, generation_seconds: int = 0) -> str:
+    """
+    Load the handlers before the first job and, when generation_seconds > 0, run one short
+    throwaway generation so kernels are compiled and autotuned before a user waits on them.
+
+    Returns "loaded", or "fallback" when ACE-Step isn't installed (jobs use the synth tone).
+    Other initialization errors propagate.
+    """
+    try:
+        _ensure_handlers_initialized()
+    except AceStepNotInstalledError as e:
+        logger.info(f"[ace_step_service] warm-up skipped, ACE-Step not available: {e}")
+        return "fallback"
+    if generation_seconds > 0:
+        try:
+            generate_waveform(AceStepGenerateParams(prompt="warm-up", lyrics=None, duration=int(generation_seconds)))
+        except Exception as e:
+            # The models are resident; the first real job just pays the kernel warm-up instead.
+            logger.warning(f"[ace_step_service] warm-up generation failed: {e}")
+    return "loaded"
+
+
+def generate_waveform(
+    params: AceStepGenerateParams, *, progress_cb: Optional[ProgressCb] = None
+) -> tuple[np.ndarray, int]:
     """
     ACE-Step 1.5 local inference using generate_music from acestep.inference.
 
     This uses the official ACE-Step pipeline with GenerationParams and GenerationConfig.
+    Returns the first result as contiguous float32 samples [channels, samples] and its
+    sample rate; ACE-Step is given no save_dir, so nothing is written to disk.
     Official reference: https://github.com/ace-step/ACE-Step-1.5
     """
-    logger.info(f"[ace_step_service] generate_wav_bytes called: prompt='{params.prompt[:50]}...', duration={params.duration}s")
+    logger.info(f"[ace_step_service] generate_waveform called: prompt='{params.prompt[:50]}...', duration={params.duration}s")
     if params.lyrics:
         logger.info(f"[ace_step_service] Lyrics provided: {params.lyrics[:100]}...")
     else:
@@ -347,81 +358,80 @@ def generate_wav_bytes(params: AceStepGenerateParams, *, progress_cb: Optional[P
             f"Error: {str(e)}"
         ) from e
     
-    # Initialize handlers
-    dit_handler, llm_handler = _ensure_handlers_initialized(progress_cb)
-    
-    # Check if LLM is available for thinking/CoT
-    llm_available = llm_handler is not None and hasattr(llm_handler, "llm_initialized") and llm_handler.llm_initialized
-    
-    # Create save directory for output
-    project_root = _get_project_root()
-    save_dir = os.getenv("ACESTEP_SAVE_DIR", os.path.join(project_root, "output"))
-    os.makedirs(save_dir, exist_ok=True)
-    
-    if progress_cb:
-        progress_cb(25, "ace-step: preparing generation parameters")
-    
-    # Map request parameters to GenerationParams
-    generation_params = GenerationParams(
-        task_type="text2music",
-        caption=params.prompt,
-        lyrics=params.lyrics or "",
-        instrumental=not bool(params.lyrics),
-        vocal_language="en",  # Default to English, can be auto-detected if LLM is available
-        bpm=None,  # Auto-detect
-        keyscale="",  # Auto-detect
-        timesignature="",  # Auto-detect
-        duration=float(params.duration) if params.duration > 0 else -1.0,
-        inference_steps=8,  # Turbo model default
-        seed=-1,  # Random seed
-        thinking=llm_available,  # Enable CoT if LLM is available
-        use_cot_metas=llm_available,
-        use_cot_caption=llm_available,
-        use_cot_language=llm_available,
-    )
-    
-    # Create GenerationConfig
-    generation_config = GenerationConfig(
-        batch_size=1,
-        use_random_seed=True,  # Use random seed
-        seeds=None,  # Will be random
-        audio_format="mp3",  # Save as MP3, we'll convert to WAV
-    )
-    
-    # Progress callback wrapper
-    # ACE-Step calls progress(value: float, desc: str = "")
-    def _progress_wrapper(value: float, desc: str = "", **kwargs):
-        if not progress_cb:
-            return
-        # Map ACE-Step progress (0.0 to 1.0) into [25, 85]
-        # Clamp value to [0.0, 1.0] range
-        value = max(0.0, min(1.0, float(value)))
-        pct = 25 + int(value * 60)
-        progress_cb(pct, desc or "ace-step: generating")
-    
-    if progress_cb:
-        progress_cb(30, "ace-step: generating music")
-    
-    # Generate music
-    try:
-        logger.info("=" * 80)
-        logger.info("Generating music!!!!!!!!!!")
-        logger.info(f"Prompt: {params.prompt}")
-        logger.info(f"Duration: {params.duration}s")
-        logger.info("=" * 80)
+    # Pin the models for this job: the DiT always, the 5Hz LM only when thinking is on, so
+    # the residency manager may evict an idle LM to fit the DiT (see model_residency.py).
+    residency = _residency()
+    with ExitStack() as pinned:
+        dit_handler = pinned.enter_context(residency.use(_DIT, progress_cb=progress_cb))
+        llm_handler = pinned.enter_context(residency.use(_LM, progress_cb=progress_cb)) if params.thinking else None
+        
+        # Check if LLM is available for thinking/CoT
+        llm_available = llm_handler is not None and hasattr(llm_handler, "llm_initialized") and llm_handler.llm_initialized
         
-        result = generate_music(
-            dit_handler=dit_handler,
-            llm_handler=llm_handler,
-            params=generation_params,
-            config=generation_config,
-            save_dir=save_dir,
-            progress=_progress_wrapper,
+        if progress_cb:
+            progress_cb(25, "ace-step: preparing generation parameters")
+        
+        # Map request parameters to GenerationParams
+        generation_params = GenerationParams(
+            task_type="text2music",
+            caption=params.prompt,
+            lyrics=params.lyrics or "",
+            instrumental=not bool(params.lyrics),
+            vocal_language="en",  # Default to English, can be auto-detected if LLM is available
+            bpm=None,  # Auto-detect
+            keyscale="",  # Auto-detect
+            timesignature="",  # Auto-detect
+            duration=float(params.duration) if params.duration > 0 else -1.0,
+            inference_steps=8,  # Turbo model default
+            seed=-1,  # Random seed
+            thinking=llm_available,  # Enable CoT if LLM is available
+            use_cot_metas=llm_available,
+            use_cot_caption=llm_available,
+            use_cot_language=llm_available,
         )
-    except Exception as e:
-        raise AceStepNotInstalledError(
-            f"ACE-Step generation failed: {str(e)}"
-        ) from e
+        
+        # Create GenerationConfig
+        generation_config = GenerationConfig(
+            batch_size=1,
+            use_random_seed=True,  # Use random seed
+            seeds=None,  # Will be random
+            audio_format=params.audio_format,  # only used by builds that still save a file
+        )
+        
+        # Progress callback wrapper
+        # ACE-Step calls progress(value: float, desc: str = "")
+        def _progress_wrapper(value: float, desc: str = "", **kwargs):
+            if not progress_cb:
+                return
+            # Map ACE-Step progress (0.0 to 1.0) into [25, 85]
+            # Clamp value to [0.0, 1.0] range
+            value = max(0.0, min(1.0, float(value)))
+            pct = 25 + int(value * 60)
+            progress_cb(pct, desc or "ace-step: generating")
+        
+        if progress_cb:
+            progress_cb(30, "ace-step: generating music")
+        
+        # Generate music
+        try:
+            logger.info("=" * 80)
+            logger.info("Generating music!!!!!!!!!!")
+            logger.info(f"Prompt: {params.prompt}")
+            logger.info(f"Duration: {params.duration}s")
+            logger.info("=" * 80)
+            
+            result = generate_music(
+                dit_handler=dit_handler,
+                llm_handler=llm_handler,
+                params=generation_params,
+                config=generation_config,
+                save_dir=None,  # keep the result in memory; we encode the tensor ourselves
+                progress=_progress_wrapper,
+            )
+        except Exception as e:
+            raise AceStepNotInstalledError(
+                f"ACE-Step generation failed: {str(e)}"
+            ) from e
     
     if not result.success:
         logger.error(f"[ace_step_service] Generation failed: {result.error or 'Unknown error'}")
@@ -433,38 +443,26 @@ def generate_wav_bytes(params: AceStepGenerateParams, *, progress_cb: Optional[P
     
     logger.info(f"[ace_step_service] Generation succeeded! Produced {len(result.audios)} audio file(s)")
     
-    if progress_cb:
-        progress_cb(85, "ace-step: reading audio file")
-    
-    # Get the first audio file path
     first_audio = result.audios[0]
+    tensor = first_audio.get("tensor")
+    sample_rate = int(first_audio.get("sample_rate") or params.sample_rate)
     audio_path = first_audio.get("path")
-    
-    logger.info(f"[ace_step_service] Reading audio file: {audio_path}")
-    
-    if not audio_path or not os.path.exists(audio_path):
-        logger.error(f"[ace_step_service] Generated audio file not found: {audio_path}")
-        raise RuntimeError(f"Generated audio file not found: {audio_path}")
-    
-    # Read audio file and convert to WAV bytes
-    try:
-        wav_bytes = _read_audio_file_to_wav_bytes(audio_path)
-        logger.info(f"[ace_step_service] Successfully read audio file, size: {len(wav_bytes)} bytes")
-    except Exception as e:
-        logger.error(f"[ace_step_service] Failed to read audio file: {str(e)}")
-        # Fallback: try to read as raw bytes if it's already WAV
-        if audio_path.endswith(".wav"):
-            with open(audio_path, "rb") as f:
-                wav_bytes = f.read()
-            logger.info(f"[ace_step_service] Fallback: read WAV as raw bytes, size: {len(wav_bytes)} bytes")
-        else:
-            raise RuntimeError(f"Failed to read audio file: {str(e)}") from e
-    
-    if progress_cb:
-        progress_cb(90, "ace-step: done")
-    
-    logger.info("[ace_step_service] generate_wav_bytes completed successfully")
-    return wav_bytes
+    if tensor is not None:
+        audio = as_channels(tensor)
+    elif audio_path and os.path.exists(audio_path):
+        # Older ACE-Step builds always save a file; take it once and delete it so the
+        # output directory doesn't grow.
+        logger.warning(f"[ace_step_service] No tensor in result; reading {audio_path}")
+        try:
+            audio, sample_rate = _load_audio_file(audio_path)
+        finally:
+            os.remove(audio_path)
+        audio = as_channels(audio)
+    else:
+        raise RuntimeError("Generation succeeded but returned neither a waveform tensor nor a file")
+
+    logger.info("[ace_step_service] generate_waveform completed successfully")
+    return np.ascontiguousarray(audio, dtype=np.float32), sample_rate
     try:
         sig = inspect.signature(entry)
     except Exception:
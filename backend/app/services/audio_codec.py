@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+import struct
+import subprocess
+import threading
+from dataclasses import dataclass
+from typing import Any, Iterator
+
+import numpy as np
+
+from app.core.config import get_settings
+from app.services.audio_renditions import FfmpegError, ffmpeg_binary
+
+# PCM16 WAV (RIFF) header; the data chunk follows immediately.
+WAV_HEADER_SIZE = 44
+_WAV_HEADER = struct.Struct("<4sI4s4sIHHIIHH4sI")
+_PCM16_SCALE = 32767.0
+# Samples per block: the float64 scratch (512 KiB) stays in L2 while each block makes
+# its passes (downmix, clip, NaN mask, scale, quantize).
+_BLOCK = 1 << 16
+
+# Target formats for generated songs: suffix/content type, and the ffmpeg encoder
+# arguments (None = encoded in-process).
+AUDIO_FORMATS: dict[str, tuple[str, str, list[str] | None]] = {
+    "wav": (".wav", "audio/wav", None),
+    "flac": (".flac", "audio/flac", ["-c:a", "flac", "-f", "flac"]),
+    "mp3": (".mp3", "audio/mpeg", ["-c:a", "libmp3lame", "-b:a", "192k", "-f", "mp3"]),
+    # libopus only takes 48/24/16/12/8 kHz.
+    "opus": (".opus", "audio/ogg", ["-c:a", "libopus", "-b:a", "128k", "-ar", "48000", "-f", "ogg"]),
+}
+
+
+@dataclass
+class EncodedAudio:
+    data: bytes
+    format: str
+    suffix: str
+    content_type: str
+
+
+def to_numpy(audio: Any) -> np.ndarray:
+    """
+    View `audio` as a NumPy array without copying when possible.
+
+    Accepts torch tensors (any device; moved to CPU), NumPy arrays and flat sequences.
+    """
+    if hasattr(audio, "detach") and hasattr(audio, "cpu"):
+        # .float() is a no-op for float32 tensors, and .numpy() shares the CPU tensor's memory.
+        return audio.detach().cpu().float().numpy()
+    return np.asarray(audio)
+
+
+def as_channels(audio: Any) -> np.ndarray:
+    """
+    [channels, samples] view of `audio`. 1-D input is one channel and [samples, 1] is
+    transposed; any other 2-D input is taken as channels-first.
+    """
+    arr = to_numpy(audio)
+    if arr.ndim == 1:
+        return arr[np.newaxis, :]
+    if arr.ndim == 2:
+        return arr.T if arr.shape[1] == 1 and arr.shape[0] > 1 else arr
+    return arr.reshape(1, -1)
+
+
+def iter_pcm16(audio: Any, *, mono: bool = True, block: int = _BLOCK) -> Iterator[np.ndarray]:
+    """
+    Clip to [-1, 1] and quantize to little-endian int16 (truncating like int(x * 32767)),
+    `block` frames at a time over one reused scratch buffer. NaN becomes silence.
+
+    mono=True averages the channels; otherwise frames are interleaved. Each yielded
+    array is only valid until the next one is produced.
+    """
+    chans = as_channels(audio)
+    n_channels, n = chans.shape
+    width = 1 if mono else n_channels
+    frames = min(n, block)
+    scratch = np.empty((frames, width), dtype=np.float64)
+    nan = np.empty(scratch.shape, dtype=bool)
+    pcm = np.empty(scratch.shape, dtype="<i2")
+    # Downmix: clip the channel sum to +/-n_channels and fold 1/n_channels into the scale.
+    limit = float(n_channels) if mono else 1.0
+    scale = _PCM16_SCALE / limit
+
+    for start in range(0, n, block):
+        stop = min(start + block, n)
+        rows = stop - start
+        s = scratch[:rows]
+        flat = s.reshape(-1)  # contiguous view; the element-wise passes run on 1-D memory
+        if n_channels == 1:
+            np.copyto(flat, chans[0, start:stop], casting="unsafe")
+        elif mono:
+            np.add.reduce(chans[:, start:stop], axis=0, dtype=np.float64, out=flat)
+        else:
+            for c in range(n_channels):
+                np.copyto(s[:, c], chans[c, start:stop], casting="unsafe")
+        np.clip(flat, -limit, limit, out=flat)
+        mask = nan[:rows].reshape(-1)
+        np.isnan(flat, out=mask)
+        np.copyto(flat, 0.0, where=mask)
+        flat *= scale
+        out = pcm[:rows]
+        np.copyto(out.reshape(-1), flat, casting="unsafe")
+        yield out
+
+
+def float_to_pcm16(audio: Any, out: np.ndarray | None = None) -> np.ndarray:
+    """Mono int16 PCM of `audio`, written into `out` (an int16 array or view) when given."""
+    n = as_channels(audio).shape[1]
+    if out is None:
+        out = np.empty(n, dtype="<i2")
+    pos = 0
+    for pcm in iter_pcm16(audio):
+        out[pos : pos + pcm.shape[0]] = pcm[:, 0]
+        pos += pcm.shape[0]
+    return out
+
+
+def wav_header(*, num_frames: int, sample_rate: int, channels: int = 1) -> bytes:
+    block_align = channels * 2
+    data_size = num_frames * block_align
+    byte_rate = int(sample_rate) * block_align
+    return _WAV_HEADER.pack(
+        b"RIFF", 36 + data_size, b"WAVE", b"fmt ", 16, 1, channels, int(sample_rate), byte_rate, block_align, 16,
+        b"data", data_size,
+    )
+
+
+def encode_wav(audio: Any, *, sample_rate: int, mono: bool = True) -> bytes:
+    """
+    Float audio in [-1, 1] ([channels, samples]) -> PCM16 WAV, downmixed unless mono=False.
+
+    Samples are quantized straight into the output buffer behind the header, so the
+    only full-size allocation besides the input is the returned bytes.
+    """
+    n_channels, n = as_channels(audio).shape
+    channels = 1 if mono else n_channels
+    buf = np.empty(WAV_HEADER_SIZE + n * channels * 2, dtype=np.uint8)
+    header = wav_header(num_frames=n, sample_rate=sample_rate, channels=channels)
+    buf[:WAV_HEADER_SIZE] = np.frombuffer(header, dtype=np.uint8)
+    data = buf[WAV_HEADER_SIZE:].view("<i2").reshape(n, channels)
+    pos = 0
+    for pcm in iter_pcm16(audio, mono=mono):
+        data[pos : pos + pcm.shape[0]] = pcm
+        pos += pcm.shape[0]
+    return buf.tobytes()
+
+
+def _encode_with_ffmpeg(audio: Any, *, sample_rate: int, channels: int, encoder_args: list[str]) -> bytes:
+    """
+    Stream interleaved PCM16 blocks into ffmpeg's stdin and collect the encoded file from
+    stdout. Nothing is written to disk and the full PCM buffer is never materialized.
+    """
+    cmd = [
+        ffmpeg_binary() or get_settings().ffmpeg_path,
+        "-hide_banner", "-loglevel", "error",
+        "-f", "s16le", "-ar", str(int(sample_rate)), "-ac", str(channels), "-i", "pipe:0",
+        *encoder_args,
+        "pipe:1",
+    ]
+    proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stderr: list[bytes] = []
+
+    def feed() -> None:
+        try:
+            for pcm in iter_pcm16(audio, mono=channels == 1):
+                proc.stdin.write(memoryview(pcm).cast("B"))
+        except (BrokenPipeError, ValueError):
+            pass  # ffmpeg exited early; its exit code and stderr explain why
+        finally:
+            proc.stdin.close()
+
+    threads = [
+        threading.Thread(target=feed, daemon=True),
+        threading.Thread(target=lambda: stderr.append(proc.stderr.read()), daemon=True),
+    ]
+    for t in threads:
+        t.start()
+    data = proc.stdout.read()
+    try:
+        proc.wait(timeout=get_settings().audio_transcode_timeout_seconds)
+    except subprocess.TimeoutExpired as e:
+        proc.kill()
+        raise FfmpegError(f"ffmpeg timed out after {e.timeout}s") from e
+    for t in threads:
+        t.join()
+    if proc.returncode != 0:
+        message = b"".join(stderr).decode(errors="replace").strip()[-500:]
+        raise FfmpegError(f"ffmpeg exited with {proc.returncode}: {message}")
+    return data
+
+
+def encode_audio(audio: Any, *, sample_rate: int, fmt: str) -> EncodedAudio:
+    """
+    Encode a float waveform ([channels, samples]) once, in memory, to `fmt`
+    (wav/flac/mp3/opus), keeping its channels. Compressed formats need ffmpeg; without
+    it the result falls back to WAV, and `format`/`suffix` say what was produced.
+    """
+    if fmt not in AUDIO_FORMATS:
+        raise ValueError(f"Unsupported audio format: {fmt}")
+    suffix, content_type, encoder_args = AUDIO_FORMATS[fmt]
+    channels = as_channels(audio).shape[0]
+    if encoder_args is not None and ffmpeg_binary() is None:
+        fmt, (suffix, content_type, encoder_args) = "wav", AUDIO_FORMATS["wav"]
+    if encoder_args is None:
+        data = encode_wav(audio, sample_rate=sample_rate, mono=False)
+    else:
+        data = _encode_with_ffmpeg(audio, sample_rate=sample_rate, channels=channels, encoder_args=encoder_args)
+    return EncodedAudio(data=data, format=fmt, suffix=suffix, content_type=content_type)
+
+
+def sine(*, seconds: float, sample_rate: int = 44100, freq: float = 220.0, amp: float = 0.2) -> np.ndarray:
+    """Mono sine tone as float64 samples, used as the no-model fallback."""
+    n = max(1, int(seconds * sample_rate))
+    phase = np.arange(n, dtype=np.float64)
+    phase *= 2.0 * np.pi * freq / sample_rate
+    np.sin(phase, out=phase)
+    phase *= amp
+    return phase
+
+
+def sine_wav(*, seconds: float, sample_rate: int = 44100, freq: float = 220.0, amp: float = 0.2) -> bytes:
+    """Mono PCM16 WAV of `sine`."""
+    return encode_wav(sine(seconds=seconds, sample_rate=sample_rate, freq=freq, amp=amp), sample_rate=sample_rate)
@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+import logging
+import posixpath
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date
+from pathlib import Path
+from typing import Iterator, Optional
+from uuid import uuid4
+
+from app.core.config import get_settings
+from app.core.http_clients import get_http_client
+from app.services.content_store import key_from_url
+from app.services.storage_service import get_storage
+
+logger = logging.getLogger(__name__)
+
+MASTER_PLAYLIST = "master.m3u8"
+PREVIEW_FILE = "preview.m4a"
+_AAC_CODEC = "mp4a.40.2"  # AAC-LC
+_CONTENT_TYPES = {
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".ts": "video/mp2t",
+    ".m4a": "audio/mp4",
+}
+
+
+class FfmpegError(RuntimeError):
+    pass
+
+
+def ffmpeg_binary() -> Optional[str]:
+    return shutil.which(get_settings().ffmpeg_path)
+
+
+def hls_bitrates() -> tuple[int, ...]:
+    """Ladder from AUDIO_HLS_BITRATES ("64,128,256"), lowest first."""
+    raw = get_settings().audio_hls_bitrates
+    return tuple(sorted({int(b) for b in raw.split(",") if b.strip()}))
+
+
+def _run_ffmpeg(args: list[str], *, cwd: Path) -> bytes:
+    """Run ffmpeg and return its stdout (raw PCM when the output is pipe:1)."""
+    cmd = [ffmpeg_binary() or get_settings().ffmpeg_path, "-hide_banner", "-loglevel", "error", "-y", *args]
+    try:
+        proc = subprocess.run(
+            cmd,
+            cwd=cwd,
+            check=True,
+            capture_output=True,
+            timeout=get_settings().audio_transcode_timeout_seconds,
+        )
+    except subprocess.CalledProcessError as e:
+        stderr = (e.stderr or b"").decode(errors="replace").strip()[-500:]
+        raise FfmpegError(f"ffmpeg exited with {e.returncode}: {stderr}") from e
+    except subprocess.TimeoutExpired as e:
+        raise FfmpegError(f"ffmpeg timed out after {e.timeout}s") from e
+    return proc.stdout
+
+
+def master_playlist(bitrates: tuple[int, ...]) -> str:
+    """
+    Master playlist for the ladder. The lowest rendition is listed first, so players
+    start on it and step up once they have measured the link.
+    """
+    lines = ["#EXTM3U", "#EXT-X-VERSION:4", "#EXT-X-INDEPENDENT-SEGMENTS"]
+    for kbps in bitrates:
+        # ~10% headroom for MPEG-TS/ADTS framing over the nominal AAC bitrate.
+        lines.append(f'#EXT-X-STREAM-INF:BANDWIDTH={kbps * 1100},CODECS="{_AAC_CODEC}"')
+        lines.append(f"{kbps}k/index.m3u8")
+    return "\n".join(lines) + "\n"
+
+
+def transcode_rendition(src: Path, out_dir: Path, kbps: int, segment_seconds: int) -> None:
+    """
+    One AAC rendition as a VOD playlist over a single byte-range addressed .ts file
+    (index.m3u8 + stream.ts), so each rendition is two objects instead of one per segment.
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    _run_ffmpeg(
+        [
+            "-i", str(src),
+            "-vn", "-map", "0:a:0",
+            "-c:a", "aac", "-b:a", f"{kbps}k", "-ac", "2", "-ar", "44100",
+            "-f", "hls",
+            "-hls_time", str(segment_seconds),
+            "-hls_playlist_type", "vod",
+            "-hls_flags", "single_file+independent_segments",
+            "-hls_segment_filename", "stream.ts",
+            "index.m3u8",
+        ],
+        cwd=out_dir,
+    )
+
+
+def preview_start(duration: Optional[int], seconds: int) -> float:
+    """Start the clip ~30% in, past most intros, but never so late that it runs short."""
+    if not duration or duration <= seconds:
+        return 0.0
+    return float(min(duration * 0.3, duration - seconds))
+
+
+def render_preview(src: Path, dest: Path, *, start: float, seconds: int, kbps: int) -> None:
+    fade = max(seconds - 2, 0)
+    _run_ffmpeg(
+        [
+            "-ss", f"{start:.2f}", "-t", str(seconds),
+            "-i", str(src),
+            "-vn", "-map", "0:a:0",
+            "-af", f"afade=t=in:d=1,afade=t=out:st={fade}:d=2",
+            "-c:a", "aac", "-b:a", f"{kbps}k", "-ac", "2", "-ar", "44100",
+            "-movflags", "+faststart",
+            dest.name,
+        ],
+        cwd=dest.parent,
+    )
+
+
+def _fetch_source(url: str, dest: Path) -> Optional[str]:
+    """Write the original audio to `dest`; returns its storage key (None when hosted elsewhere)."""
+    storage = get_storage()
+    key = key_from_url(storage, url)
+    if key:
+        if not storage.download_to(key, dest):
+            raise FileNotFoundError(key)
+        return key
+    with get_http_client("download").stream("GET", url) as resp:
+        resp.raise_for_status()
+        with open(dest, "wb") as f:
+            for chunk in resp.iter_bytes():
+                f.write(chunk)
+    return None
+
+
+def derived_prefix(source_key: Optional[str]) -> str:
+    """Derived files live in a folder named after the original (audio/<id>.wav -> audio/<id>/)."""
+    if source_key:
+        return posixpath.splitext(source_key)[0] + "/"
+    return f"songs/{date.today().isoformat()}/{uuid4().hex}/"
+
+
+@contextmanager
+def local_source(source_url: str) -> Iterator[Optional[tuple[Path, str]]]:
+    """
+    Download the original once into a temp dir for every post-processing stage.
+    Yields (path, prefix for derived keys), or None when ffmpeg is missing or the
+    source cannot be read.
+    """
+    if ffmpeg_binary() is None:
+        logger.warning("[audio_renditions] ffmpeg not found (FFMPEG_PATH=%s); skipping", get_settings().ffmpeg_path)
+        yield None
+        return
+    with tempfile.TemporaryDirectory(prefix="renditions-") as tmp:
+        src = Path(tmp) / ("source" + (posixpath.splitext(source_url.split("?", 1)[0])[1] or ".audio"))
+        try:
+            source_key = _fetch_source(source_url, src)
+        except Exception as e:
+            logger.warning("[audio_renditions] cannot read source %s: %s", source_url, e)
+            yield None
+            return
+        yield src, derived_prefix(source_key)
+
+
+def build_renditions(source_url: str, *, duration: Optional[int] = None) -> Optional[dict]:
+    """
+    Transcode the original into an HLS ladder plus a short preview clip and store them.
+
+    Returns {"hls": master url, "preview": url, "bitrates": [...], "files": [every stored url]},
+    or None when ffmpeg is missing or the source cannot be read.
+    """
+    with local_source(source_url) as source:
+        return render_renditions(*source, duration=duration) if source else None
+
+
+def render_renditions(src: Path, prefix: str, *, duration: Optional[int] = None) -> dict:
+    """Encode and store renditions of the local file `src` under `prefix`."""
+    s = get_settings()
+    bitrates = hls_bitrates()
+    with tempfile.TemporaryDirectory(prefix="renditions-out-") as tmp:
+        out = Path(tmp)
+        hls_dir = out / "hls"
+        hls_dir.mkdir(parents=True)
+        # ffmpeg runs as child processes, so the ladder and the preview encode in parallel.
+        with ThreadPoolExecutor(max_workers=len(bitrates) + 1) as pool:
+            jobs = [
+                pool.submit(transcode_rendition, src, hls_dir / f"{kbps}k", kbps, s.audio_hls_segment_seconds)
+                for kbps in bitrates
+            ]
+            jobs.append(
+                pool.submit(
+                    render_preview,
+                    src,
+                    out / PREVIEW_FILE,
+                    start=preview_start(duration, s.audio_preview_seconds),
+                    seconds=s.audio_preview_seconds,
+                    kbps=s.audio_preview_kbps,
+                )
+            )
+            for job in jobs:
+                job.result()
+        (hls_dir / MASTER_PLAYLIST).write_text(master_playlist(bitrates))
+
+        storage = get_storage()
+        urls: dict[str, str] = {}
+        for path in sorted(p for p in out.rglob("*") if p.is_file()):
+            rel = path.relative_to(out).as_posix()
+            urls[rel] = storage.put_bytes(
+                prefix + rel, path.read_bytes(), _CONTENT_TYPES.get(path.suffix, "application/octet-stream")
+            )
+
+    return {
+        "hls": urls[f"hls/{MASTER_PLAYLIST}"],
+        "preview": urls[PREVIEW_FILE],
+        "bitrates": list(bitrates),
+        "files": list(urls.values()),
+    }
+
+
+def rendition_urls(renditions: Optional[dict]) -> list[str]:
+    return list((renditions or {}).get("files") or [])
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import hashlib
+import logging
+import time
+from dataclasses import dataclass
+from typing import Optional, Protocol
+
+from app.core.cache import get_redis
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+# Hash of content-addressed key -> number of records (songs, covers, ...) that use it.
+REFS_KEY = "storage-refs"
+# ZSET of keys that may have become garbage (refcount hit zero, record deleted or
+# replaced), scored by when. Drained by app/services/storage_gc.py.
+GC_CANDIDATES_KEY = "storage-gc-candidates"
+
+_CAS_MARKER = "/sha256/"
+
+
+class _Backend(Protocol):
+    def put_bytes(self, key: str, content: bytes, content_type: str) -> str: ...
+    def head_object(self, key: str) -> Optional[dict]: ...
+    def public_url(self, key: str) -> str: ...
+
+
+@dataclass
+class ContentAddressedFile:
+    key: str
+    url: str
+    sha256: str
+    deduplicated: bool
+
+
+def content_addressed_enabled(override: Optional[bool] = None) -> bool:
+    return get_settings().storage_content_addressed if override is None else bool(override)
+
+
+def content_key(folder: str, digest: str, suffix: str) -> str:
+    """
+    Key for content with SHA-256 `digest`. Only the top-level folder is kept, so
+    date-partitioned folders (image/2024-01-01) still dedupe across days.
+    """
+    top = folder.strip("/").split("/", 1)[0] or "blobs"
+    return f"{top}{_CAS_MARKER}{digest[:2]}/{digest}{suffix}"
+
+
+def is_content_addressed(key: str) -> bool:
+    return _CAS_MARKER in key
+
+
+def _known(key: str) -> bool:
+    try:
+        return int(get_redis().hget(REFS_KEY, key) or 0) > 0
+    except Exception as e:
+        logger.warning("[content_store] refcount lookup failed for %s: %s", key, e)
+        return False
+
+
+def add_ref(key: str) -> int:
+    try:
+        redis = get_redis()
+        count = int(redis.hincrby(REFS_KEY, key, 1))
+        redis.zrem(GC_CANDIDATES_KEY, key)
+        return count
+    except Exception as e:
+        logger.warning("[content_store] add_ref failed for %s: %s", key, e)
+        return 0
+
+
+def release_ref(key: str) -> int:
+    """
+    Drop one reference to `key`. At zero the key moves to the GC candidate set
+    rather than being deleted here, so a concurrent re-upload can revive it.
+    """
+    if not is_content_addressed(key):
+        return 0
+    try:
+        redis = get_redis()
+        count = int(redis.hincrby(REFS_KEY, key, -1))
+        if count <= 0:
+            redis.hdel(REFS_KEY, key)
+            redis.zadd(GC_CANDIDATES_KEY, {key: time.time()})
+        return max(count, 0)
+    except Exception as e:
+        logger.warning("[content_store] release_ref failed for %s: %s", key, e)
+        return 0
+
+
+def ref_count(key: str) -> int:
+    return int(get_redis().hget(REFS_KEY, key) or 0)
+
+
+def key_from_url(storage: _Backend, url: Optional[str]) -> Optional[str]:
+    """Recover the object key from a public URL produced by `storage`."""
+    prefix = storage.public_url("")
+    if not url or not url.startswith(prefix):
+        return None
+    return url[len(prefix):] or None
+
+
+def mark_gc_candidate(key: str) -> None:
+    """Queue `key` for the storage GC to check (and delete if nothing references it)."""
+    try:
+        get_redis().zadd(GC_CANDIDATES_KEY, {key: time.time()})
+    except Exception as e:
+        logger.warning("[content_store] could not queue %s for GC: %s", key, e)
+
+
+def release_url(storage: _Backend, url: Optional[str]) -> None:
+    """
+    Drop a record's claim on a stored public URL (best effort). Content-addressed keys
+    lose one reference; any other key belonged to that record alone and is queued for GC.
+    """
+    if not url:
+        return
+    try:
+        key = key_from_url(storage, url)
+    except RuntimeError as e:
+        logger.warning("[content_store] cannot map %s to a key: %s", url, e)
+        return
+    if not key:
+        return
+    if is_content_addressed(key):
+        release_ref(key)
+    else:
+        mark_gc_candidate(key)
+
+
+def store_content_addressed(
+    storage: _Backend,
+    *,
+    content: bytes,
+    suffix: str,
+    content_type: str,
+    folder: str,
+) -> ContentAddressedFile:
+    """
+    Store `content` under its SHA-256 key, skipping the upload when the object is
+    already indexed in Redis or a HEAD finds it. Every call adds one reference.
+    """
+    digest = hashlib.sha256(content).hexdigest()
+    key = content_key(folder, digest, suffix)
+
+    exists = _known(key) or storage.head_object(key) is not None
+    if exists:
+        url = storage.public_url(key)
+        logger.info("[content_store] dedup hit for %s (%d bytes not uploaded)", key, len(content))
+    else:
+        url = storage.put_bytes(key, content, content_type)
+    add_ref(key)
+    return ContentAddressedFile(key=key, url=url, sha256=digest, deduplicated=exists)
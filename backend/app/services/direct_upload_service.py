@@ -0,0 +1,191 @@
+from __future__ import annotations
+
+import json
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+from uuid import UUID, uuid4
+
+from app.core.cache import get_redis
+from app.core.config import get_settings
+from app.services.storage_service import get_storage
+
+logger = logging.getLogger(__name__)
+
+# purpose -> (key folder, required content-type prefix or None)
+UPLOAD_PURPOSES = {
+    "file": ("files", None),
+    "avatar": ("avatars", "image/"),
+    "background": ("backgrounds", "image/"),
+}
+
+_INTENT_PREFIX = "upload-intent:"
+
+# Take an upload intent for confirmation: GET + DEL in one step, so of two concurrent
+# confirms only one ever sees it. Another user's intent is returned but left in place.
+# Returns nil, {raw, -1} (not the owner) or {raw, pttl} (claimed).
+_CLAIM_LUA = """
+local raw = redis.call('GET', KEYS[1])
+if not raw then
+  return nil
+end
+local intent = cjson.decode(raw)
+if intent['user_id'] ~= ARGV[1] or intent['purpose'] ~= ARGV[2] then
+  return {raw, -1}
+end
+local ttl = redis.call('PTTL', KEYS[1])
+redis.call('DEL', KEYS[1])
+return {raw, ttl}
+"""
+
+_claim_script = None
+
+
+def _claim_intent(key: str, *, user_id: UUID, purpose: str) -> tuple[dict, int]:
+    global _claim_script
+    r = get_redis()
+    if _claim_script is None:
+        _claim_script = r.register_script(_CLAIM_LUA)
+    claimed = _claim_script(keys=[_INTENT_PREFIX + key], args=[str(user_id), purpose], client=r)
+    if not claimed:
+        raise LookupError("Upload not found or expired")
+    raw, ttl_ms = claimed
+    if int(ttl_ms) == -1:
+        raise PermissionError("Upload not owned by user")
+    return json.loads(raw), int(ttl_ms)
+
+
+@dataclass
+class UploadTicket:
+    key: str
+    upload_url: str
+    method: str
+    headers: dict
+    expires_in: int
+    max_bytes: int
+
+
+@dataclass
+class ConfirmedUpload:
+    key: str
+    url: str
+    purpose: str
+    content_type: str
+    size: int
+    original_filename: Optional[str]
+
+
+def _max_bytes(purpose: str) -> int:
+    s = get_settings()
+    mb = s.upload_max_file_mb if purpose == "file" else s.upload_max_image_mb
+    return int(mb) * 1024 * 1024
+
+
+class DirectUploadService:
+    """
+    Browser -> R2 uploads in two steps, without the API ever holding the bytes.
+
+    1. `create_upload` validates the declared name/type/size, reserves a key for the
+       user in Redis and returns a presigned PUT URL.
+    2. `confirm_upload` HEADs the object, re-checks size and type against what was
+       reserved, and only then hands the key back for the caller to record.
+
+    R2 has no POST-policy support, so the size limit is enforced at confirm time:
+    an object that breaks the limits is deleted and the confirm fails.
+    """
+
+    def create_upload(
+        self,
+        *,
+        user_id: UUID,
+        purpose: str,
+        filename: str,
+        content_type: str,
+        size: int,
+    ) -> UploadTicket:
+        if purpose not in UPLOAD_PURPOSES:
+            raise ValueError(f"Unknown upload purpose: {purpose}")
+        folder, type_prefix = UPLOAD_PURPOSES[purpose]
+        if not filename:
+            raise ValueError("Missing filename")
+        content_type = (content_type or "").strip().lower()
+        if not content_type:
+            raise ValueError("Missing content_type")
+        if type_prefix and not content_type.startswith(type_prefix):
+            raise ValueError("Only image files are allowed")
+        max_bytes = _max_bytes(purpose)
+        if size <= 0:
+            raise ValueError("Empty file")
+        if size > max_bytes:
+            raise ValueError(f"File too large (max {max_bytes} bytes)")
+
+        suffix = Path(filename).suffix or (".jpg" if type_prefix == "image/" else "")
+        key = f"{folder}/{uuid4().hex}{suffix}"
+        ttl = int(get_settings().direct_upload_ttl_seconds)
+        upload_url = get_storage().presign_put(key, content_type=content_type, ttl_seconds=ttl)
+
+        intent = {
+            "user_id": str(user_id),
+            "purpose": purpose,
+            "content_type": content_type,
+            "max_bytes": max_bytes,
+            "original_filename": filename,
+        }
+        # Keep the reservation a little past the URL's expiry so a PUT that starts
+        # right before expiry can still be confirmed.
+        get_redis().set(_INTENT_PREFIX + key, json.dumps(intent), ex=ttl * 2)
+
+        return UploadTicket(
+            key=key,
+            upload_url=upload_url,
+            method="PUT",
+            headers={"Content-Type": content_type},
+            expires_in=ttl,
+            max_bytes=max_bytes,
+        )
+
+    def confirm_upload(self, *, user_id: UUID, key: str, purpose: str) -> ConfirmedUpload:
+        # One confirm per reservation: the intent is claimed before anything is checked,
+        # so a concurrent or replayed confirm finds nothing and gets a 404.
+        intent, ttl_ms = _claim_intent(key, user_id=user_id, purpose=purpose)
+
+        storage = get_storage()
+        head = storage.head_object(key)
+        if head is None:
+            # Not uploaded yet: hand the reservation back so the client can confirm again.
+            if ttl_ms > 0:
+                get_redis().set(_INTENT_PREFIX + key, json.dumps(intent), px=ttl_ms, nx=True)
+            raise LookupError("Object has not been uploaded yet")
+
+        content_type = head["content_type"].lower()
+        problem = None
+        if head["size"] <= 0:
+            problem = "Empty file"
+        elif head["size"] > int(intent["max_bytes"]):
+            problem = f"File too large (max {intent['max_bytes']} bytes)"
+        elif content_type != intent["content_type"]:
+            problem = f"Content-Type mismatch: expected {intent['content_type']}, got {content_type}"
+        if problem:
+            logger.warning("[direct_upload] rejecting %s for user %s: %s", key, user_id, problem)
+            try:
+                storage.delete_object(key)
+            except RuntimeError as e:
+                logger.warning("[direct_upload] could not delete rejected object %s: %s", key, e)
+            raise ValueError(problem)
+
+        return ConfirmedUpload(
+            key=key,
+            url=storage.public_url(key),
+            purpose=purpose,
+            content_type=content_type,
+            size=head["size"],
+            original_filename=intent.get("original_filename"),
+        )
+
+
+_service = DirectUploadService()
+
+
+def get_direct_upload_service() -> DirectUploadService:
+    return _service
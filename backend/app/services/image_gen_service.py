@@ -10,6 +10,7 @@ from typing import Callable, Optional
 import httpx
 
 from app.core.config import get_settings
+from app.core.http_clients import get_async_http_client, get_http_client
 
 logger = logging.getLogger(__name__)
 
@@ -39,10 +40,11 @@ class FluxNotInstalledError(Exception):
     """Raised when FLUX.1 Schnell dependencies are not available."""
 
 
-def submit_runpod_image_job(*, prompt: str, title: str | None = None) -> RunPodImageSubmitResult:
+def submit_runpod_image_job(*, prompt: str, title: str | None = None, webhook_url: str | None = None) -> RunPodImageSubmitResult:
     """
     Submit a RunPod image generation job and return the job ID.
-    This allows parallel execution - submit the job and poll separately.
+    This allows parallel execution - submit the job and poll separately
+    (or let RunPod POST the result to webhook_url).
     """
     settings = get_settings()
     
@@ -85,6 +87,8 @@ def submit_runpod_image_job(*, prompt: str, title: str | None = None) -> RunPodI
     api_base_url = settings.runpod_api_base_url or "https://api.runpod.ai/v2"
     submit_url = f"{api_base_url.rstrip('/')}/{endpoint_id}/run"
     submit_payload = {"input": {"prompt": enhanced_prompt}}
+    if webhook_url:
+        submit_payload["webhook"] = webhook_url
     
     headers = {
         "Content-Type": "application/json",
@@ -92,10 +96,9 @@ def submit_runpod_image_job(*, prompt: str, title: str | None = None) -> RunPodI
     }
     
     try:
-        with httpx.Client(timeout=float(settings.runpod_request_timeout_seconds or 30)) as client:
-            resp = client.post(submit_url, json=submit_payload, headers=headers)
-            resp.raise_for_status()
-            submit_data = resp.json()
+        resp = get_http_client("runpod").post(submit_url, json=submit_payload, headers=headers)
+        resp.raise_for_status()
+        submit_data = resp.json()
     except httpx.HTTPError as e:
         raise FluxNotInstalledError(f"RunPod submit failed: {e}") from e
     except Exception as e:
@@ -109,11 +112,8 @@ def submit_runpod_image_job(*, prompt: str, title: str | None = None) -> RunPodI
     return RunPodImageSubmitResult(runpod_job_id=str(job_id), raw=submit_data)
 
 
-def get_runpod_image_status(*, runpod_job_id: str) -> RunPodImageStatusResult:
-    """
-    Get the status of a RunPod image generation job.
-    Returns status and image_url if completed.
-    """
+def _runpod_image_status_request(runpod_job_id: str) -> tuple[str, dict]:
+    """Return (status_url, headers) for a RunPod image job status request."""
     settings = get_settings()
     
     # Get RunPod endpoint ID
@@ -131,17 +131,11 @@ def get_runpod_image_status(*, runpod_job_id: str) -> RunPodImageStatusResult:
     
     api_base_url = settings.runpod_api_base_url or "https://api.runpod.ai/v2"
     status_url = f"{api_base_url.rstrip('/')}/{endpoint_id}/status/{runpod_job_id}"
-    
-    try:
-        with httpx.Client(timeout=float(settings.runpod_request_timeout_seconds or 30)) as client:
-            resp = client.get(status_url, headers={"Authorization": f"Bearer {runpod_api_key}"})
-            resp.raise_for_status()
-            status_data = resp.json()
-    except httpx.HTTPError as e:
-        raise FluxNotInstalledError(f"RunPod status check failed: {e}") from e
-    except Exception as e:
-        raise FluxNotInstalledError(f"RunPod status check failed: {type(e).__name__}: {e}") from e
-    
+    return status_url, {"Authorization": f"Bearer {runpod_api_key}"}
+
+
+def parse_runpod_image_status(status_data: dict) -> RunPodImageStatusResult:
+    """Map a RunPod image job document (status response or webhook body) to RunPodImageStatusResult."""
     status = str(status_data.get("status", "")).upper()
     
     # Extract image URL from output if completed
@@ -164,18 +158,52 @@ def get_runpod_image_status(*, runpod_job_id: str) -> RunPodImageStatusResult:
     return RunPodImageStatusResult(status=status, image_url=image_url, raw=status_data)
 
 
+def get_runpod_image_status(*, runpod_job_id: str) -> RunPodImageStatusResult:
+    """
+    Get the status of a RunPod image generation job.
+    Returns status and image_url if completed.
+    """
+    status_url, headers = _runpod_image_status_request(runpod_job_id)
+    
+    try:
+        resp = get_http_client("runpod").get(status_url, headers=headers)
+        resp.raise_for_status()
+        status_data = resp.json()
+    except httpx.HTTPError as e:
+        raise FluxNotInstalledError(f"RunPod status check failed: {e}") from e
+    except Exception as e:
+        raise FluxNotInstalledError(f"RunPod status check failed: {type(e).__name__}: {e}") from e
+    
+    return parse_runpod_image_status(status_data)
+
+
+async def get_runpod_image_status_async(*, runpod_job_id: str) -> RunPodImageStatusResult:
+    """Async variant of get_runpod_image_status on the shared pooled AsyncClient."""
+    status_url, headers = _runpod_image_status_request(runpod_job_id)
+    
+    try:
+        resp = await get_async_http_client("runpod").get(status_url, headers=headers)
+        resp.raise_for_status()
+        status_data = resp.json()
+    except httpx.HTTPError as e:
+        raise FluxNotInstalledError(f"RunPod status check failed: {e}") from e
+    except Exception as e:
+        raise FluxNotInstalledError(f"RunPod status check failed: {type(e).__name__}: {e}") from e
+    
+    return parse_runpod_image_status(status_data)
+
+
 def download_image_from_url(image_url: str) -> bytes:
     """
     Download an image from a URL and return the bytes.
     """
     logger.info(f"[image_gen_service] Downloading image from: {image_url}")
     try:
-        with httpx.Client(timeout=60.0) as client:
-            img_resp = client.get(image_url)
-            img_resp.raise_for_status()
-            image_bytes = img_resp.content
-            logger.info(f"[image_gen_service] Image downloaded successfully ({len(image_bytes)} bytes)")
-            return image_bytes
+        img_resp = get_http_client("download").get(image_url)
+        img_resp.raise_for_status()
+        image_bytes = img_resp.content
+        logger.info(f"[image_gen_service] Image downloaded successfully ({len(image_bytes)} bytes)")
+        return image_bytes
     except httpx.HTTPError as e:
         raise FluxNotInstalledError(f"Failed to download image from {image_url}: {e}") from e
 
@@ -188,7 +216,7 @@ def _generate_via_runpod(
     
     The image is generated in Cloudflare R2 and we download it from the returned URL.
     
-    This function is synchronous and does NOT require Celery. It uses httpx.Client
+    This function is synchronous and does NOT require Celery. It uses the shared httpx.Client
     to make HTTP requests to RunPod's serverless API and polls for completion.
     Can be called from any Python context (FastAPI routes, Celery tasks, etc.).
     """
@@ -248,11 +276,10 @@ def _generate_via_runpod(
     }
     
     try:
-        with httpx.Client(timeout=float(settings.runpod_request_timeout_seconds or 30)) as client:
-            # Submit job
-            resp = client.post(submit_url, json=submit_payload, headers=headers)
-            resp.raise_for_status()
-            submit_data = resp.json()
+        # Submit job
+        resp = get_http_client("runpod").post(submit_url, json=submit_payload, headers=headers)
+        resp.raise_for_status()
+        submit_data = resp.json()
     except httpx.HTTPError as e:
         raise FluxNotInstalledError(f"RunPod submit failed: {e}") from e
     except Exception as e:
@@ -272,12 +299,12 @@ def _generate_via_runpod(
     max_attempts = 120  # Maximum polling attempts (10 minutes at 5s interval)
     poll_interval = 5  # Seconds between polls
     
+    client = get_http_client("runpod")
     for attempt in range(max_attempts):
         try:
-            with httpx.Client(timeout=float(settings.runpod_request_timeout_seconds or 30)) as client:
-                resp = client.get(status_url, headers={"Authorization": f"Bearer {runpod_api_key}"})
-                resp.raise_for_status()
-                status_data = resp.json()
+            resp = client.get(status_url, headers={"Authorization": f"Bearer {runpod_api_key}"})
+            resp.raise_for_status()
+            status_data = resp.json()
         except httpx.HTTPError as e:
             logger.warning(f"[image_gen_service] RunPod status check failed (attempt {attempt + 1}): {e}")
             if attempt < max_attempts - 1:
@@ -315,10 +342,9 @@ def _generate_via_runpod(
             
             # Download image from R2 URL
             try:
-                with httpx.Client(timeout=60.0) as client:
-                    img_resp = client.get(image_url)
-                    img_resp.raise_for_status()
-                    image_bytes = img_resp.content
+                img_resp = get_http_client("download").get(image_url)
+                img_resp.raise_for_status()
+                image_bytes = img_resp.content
             except httpx.HTTPError as e:
                 raise FluxNotInstalledError(f"Failed to download image from {image_url}: {e}") from e
             
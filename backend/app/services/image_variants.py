@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import hashlib
+import io
+import logging
+import multiprocessing
+import posixpath
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional
+
+from app.core.config import get_settings
+from app.core.http_clients import get_http_client
+from app.services.content_store import key_from_url
+from app.services.storage_service import get_storage
+
+logger = logging.getLogger(__name__)
+
+VARIANT_SIZES = (64, 256, 768)
+# Which size list payloads (discover, playlists) should use for cards.
+THUMBNAIL_SIZE = 256
+_CONTENT_TYPES = {"webp": "image/webp", "avif": "image/avif"}
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def variant_formats() -> tuple[str, ...]:
+    """WebP always; AVIF only when this Pillow build can encode it."""
+    from PIL import features
+
+    formats = ["webp"]
+    if get_settings().image_variants_avif and features.check("avif"):
+        formats.append("avif")
+    return tuple(formats)
+
+
+def render_variants(image_bytes: bytes, fmt: str, sizes: tuple[int, ...]) -> Dict[int, bytes]:
+    """
+    Decode once and encode `fmt` at each size (longest edge, never upscaled).
+
+    Runs in a pool process, so it only takes and returns picklable values.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(image_bytes)) as src:
+        src = ImageOps.exif_transpose(src)
+        if src.mode not in ("RGB", "RGBA"):
+            src = src.convert("RGBA" if "A" in src.getbands() else "RGB")
+        out: Dict[int, bytes] = {}
+        for size in sorted(sizes, reverse=True):
+            img = src.copy()
+            img.thumbnail((size, size), Image.Resampling.LANCZOS)
+            buf = io.BytesIO()
+            if fmt == "webp":
+                img.save(buf, "WEBP", quality=80, method=4)
+            else:
+                img.save(buf, "AVIF", quality=60)
+            out[size] = buf.getvalue()
+    return out
+
+
+def get_variant_pool() -> ProcessPoolExecutor:
+    """Process pool for encoding; spawned (not forked) so workers don't inherit loaded models."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(
+                    max_workers=max(int(get_settings().image_variant_processes), 1),
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+    return _pool
+
+
+def shutdown_variant_pool() -> None:
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _variant_key(source_key: str, size: int, fmt: str) -> str:
+    stem, _ = posixpath.splitext(source_key)
+    return f"{stem}_{size}.{fmt}"
+
+
+def load_source(url: str) -> Optional[tuple[str, bytes]]:
+    """Fetch the original image; returns (storage key, bytes) or None if it cannot be read."""
+    storage = get_storage()
+    key = key_from_url(storage, url)
+    if key:
+        data = storage.get_bytes(key)
+        return (key, data) if data is not None else None
+    if url.startswith(("http://", "https://")):
+        # Externally hosted (e.g. a provider URL); variants go under image/variants/.
+        resp = get_http_client("download").get(url)
+        resp.raise_for_status()
+        return f"image/variants/{hashlib.sha256(url.encode()).hexdigest()[:32]}.png", resp.content
+    return None
+
+
+def build_variants(source_url: str) -> Optional[dict]:
+    """
+    Render and store every size/format of the image at `source_url`.
+
+    Returns {"webp": {"64": url, ...}, "avif": {...}} or None when the source is unreadable.
+    """
+    source = load_source(source_url)
+    if source is None:
+        logger.warning("[image_variants] cannot read source %s", source_url)
+        return None
+    source_key, image_bytes = source
+
+    pool = get_variant_pool()
+    futures = {fmt: pool.submit(render_variants, image_bytes, fmt, VARIANT_SIZES) for fmt in variant_formats()}
+    storage = get_storage()
+    variants: dict = {}
+    for fmt, fut in futures.items():
+        for size, data in fut.result().items():
+            key = _variant_key(source_key, size, fmt)
+            variants.setdefault(fmt, {})[str(size)] = storage.put_bytes(key, data, _CONTENT_TYPES[fmt])
+    return variants
+
+
+def thumbnail_url(variants: Optional[dict], fallback: Optional[str], size: int = THUMBNAIL_SIZE) -> Optional[str]:
+    """Best small variant for list payloads, falling back to the original URL."""
+    if variants:
+        for fmt in ("webp", "avif"):
+            url = (variants.get(fmt) or {}).get(str(size))
+            if url:
+                return url
+    return fallback
+
+
+def variant_urls(variants: Optional[dict]) -> list[str]:
+    return [url for by_size in (variants or {}).values() for url in by_size.values()]
@@ -0,0 +1,135 @@
+from __future__ import annotations
+
+import logging
+import time
+from dataclasses import asdict
+from multiprocessing import AuthenticationError, resource_tracker
+from multiprocessing.connection import Client, Connection
+from multiprocessing.shared_memory import SharedMemory
+from typing import Optional
+
+import numpy as np
+
+from app.core.config import get_settings
+from app.services.ace_step_service import AceStepGenerateParams, AceStepNotInstalledError, ProgressCb
+from app.services.audio_codec import EncodedAudio, encode_audio
+
+logger = logging.getLogger(__name__)
+
+# Worker side of the ACE-Step inference sidecar (app/services/inference_server.py).
+#
+# Protocol: one request per connection, as pickled dicts.
+#   worker  -> {"op": "ping"}                      sidecar -> {"type": "pong", "ready": bool, "model": str | None, "error": str | None, "models": {...}}
+#   worker  -> {"op": "generate", "params": {...}} sidecar -> {"type": "progress", "pct": int, "msg": str}*
+#                                                  then {"type": "result", "shm": name, "shape": (c, n), "sample_rate": int}
+#                                                    or {"type": "error", "kind": "not_installed" | "runtime", "message": str}
+#   worker  -> {"op": "release"}  once it has encoded from the shared-memory block; the sidecar then unlinks it.
+
+
+class InferenceUnavailableError(RuntimeError):
+    """The inference sidecar is not running, or rejected our auth key."""
+
+
+def inference_address() -> str:
+    return get_settings().inference_socket_path
+
+
+def inference_authkey() -> bytes:
+    settings = get_settings()
+    return (settings.inference_authkey or settings.jwt_secret).encode()
+
+
+def connect() -> Connection:
+    address = inference_address()
+    try:
+        return Client(address, family="AF_UNIX", authkey=inference_authkey())
+    except (FileNotFoundError, ConnectionRefusedError, AuthenticationError) as e:
+        raise InferenceUnavailableError(f"Inference sidecar not reachable at {address}: {e}") from e
+
+
+def ping(timeout: float = 5.0) -> dict:
+    """
+    The sidecar's pong: {"ready": bool, "model": "loaded" | "fallback" | None, "error": str | None,
+    "models": residency metrics}.
+    """
+    with connect() as conn:
+        conn.send({"op": "ping"})
+        if not conn.poll(timeout):
+            raise InferenceUnavailableError(f"Inference sidecar did not answer within {timeout}s")
+        return conn.recv()
+
+
+def attach_shared_memory(name: str) -> SharedMemory:
+    """
+    Map a block the sidecar created without taking ownership of it. Before 3.13 attaching
+    registers the block with this process's resource tracker, which would unlink it (and
+    warn about a leak) when the worker exits; the sidecar is the one that unlinks it.
+    """
+    try:
+        return SharedMemory(name=name, track=False)  # Python 3.13+
+    except TypeError:
+        shm = SharedMemory(name=name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+def _encode_shared(conn: Connection, result: dict, fmt: str) -> EncodedAudio:
+    """Encode straight out of the sidecar's shared-memory block, then let it go."""
+    shm = attach_shared_memory(result["shm"])
+    samples = None
+    try:
+        samples = np.ndarray(tuple(result["shape"]), dtype=np.float32, buffer=shm.buf)
+        return encode_audio(samples, sample_rate=int(result["sample_rate"]), fmt=fmt)
+    finally:
+        samples = None  # close() refuses while a view still exports the buffer
+        try:
+            shm.close()
+        except BufferError:
+            pass  # an in-flight exception still references a view; the mapping goes with it
+        try:
+            conn.send({"op": "release"})
+        except OSError:
+            pass
+
+
+def generate_audio_remote(params: AceStepGenerateParams, *, progress_cb: Optional[ProgressCb] = None) -> EncodedAudio:
+    """
+    ace_step_service.generate_audio, with inference running in the sidecar.
+
+    Raises AceStepNotInstalledError when the sidecar has no usable model (so callers fall
+    back exactly as they do in-process), InferenceUnavailableError when it isn't running,
+    and RuntimeError for failed or timed-out generations.
+    """
+    timeout = get_settings().inference_timeout_seconds
+    deadline = time.monotonic() + timeout
+    with connect() as conn:
+        conn.send({"op": "generate", "params": asdict(params)})
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0 or not conn.poll(remaining):
+                    raise RuntimeError(f"Inference sidecar timed out after {timeout}s")
+                msg = conn.recv()
+            except (EOFError, OSError) as e:
+                raise RuntimeError(f"Inference sidecar closed the connection: {e}") from e
+
+            kind = msg.get("type")
+            if kind == "progress":
+                if progress_cb:
+                    progress_cb(int(msg["pct"]), msg["msg"])
+            elif kind == "error":
+                if msg.get("kind") == "not_installed":
+                    raise AceStepNotInstalledError(msg["message"])
+                raise RuntimeError(f"Inference sidecar: {msg['message']}")
+            elif kind == "result":
+                if progress_cb:
+                    progress_cb(85, "ace-step: encoding audio")
+                encoded = _encode_shared(conn, msg, params.audio_format)
+                logger.info(
+                    f"[inference_client] Encoded {encoded.format}: {len(encoded.data)} bytes at {msg['sample_rate']} Hz"
+                )
+                if progress_cb:
+                    progress_cb(90, "ace-step: done")
+                return encoded
+            else:
+                raise RuntimeError(f"Inference sidecar sent an unexpected message: {kind}")
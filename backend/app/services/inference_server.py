@@ -0,0 +1,168 @@
+"""
+Long-lived ACE-Step inference process:
+
+    python -m app.services.inference_server
+
+Loads the DiT/LLM handlers once and serves generation requests from Celery workers
+running with ACE_STEP_INFERENCE=sidecar over an authenticated Unix socket (protocol in
+app/services/inference_client.py). Jobs run one at a time on the device. Each waveform
+goes back through a shared-memory block that the worker encodes from directly, so
+audio is never pickled through the socket or written to disk.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import signal
+import sys
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Connection, Listener
+from multiprocessing.shared_memory import SharedMemory
+from typing import Optional
+
+import numpy as np
+
+from app.core.config import get_settings
+from app.services.ace_step_service import (
+    AceStepGenerateParams,
+    AceStepNotInstalledError,
+    generate_waveform,
+    warm_up,
+)
+from app.services.inference_client import inference_address, inference_authkey
+from app.services.model_residency import get_model_residency
+
+logger = logging.getLogger(__name__)
+
+
+class InferenceServer:
+    def __init__(self, address: str, authkey: bytes):
+        self.address = address
+        self.authkey = authkey
+        self.ready = threading.Event()
+        self.model: Optional[str] = None  # "loaded" | "fallback" once warm
+        self.error: Optional[str] = None
+        # One generation at a time: the handlers are not re-entrant and the device is the bottleneck.
+        self._device_lock = threading.Lock()
+        self._listener: Optional[Listener] = None
+        self._closing = False
+
+    def warm_up(self) -> None:
+        """Load the models before the first job; ping reports ready once they are resident."""
+        try:
+            with self._device_lock:
+                self.model = warm_up(generation_seconds=get_settings().worker_warmup_generation_seconds)
+        except Exception as e:
+            self.error = str(e)
+            logger.warning(f"[inference_server] model warm-up failed: {e}")
+            return
+        self.error = None
+        self.ready.set()
+        print(f"[inference_server] warm-up done: {self.model}", flush=True)
+
+    def serve_forever(self) -> None:
+        if os.path.exists(self.address):
+            os.unlink(self.address)  # stale socket from a previous run
+        umask = os.umask(0o177)  # socket is owner-only, on top of the auth key
+        try:
+            self._listener = Listener(self.address, family="AF_UNIX", authkey=self.authkey)
+        finally:
+            os.umask(umask)
+        print(f"[inference_server] listening on {self.address}", flush=True)
+        try:
+            while not self._closing:
+                try:
+                    conn = self._listener.accept()
+                except (AuthenticationError, EOFError, OSError) as e:
+                    if not self._closing:
+                        logger.warning(f"[inference_server] rejected connection: {e}")
+                    continue
+                if self._closing:
+                    conn.close()
+                    break
+                threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+        finally:
+            self._listener.close()
+
+    def close(self) -> None:
+        """Stop accepting connections (from another thread); in-flight jobs finish on their own."""
+        self._closing = True
+        try:
+            Client(self.address, family="AF_UNIX", authkey=self.authkey).close()  # wake accept()
+        except (OSError, AuthenticationError):
+            pass
+
+    def _serve(self, conn: Connection) -> None:
+        with conn:
+            try:
+                msg = conn.recv()
+            except (EOFError, OSError):
+                return
+            op = msg.get("op")
+            if op == "ping":
+                conn.send(
+                    {
+                        "type": "pong",
+                        "ready": self.ready.is_set(),
+                        "model": self.model,
+                        "error": self.error,
+                        "models": get_model_residency().metrics(),
+                    }
+                )
+            elif op == "generate":
+                self._generate(conn, AceStepGenerateParams(**msg["params"]))
+            else:
+                conn.send({"type": "error", "kind": "runtime", "message": f"Unknown op: {op}"})
+
+    def _generate(self, conn: Connection, params: AceStepGenerateParams) -> None:
+        def progress(pct: int, message: str) -> None:
+            try:
+                conn.send({"type": "progress", "pct": pct, "msg": message})
+            except OSError:
+                pass  # the worker went away; finish anyway so the device is left in a clean state
+
+        try:
+            with self._device_lock:
+                samples, sample_rate = generate_waveform(params, progress_cb=progress)
+        except AceStepNotInstalledError as e:
+            conn.send({"type": "error", "kind": "not_installed", "message": str(e)})
+            return
+        except Exception as e:
+            logger.exception("[inference_server] generation failed")
+            conn.send({"type": "error", "kind": "runtime", "message": str(e)})
+            return
+        # The device is free again; the hand-off below overlaps with the next job.
+        self._hand_off(conn, samples, sample_rate)
+
+    def _hand_off(self, conn: Connection, samples: np.ndarray, sample_rate: int) -> None:
+        shm = SharedMemory(create=True, size=max(samples.nbytes, 1))
+        try:
+            view = np.ndarray(samples.shape, dtype=np.float32, buffer=shm.buf)
+            view[...] = samples
+            del view
+            conn.send({"type": "result", "shm": shm.name, "shape": samples.shape, "sample_rate": int(sample_rate)})
+            # Keep the block until the worker has encoded from it (or gives up).
+            if conn.poll(get_settings().inference_release_timeout_seconds):
+                conn.recv()
+        except (EOFError, OSError):
+            pass
+        finally:
+            shm.close()
+            shm.unlink()
+
+
+def main() -> None:
+    logging.basicConfig(level=logging.INFO)
+    server = InferenceServer(inference_address(), inference_authkey())
+    # SystemExit unwinds serve_forever, which closes the listener and removes the socket file.
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    threading.Thread(target=server.warm_up, daemon=True).start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
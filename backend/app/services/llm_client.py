@@ -12,6 +12,8 @@ from typing import Optional
 
 import httpx
 
+from app.core.http_clients import get_http_client
+
 logger = logging.getLogger(__name__)
 
 # System prompt for expanding user queries into music generation inputs
@@ -151,14 +153,13 @@ def expand_sample_query(
         progress_cb(2, "llm: calling Claude API")
 
     try:
-        with httpx.Client(timeout=60.0) as client:
-            resp = client.post(
-                "https://api.anthropic.com/v1/messages",
-                json=payload,
-                headers=headers,
-            )
-            resp.raise_for_status()
-            data = resp.json()
+        resp = get_http_client("llm").post(
+            "https://api.anthropic.com/v1/messages",
+            json=payload,
+            headers=headers,
+        )
+        resp.raise_for_status()
+        data = resp.json()
     except httpx.HTTPError as e:
         raise LlmClientError(f"Anthropic API call failed: {e}") from e
     except Exception as e:
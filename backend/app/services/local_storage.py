@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import itertools
+import mimetypes
+import os
+import shutil
+from datetime import date
+from pathlib import Path
+from typing import BinaryIO, Iterable, Optional
+from uuid import uuid4
+
+from app.core.config import get_settings
+from app.core.http_clients import get_http_client
+from app.services.content_store import content_addressed_enabled, store_content_addressed
+from app.services.storage_service import (
+    _READ_CHUNK_SIZE,
+    AudioStorageResult,
+    StoredFile,
+    StreamedUpload,
+    UploadTooLargeError,
+    _read_chunks,
+    _songs_key,
+)
+
+
+def local_etag(stat_result: os.stat_result) -> str:
+    """Strong ETag from size + mtime; atomic replace always changes mtime."""
+    return f'"{stat_result.st_size:x}-{stat_result.st_mtime_ns:x}"'
+
+
+class LocalStorageBackend:
+    """
+    Filesystem storage under `local_storage_dir`, for on-prem and dev deployments.
+
+    Same interface as StorageService. Every write goes to a temp file in the target
+    directory and is moved into place with os.replace, so readers never see a partial
+    object. Objects are served by GET /api/files/{key}, which is also their public URL.
+    """
+
+    def __init__(self, root: str) -> None:
+        self.root = Path(root).resolve()
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def path_for(self, key: str) -> Path:
+        """Map an object key to its path, refusing keys that escape the root."""
+        path = (self.root / key).resolve()
+        if path == self.root or self.root not in path.parents:
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    def _write_atomic(self, key: str, chunks: Iterable[bytes]) -> int:
+        path = self.path_for(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{uuid4().hex}.tmp")
+        size = 0
+        try:
+            with open(tmp, "wb") as f:
+                for chunk in chunks:
+                    if chunk:
+                        f.write(chunk)
+                        size += len(chunk)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, path)
+        except BaseException as e:
+            tmp.unlink(missing_ok=True)
+            if isinstance(e, OSError):
+                raise RuntimeError(f"Local storage write failed for key '{key}': {type(e).__name__}: {e}") from e
+            raise
+        return size
+
+    def public_url(self, key: str) -> str:
+        return f"{get_settings().api_prefix}/files/{key}"
+
+    def put_bytes(self, key: str, content: bytes, content_type: str) -> str:
+        self._write_atomic(key, [content])
+        return self.public_url(key)
+
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        try:
+            return self.path_for(key).read_bytes()
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def download_to(self, key: str, path: Path) -> bool:
+        try:
+            shutil.copyfile(self.path_for(key), path)
+        except (FileNotFoundError, ValueError):
+            return False
+        return True
+
+    def store_bytes(
+        self,
+        *,
+        content: bytes,
+        suffix: str,
+        content_type: str = "application/octet-stream",
+        folder: str = "audio",
+        content_addressed: Optional[bool] = None,
+    ) -> StoredFile:
+        if content_addressed_enabled(content_addressed):
+            cas = store_content_addressed(self, content=content, suffix=suffix, content_type=content_type, folder=folder)
+            return StoredFile(key=cas.key, url=cas.url)
+        key = f"{folder}/{uuid4().hex}{suffix}"
+        self._write_atomic(key, [content])
+        return StoredFile(key=key, url=self.public_url(key))
+
+    def upload_to_r2(
+        self,
+        content: bytes,
+        suffix: str,
+        content_type: str = "audio/mpeg",
+        *,
+        folder_date: Optional[date] = None,
+        content_addressed: Optional[bool] = None,
+    ) -> AudioStorageResult:
+        if content_addressed_enabled(content_addressed):
+            cas = store_content_addressed(self, content=content, suffix=suffix, content_type=content_type, folder="songs")
+            return AudioStorageResult(bytes=content, r2_url=cas.url, key=cas.key)
+        key = _songs_key(suffix, folder_date)
+        self._write_atomic(key, [content])
+        return AudioStorageResult(bytes=content, r2_url=self.public_url(key), key=key)
+
+    def upload_stream_to_r2(
+        self,
+        chunks: Iterable[bytes],
+        suffix: str,
+        content_type: str = "audio/mpeg",
+        *,
+        folder_date: Optional[date] = None,
+    ) -> StoredFile:
+        key = _songs_key(suffix, folder_date)
+        self._write_atomic(key, chunks)
+        return StoredFile(key=key, url=self.public_url(key))
+
+    def store_stream(
+        self,
+        fileobj: BinaryIO,
+        *,
+        suffix: str,
+        content_type: str = "application/octet-stream",
+        folder: str = "audio",
+        max_bytes: Optional[int] = None,
+    ) -> StreamedUpload:
+        first = fileobj.read(_READ_CHUNK_SIZE)
+        if not first:
+            raise ValueError("Empty file")
+        if max_bytes is not None and len(first) > max_bytes:
+            raise UploadTooLargeError(f"File too large (max {max_bytes} bytes)")
+
+        digest = hashlib.sha256(first)
+        counter = [len(first)]
+        chunks = itertools.chain([first], _read_chunks(fileobj, max_bytes=max_bytes, digest=digest, counter=counter))
+        key = f"{folder}/{uuid4().hex}{suffix}"
+        self._write_atomic(key, chunks)
+        return StreamedUpload(key=key, url=self.public_url(key), size=counter[0], sha256=digest.hexdigest())
+
+    def copy_url_to_r2(
+        self,
+        source_url: str,
+        suffix: str,
+        content_type: str = "audio/mpeg",
+        *,
+        folder_date: Optional[date] = None,
+    ) -> StoredFile:
+        with get_http_client("download").stream("GET", source_url) as resp:
+            resp.raise_for_status()
+            return self.upload_stream_to_r2(resp.iter_bytes(), suffix, content_type, folder_date=folder_date)
+
+    def presign_put(self, key: str, *, content_type: str, ttl_seconds: int) -> str:
+        raise RuntimeError("Direct uploads need S3/R2 storage (STORAGE_BACKEND=s3)")
+
+    def head_object(self, key: str) -> Optional[dict]:
+        try:
+            st = self.path_for(key).stat()
+        except (FileNotFoundError, ValueError):
+            return None
+        return {
+            "size": st.st_size,
+            "content_type": mimetypes.guess_type(key)[0] or "application/octet-stream",
+            "etag": local_etag(st).strip('"'),
+        }
+
+    def delete_object(self, key: str) -> None:
+        try:
+            self.path_for(key).unlink(missing_ok=True)
+        except OSError as e:
+            raise RuntimeError(f"Local storage delete failed for key '{key}': {type(e).__name__}: {e}") from e
+
+    async def store_bytes_async(
+        self,
+        *,
+        content: bytes,
+        suffix: str,
+        content_type: str = "application/octet-stream",
+        folder: str = "audio",
+        content_addressed: Optional[bool] = None,
+    ) -> StoredFile:
+        return await asyncio.to_thread(
+            self.store_bytes,
+            content=content,
+            suffix=suffix,
+            content_type=content_type,
+            folder=folder,
+            content_addressed=content_addressed,
+        )
+
+    async def store_stream_async(
+        self,
+        fileobj: BinaryIO,
+        *,
+        suffix: str,
+        content_type: str = "application/octet-stream",
+        folder: str = "audio",
+        max_bytes: Optional[int] = None,
+    ) -> StreamedUpload:
+        return await asyncio.to_thread(
+            self.store_stream, fileobj, suffix=suffix, content_type=content_type, folder=folder, max_bytes=max_bytes
+        )
+
+    async def upload_to_r2_async(
+        self,
+        content: bytes,
+        suffix: str,
+        content_type: str = "audio/mpeg",
+        *,
+        folder_date: Optional[date] = None,
+        content_addressed: Optional[bool] = None,
+    ) -> AudioStorageResult:
+        return await asyncio.to_thread(
+            self.upload_to_r2, content, suffix, content_type, folder_date=folder_date, content_addressed=content_addressed
+        )
@@ -0,0 +1,332 @@
+from __future__ import annotations
+
+import gc
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterator, Optional
+
+from app.core.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+_MiB = 1024 * 1024
+
+# Model states:
+#   unloaded   not in memory; the next use() loads it
+#   resident   loaded on its device
+#   offloaded  weights parked in host RAM; the next use() moves them back (much cheaper than a load)
+
+
+def torch_modules(obj: Any) -> list:
+    """The torch.nn.Module held by (or being) `obj`; handlers keep their networks as attributes."""
+    try:
+        import torch
+    except ImportError:
+        return []
+    if isinstance(obj, torch.nn.Module):
+        return [obj]
+    return [v for v in getattr(obj, "__dict__", {}).values() if isinstance(v, torch.nn.Module)]
+
+
+def module_bytes(obj: Any) -> tuple[int, int]:
+    """(host, device) bytes of the parameters and buffers of `obj`'s modules."""
+    host = device = 0
+    seen: set[int] = set()
+    for module in torch_modules(obj):
+        for t in itertools.chain(module.parameters(), module.buffers()):
+            if id(t) in seen:
+                continue
+            seen.add(id(t))
+            n = t.numel() * t.element_size()
+            if t.device.type == "cpu":
+                host += n
+            else:
+                device += n
+    return host, device
+
+
+def offload_modules(obj: Any) -> list:
+    """Move `obj`'s modules to host RAM; returns what restore_modules needs to move them back."""
+    saved = []
+    for module in torch_modules(obj):
+        tensor = next(itertools.chain(module.parameters(), module.buffers()), None)
+        if tensor is not None and tensor.device.type != "cpu":
+            saved.append((module, tensor.device))
+            module.to("cpu")
+    return saved
+
+
+def restore_modules(obj: Any, saved: list) -> None:
+    for module, device in saved:
+        module.to(device)
+
+
+def _device_allocated() -> Optional[int]:
+    """Bytes the torch allocator holds on the accelerator, when one is in use."""
+    try:
+        import torch
+    except ImportError:
+        return None
+    try:
+        if torch.cuda.is_available() and torch.cuda.is_initialized():
+            return int(torch.cuda.memory_allocated())
+        if torch.backends.mps.is_available():
+            return int(torch.mps.current_allocated_memory())
+    except Exception:
+        pass
+    return None
+
+
+def _empty_device_cache() -> None:
+    gc.collect()
+    try:
+        import torch
+    except ImportError:
+        return
+    try:
+        if torch.cuda.is_available() and torch.cuda.is_initialized():
+            torch.cuda.empty_cache()
+        elif torch.backends.mps.is_available():
+            torch.mps.empty_cache()
+    except Exception:
+        pass
+
+
+@dataclass
+class _Model:
+    name: str
+    load: Callable[..., Any]
+    unload: Optional[Callable[[Any], None]]
+    offload: Optional[Callable[[Any], Any]]
+    restore: Optional[Callable[[Any, Any], None]]
+    measure: Callable[[Any], tuple[int, int]]
+    handle: Any = None
+    offloaded: Any = None  # offload()'s return value, handed back to restore()
+    state: str = "unloaded"
+    host_bytes: int = 0
+    device_bytes: int = 0  # last measured on-device size; the estimate for the next load
+    in_use: int = 0
+    last_used: Optional[float] = None
+    loads: int = 0
+    restores: int = 0
+    offloads: int = 0
+    unloads: int = 0
+    load_seconds_total: float = 0.0
+    last_load_seconds: Optional[float] = None
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+class ModelResidencyManager:
+    """
+    Keeps registered models loaded on demand within a device-memory budget.
+
+    `use(name)` loads a model lazily and pins it while the caller holds it. To make room
+    under the budget, idle models are offloaded to host RAM (when they support it and
+    offloading is enabled) or unloaded, least recently used first. Models idle for longer
+    than `idle_seconds` are unloaded by a background reaper.
+    """
+
+    def __init__(self, *, budget_bytes: int = 0, idle_seconds: float = 0, offload: bool = True):
+        self.budget_bytes = max(0, int(budget_bytes))
+        self.idle_seconds = max(0.0, float(idle_seconds))
+        self.offload = offload
+        self._lock = threading.RLock()
+        self._models: dict[str, _Model] = {}
+        self._reaper: Optional[threading.Thread] = None
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._models
+
+    def register(
+        self,
+        name: str,
+        *,
+        load: Callable[..., Any],
+        unload: Optional[Callable[[Any], None]] = None,
+        offload: Optional[Callable[[Any], Any]] = None,
+        restore: Optional[Callable[[Any, Any], None]] = None,
+        measure: Callable[[Any], tuple[int, int]] = module_bytes,
+    ) -> None:
+        """Declare a model; registering a name twice keeps the first registration."""
+        with self._lock:
+            if name not in self._models:
+                self._models[name] = _Model(
+                    name=name, load=load, unload=unload, offload=offload, restore=restore, measure=measure
+                )
+
+    @contextmanager
+    def use(self, name: str, **load_kwargs: Any) -> Iterator[Any]:
+        """Yield the model's handle, loading or restoring it first; `load_kwargs` go to its loader."""
+        model = self._models[name]
+        with model.lock:
+            with self._lock:
+                model.in_use += 1  # pinned: eviction skips it from here on
+            try:
+                self._make_resident(model, load_kwargs)
+            except BaseException:
+                with self._lock:
+                    model.in_use -= 1
+                raise
+        try:
+            yield model.handle
+        finally:
+            with self._lock:
+                model.in_use -= 1
+                model.last_used = time.monotonic()
+            self._start_reaper()
+
+    def _make_resident(self, model: _Model, load_kwargs: dict) -> None:
+        if model.state == "resident":
+            return
+        self._make_room(model.device_bytes, exclude=model)
+        before = _device_allocated()
+        start = time.monotonic()
+        if model.state == "offloaded":
+            model.restore(model.handle, model.offloaded)
+            model.offloaded = None
+            model.restores += 1
+        else:
+            model.handle = model.load(**load_kwargs)
+            model.loads += 1
+        elapsed = time.monotonic() - start
+        host, device = model.measure(model.handle)
+        after = _device_allocated()
+        if before is not None and after is not None:
+            device = max(device, after - before)  # catches allocations outside nn.Modules (e.g. KV caches)
+        with self._lock:
+            model.state = "resident"
+            model.host_bytes, model.device_bytes = host, device
+            model.last_load_seconds = elapsed
+            model.load_seconds_total += elapsed
+        logger.info(
+            f"[model_residency] {model.name} resident in {elapsed:.1f}s "
+            f"({device / _MiB:.0f} MiB device, {host / _MiB:.0f} MiB host)"
+        )
+        self._make_room(0, exclude=model)  # enforce the budget with the measured size
+
+    def _device_used(self) -> int:
+        return sum(m.device_bytes for m in self._models.values() if m.state == "resident")
+
+    def _make_room(self, needed: int, *, exclude: _Model) -> None:
+        if not self.budget_bytes:
+            return
+        with self._lock:
+            idle = sorted(
+                (m for m in self._models.values() if m is not exclude and m.state == "resident" and m.in_use == 0),
+                key=lambda m: m.last_used or 0.0,
+            )
+            for m in idle:
+                if self._device_used() + needed <= self.budget_bytes:
+                    break
+                self._evict(m, reason="budget")
+            used = self._device_used() + needed
+            if used > self.budget_bytes:
+                logger.warning(
+                    f"[model_residency] {used / _MiB:.0f} MiB needed with a {self.budget_bytes / _MiB:.0f} MiB "
+                    "budget; the rest is pinned by running jobs"
+                )
+
+    def _evict(self, model: _Model, *, reason: str, unload: bool = False) -> None:
+        if model.state == "resident" and self.offload and model.offload and not unload:
+            model.offloaded = model.offload(model.handle)
+            model.state = "offloaded"
+            model.offloads += 1
+            action = "offloaded"
+        else:
+            try:
+                if model.unload is not None:
+                    model.unload(model.handle)
+            finally:
+                model.handle = model.offloaded = None
+                model.state = "unloaded"
+                model.unloads += 1
+            action = "unloaded"
+        _empty_device_cache()
+        logger.info(f"[model_residency] {action} {model.name} ({reason})")
+
+    def evict(self, name: str) -> bool:
+        """Unload an idle model now; False if it is in use or not loaded."""
+        with self._lock:
+            model = self._models[name]
+            if model.in_use or model.state == "unloaded":
+                return False
+            self._evict(model, reason="requested", unload=True)
+            return True
+
+    def release_idle(self, now: Optional[float] = None) -> list[str]:
+        """Unload models unused for `idle_seconds`; returns their names."""
+        if not self.idle_seconds:
+            return []
+        now = time.monotonic() if now is None else now
+        released = []
+        with self._lock:
+            for m in self._models.values():
+                if m.state != "unloaded" and m.in_use == 0 and m.last_used is not None:
+                    if now - m.last_used >= self.idle_seconds:
+                        self._evict(m, reason="idle", unload=True)
+                        released.append(m.name)
+        return released
+
+    def _start_reaper(self) -> None:
+        if not self.idle_seconds or self._reaper is not None:
+            return
+        with self._lock:
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap, name="model-residency", daemon=True)
+                self._reaper.start()
+
+    def _reap(self) -> None:
+        interval = max(1.0, min(self.idle_seconds / 2, 30.0))
+        while True:
+            time.sleep(interval)
+            try:
+                self.release_idle()
+            except Exception as e:
+                logger.warning(f"[model_residency] idle release failed: {e}")
+
+    def metrics(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            models = {
+                m.name: {
+                    "state": m.state,
+                    "in_use": m.in_use,
+                    "device_mb": round(m.device_bytes / _MiB, 1),
+                    "host_mb": round(m.host_bytes / _MiB, 1),
+                    "loads": m.loads,
+                    "restores": m.restores,
+                    "offloads": m.offloads,
+                    "unloads": m.unloads,
+                    "last_load_seconds": None if m.last_load_seconds is None else round(m.last_load_seconds, 3),
+                    "load_seconds_total": round(m.load_seconds_total, 3),
+                    "idle_seconds": None if m.in_use or m.last_used is None else round(now - m.last_used, 1),
+                }
+                for m in self._models.values()
+            }
+            return {
+                "budget_mb": round(self.budget_bytes / _MiB, 1),
+                "device_mb": round(self._device_used() / _MiB, 1),
+                "models": models,
+            }
+
+
+_manager: Optional[ModelResidencyManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_model_residency() -> ModelResidencyManager:
+    global _manager
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                settings = get_settings()
+                _manager = ModelResidencyManager(
+                    budget_bytes=int(settings.model_memory_budget_mb) * _MiB,
+                    idle_seconds=settings.model_idle_unload_seconds,
+                    offload=settings.model_offload_idle,
+                )
+    return _manager
@@ -1,57 +1,48 @@
 from __future__ import annotations
 
 import logging
-import math
-import struct
 from dataclasses import dataclass
 from typing import Callable, Optional
 
-from app.services.ace_step_service import AceStepGenerateParams, AceStepNotInstalledError, generate_wav_bytes
+from app.core.config import get_settings
+from app.services.ace_step_service import AceStepGenerateParams, AceStepNotInstalledError, generate_audio
+from app.services.audio_codec import AUDIO_FORMATS, encode_audio, sine
+from app.services.inference_client import generate_audio_remote
 
 logger = logging.getLogger(__name__)
 
 
 @dataclass
 class MusicGenResult:
-    wav_bytes: bytes
+    # Encoded song; audio_format/suffix/content_type describe what was actually produced.
+    audio_bytes: bytes
+    audio_format: str
+    suffix: str
+    content_type: str
     bpm: int | None = None
 
 
 ProgressCb = Callable[[int, str], None]
 
 
-def _wav_sine(*, seconds: int, sample_rate: int = 44100, freq: float = 220.0) -> bytes:
-    """Generate a tiny WAV (PCM16 mono) sine wave for MVP plumbing."""
-    n_samples = max(1, int(seconds * sample_rate))
-    amp = 0.2
-    frames = bytearray()
-    for i in range(n_samples):
-        t = i / sample_rate
-        sample = int(amp * 32767.0 * math.sin(2.0 * math.pi * freq * t))
-        frames += struct.pack("<h", sample)
-
-    # WAV header (RIFF)
-    num_channels = 1
-    bits_per_sample = 16
-    byte_rate = sample_rate * num_channels * bits_per_sample // 8
-    block_align = num_channels * bits_per_sample // 8
-    data_size = len(frames)
-    riff_size = 36 + data_size
-
-    header = b"RIFF" + struct.pack("<I", riff_size) + b"WAVE"
-    fmt = b"fmt " + struct.pack("<IHHIIHH", 16, 1, num_channels, sample_rate, byte_rate, block_align, bits_per_sample)
-    data = b"data" + struct.pack("<I", data_size) + frames
-    return header + fmt + data
-
-
-def generate_music(*, prompt: str, lyrics: str | None, duration: int, progress_cb: Optional[ProgressCb] = None) -> MusicGenResult:
+def generate_music(
+    *,
+    prompt: str,
+    lyrics: str | None,
+    duration: int,
+    audio_format: str = "wav",
+    thinking: bool = True,
+    progress_cb: Optional[ProgressCb] = None,
+) -> MusicGenResult:
     """
-    Generate music audio as WAV bytes.
+    Generate music encoded as `audio_format` (wav/flac/mp3/opus; anything else means wav).
 
     Preference order:
-    1) ACE-Step 1.5 local inference (when deps + weights are installed)
+    1) ACE-Step 1.5 local inference (when deps + weights are installed), in this process
+       or in the inference sidecar (ACE_STEP_INFERENCE=sidecar)
     2) MVP fallback sine wave (keeps the product runnable without heavy deps)
     """
+    fmt = audio_format if audio_format in AUDIO_FORMATS else "wav"
     print(f"[music_gen_service] generate_music called: prompt='{prompt[:50]}...', duration={duration}", flush=True)
     logger.info(f"fsdafafgsg")
     # print the lyrics if it exists
@@ -61,19 +52,28 @@ def generate_music(*, prompt: str, lyrics: str | None, duration: int, progress_c
         logger.info("[music_gen_service] No lyrics provided !!!!!!!!!!!!!!!!!!")
     try:
         print("[music_gen_service] Attempting ACE-Step generation...", flush=True)
-        wav = generate_wav_bytes(
-            AceStepGenerateParams(prompt=prompt, lyrics=lyrics, duration=duration),
+        generate = generate_audio_remote if get_settings().ace_step_inference == "sidecar" else generate_audio
+        encoded = generate(
+            AceStepGenerateParams(
+                prompt=prompt, lyrics=lyrics, duration=duration, audio_format=fmt, thinking=thinking
+            ),
             progress_cb=progress_cb,
         )
         print("[music_gen_service] ACE-Step generation succeeded!", flush=True)
-        return MusicGenResult(wav_bytes=wav, bpm=None)
+        bpm = None
     except AceStepNotInstalledError as e:
         print(f"[music_gen_service] ACE-Step not available, using fallback: {e}", flush=True)
         if progress_cb:
             progress_cb(15, "fallback: synth tone (ace-step not available)")
-        wav = _wav_sine(seconds=min(max(duration, 1), 60), freq=220.0 if not lyrics else 330.0)
+        tone = sine(seconds=min(max(duration, 1), 60), sample_rate=44100, freq=220.0 if not lyrics else 330.0)
+        encoded = encode_audio(tone, sample_rate=44100, fmt=fmt)
         if progress_cb:
             progress_cb(80, "fallback: finalizing")
-        return MusicGenResult(wav_bytes=wav, bpm=120)
-
-
+        bpm = 120
+    return MusicGenResult(
+        audio_bytes=encoded.data,
+        audio_format=encoded.format,
+        suffix=encoded.suffix,
+        content_type=encoded.content_type,
+        bpm=bpm,
+    )
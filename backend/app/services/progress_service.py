@@ -1,66 +1,356 @@
 from __future__ import annotations
 
 import json
-from typing import Any, Dict, Optional
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
 
-from app.core.cache import get_redis
+from redis.exceptions import WatchError
+
+from app.core.cache import get_redis, get_redis_async
+from app.core.config import get_settings
+from app.core.pubsub_hub import HubSubscription, PubSubHub
+
+_CHANNEL_PREFIX = "gen-events:"
+TERMINAL_STATUSES = ("completed", "failed")
+
+# Each task keeps a capped Redis Stream of its state transitions so reconnecting
+# SSE clients can replay what they missed (Last-Event-ID) instead of re-polling.
+STREAM_MAXLEN = 200
 
 
 def _key(task_id: str) -> str:
-    return f"gen:{task_id}"
+    # Redis hash (see _UPDATE_LUA); named apart from the old JSON-string `gen:` keys.
+    return f"gen-state:{task_id}"
 
 def _channel(task_id: str) -> str:
-    return f"gen-events:{task_id}"
+    return f"{_CHANNEL_PREFIX}{task_id}"
 
 
-def init_task(task_id: str, *, user_id: str, payload: Dict[str, Any], ttl_seconds: int = 60 * 60) -> None:
+def _stream(task_id: str) -> str:
+    return f"gen-stream:{task_id}"
+
+
+def event_id_key(event_id: Optional[str]) -> Tuple[int, int]:
+    """Sortable key for a Redis Stream entry id ("<ms>-<seq>"); malformed ids sort first."""
+    try:
+        ms, _, seq = str(event_id).partition("-")
+        return int(ms), int(seq or 0)
+    except (TypeError, ValueError):
+        return (-1, -1)
+
+
+def _is_terminal(state: Any) -> bool:
+    return isinstance(state, dict) and state.get("status") in TERMINAL_STATUSES
+
+
+_hub: Optional[PubSubHub] = None
+
+
+def get_progress_hub() -> PubSubHub:
+    """Process-wide multiplexer: one Redis pattern subscription shared by every SSE stream."""
+    global _hub
+    if _hub is None:
+        _hub = PubSubHub(prefix=_CHANNEL_PREFIX, is_terminal=_is_terminal)
+    return _hub
+
+
+# Merge changed fields into the task hash, keep progress monotonic, append the
+# transition to the task stream, refresh TTLs and publish - in one round trip.
+# `payload`/`result` are stored as JSON text and spliced into the published
+# document verbatim so Lua never has to re-encode them.
+#
+# KEYS[1] state hash, KEYS[2] stream
+# ARGV[1] ttl, ARGV[2] stream maxlen, ARGV[3] channel, ARGV[4] "1" to reset, ARGV[5..] field/value pairs
+_UPDATE_LUA = """
+local h = KEYS[1]
+local stream = KEYS[2]
+if ARGV[4] == '1' then
+  redis.call('DEL', h)
+end
+for i = 5, #ARGV, 2 do
+  local f, v = ARGV[i], ARGV[i + 1]
+  if f == 'progress' then
+    local cur = tonumber(redis.call('HGET', h, 'progress') or '0') or 0
+    if (tonumber(v) or 0) < cur then
+      v = tostring(cur)
+    end
+  end
+  redis.call('HSET', h, f, v)
+end
+local parts = {}
+for _, f in ipairs({'task_id', 'user_id', 'status', 'message'}) do
+  local v = redis.call('HGET', h, f)
+  if v then
+    table.insert(parts, cjson.encode(f) .. ':' .. cjson.encode(v))
+  end
+end
+for _, f in ipairs({'progress', 'payload', 'result'}) do
+  local v = redis.call('HGET', h, f)
+  if v then
+    table.insert(parts, cjson.encode(f) .. ':' .. v)
+  end
+end
+local body = table.concat(parts, ',')
+local id = redis.call('XADD', stream, 'MAXLEN', '~', ARGV[2], '*', 'state', '{' .. body .. '}')
+redis.call('HSET', h, 'event_id', id)
+redis.call('EXPIRE', h, ARGV[1])
+redis.call('EXPIRE', stream, ARGV[1])
+local published = '{' .. body .. ',"event_id":' .. cjson.encode(id) .. '}'
+redis.call('PUBLISH', ARGV[3], published)
+return published
+"""
+
+_update_script = None
+
+
+def _write_fields(task_id: str, fields: Dict[str, Any], *, ttl_seconds: int, reset: bool = False, client=None) -> None:
+    global _update_script
     r = get_redis()
-    state = {
-        "task_id": task_id,
-        "user_id": user_id,
-        "status": "queued",  # queued | running | completed | failed
-        "progress": 0,
-        "message": "queued",
-        "payload": payload,
-        "result": None,
-    }
-    r.set(_key(task_id), json.dumps(state), ex=ttl_seconds)
+    if _update_script is None:
+        _update_script = r.register_script(_UPDATE_LUA)
+    args: List[Any] = [int(ttl_seconds), STREAM_MAXLEN, _channel(task_id), "1" if reset else "0"]
+    for name, value in fields.items():
+        if name in ("payload", "result"):
+            value = json.dumps(value, ensure_ascii=False)
+        elif name == "progress":
+            value = int(value)
+        args.extend((name, value))
+    _update_script(keys=[_key(task_id), _stream(task_id)], args=args, client=client or r)
+
+
+def _decode_state(raw: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    if not raw:
+        return None
+    state: Dict[str, Any] = dict(raw)
+    try:
+        state["progress"] = int(state.get("progress") or 0)
+    except (TypeError, ValueError):
+        state["progress"] = 0
+    for name in ("payload", "result"):
+        if name in state:
+            try:
+                state[name] = json.loads(state[name])
+            except (TypeError, ValueError):
+                state[name] = None
+    return state
+
+
+def init_task(task_id: str, *, user_id: str, payload: Dict[str, Any], ttl_seconds: int = 60 * 60) -> None:
     # Emit initial event so SSE subscribers get an immediate payload.
-    r.publish(_channel(task_id), json.dumps(state, ensure_ascii=False))
+    _write_fields(
+        task_id,
+        {
+            "task_id": task_id,
+            "user_id": user_id,
+            "status": "queued",  # queued | running | completed | failed
+            "progress": 0,
+            "message": "queued",
+            "payload": payload,
+            "result": None,
+        },
+        ttl_seconds=ttl_seconds,
+        reset=True,
+    )
 
 
-def update_task(
+def _task_fields(
     task_id: str,
     *,
     status: Optional[str] = None,
     progress: Optional[int] = None,
     message: Optional[str] = None,
     result: Optional[Dict[str, Any]] = None,
-    ttl_seconds: int = 60 * 60,
-) -> None:
-    r = get_redis()
-    raw = r.get(_key(task_id))
-    if raw:
-        state = json.loads(raw)
-    else:
-        state = {"task_id": task_id}
+) -> Dict[str, Any]:
+    fields: Dict[str, Any] = {"task_id": task_id}
     if status is not None:
-        state["status"] = status
+        fields["status"] = status
     if progress is not None:
-        state["progress"] = int(progress)
+        fields["progress"] = progress
     if message is not None:
-        state["message"] = message
+        fields["message"] = message
     if result is not None:
-        state["result"] = result
-    r.set(_key(task_id), json.dumps(state), ex=ttl_seconds)
-    r.publish(_channel(task_id), json.dumps(state, ensure_ascii=False))
+        fields["result"] = result
+    return fields
+
+
+def update_task(
+    task_id: str,
+    *,
+    status: Optional[str] = None,
+    progress: Optional[int] = None,
+    message: Optional[str] = None,
+    result: Optional[Dict[str, Any]] = None,
+    ttl_seconds: int = 60 * 60,
+) -> None:
+    """
+    Atomically merge the given fields into the task state and publish the result.
+
+    Only non-None fields are written, so concurrent reporters (e.g. the audio and
+    cover threads) never overwrite each other's changes. Progress never decreases.
+    """
+    fields = _task_fields(task_id, status=status, progress=progress, message=message, result=result)
+    _write_fields(task_id, fields, ttl_seconds=ttl_seconds)
+
+
+T = TypeVar("T")
+
+# Attempts before transact_task gives up on a task that keeps changing underneath it.
+_TRANSACT_ATTEMPTS = 16
+
+
+def transact_task(
+    task_id: str,
+    apply: Callable[[Optional[Dict[str, Any]]], Tuple[Optional[Dict[str, Any]], T]],
+    *,
+    ttl_seconds: int = 60 * 60,
+) -> T:
+    """
+    Read-modify-write of a task's state for updates derived from the state itself.
+
+    `apply(state)` receives the current state (None if the task is gone) and returns
+    `(fields, value)`: `update_task` keyword arguments to write (None for no write) and
+    the value to return. The write only lands if nobody else changed the task since it
+    was read (WATCH/MULTI); otherwise `apply` runs again on the fresh state, so it must
+    not have side effects of its own.
+    """
+    r = get_redis()
+    key = _key(task_id)
+    with r.pipeline() as pipe:
+        for _ in range(_TRANSACT_ATTEMPTS):
+            try:
+                pipe.watch(key)
+                fields, value = apply(_decode_state(pipe.hgetall(key)))
+                if not fields:
+                    return value
+                pipe.multi()
+                _write_fields(task_id, _task_fields(task_id, **fields), ttl_seconds=ttl_seconds, client=pipe)
+                pipe.execute()
+                return value
+            except WatchError:
+                continue
+    raise RuntimeError(f"Task {task_id} kept changing; gave up after {_TRANSACT_ATTEMPTS} attempts")
+
+
+class ProgressEmitter:
+    """
+    Per-task coalescing front for `update_task`.
+
+    Frequent `progress_cb` calls from model/provider loops are written at most
+    once per `min_interval_seconds` unless progress moved by `min_delta` points.
+    Status changes, terminal states, results and `force=True` are written
+    immediately; throttled updates are kept as pending and written by the next
+    emission or `flush()`. Safe to share between reporter threads.
+    """
+
+    def __init__(
+        self,
+        task_id: str,
+        *,
+        min_interval_seconds: Optional[float] = None,
+        min_delta: Optional[int] = None,
+    ) -> None:
+        settings = get_settings()
+        self.task_id = task_id
+        self.min_interval_seconds = (
+            min_interval_seconds if min_interval_seconds is not None else settings.progress_min_interval_ms / 1000.0
+        )
+        self.min_delta = min_delta if min_delta is not None else settings.progress_min_delta
+        self._lock = threading.Lock()
+        self._pending: Dict[str, Any] = {}
+        self._last_status: Optional[str] = None
+        self._last_progress = 0
+        self._last_emit = 0.0
+        self.emitted = 0
+        self.coalesced = 0
+
+    def emit(
+        self,
+        *,
+        status: Optional[str] = None,
+        progress: Optional[int] = None,
+        message: Optional[str] = None,
+        result: Optional[Dict[str, Any]] = None,
+        force: bool = False,
+    ) -> bool:
+        """Record an update; return True if it was written to Redis now."""
+        with self._lock:
+            fields = {"status": status, "progress": progress, "message": message, "result": result}
+            self._pending.update({k: v for k, v in fields.items() if v is not None})
+            now = time.monotonic()
+            due = (
+                force
+                or result is not None
+                or (status is not None and status != self._last_status)
+                or status in TERMINAL_STATUSES
+                or (progress is not None and int(progress) - self._last_progress >= self.min_delta)
+                or now - self._last_emit >= self.min_interval_seconds
+            )
+            if not due:
+                self.coalesced += 1
+                return False
+            self._write_pending(now)
+            return True
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._pending:
+                self._write_pending(time.monotonic())
+
+    def _write_pending(self, now: float) -> None:
+        pending, self._pending = self._pending, {}
+        update_task(self.task_id, **pending)
+        if pending.get("status") is not None:
+            self._last_status = pending["status"]
+        if pending.get("progress") is not None:
+            self._last_progress = int(pending["progress"])
+        self._last_emit = now
+        self.emitted += 1
+
+    def __enter__(self) -> "ProgressEmitter":
+        return self
+
+    def __exit__(self, *exc: object) -> None:
+        self.flush()
 
 
 def get_task(task_id: str) -> Optional[Dict[str, Any]]:
     r = get_redis()
-    raw = r.get(_key(task_id))
-    if not raw:
-        return None
-    return json.loads(raw)
+    return _decode_state(r.hgetall(_key(task_id)))
+
+
+async def get_task_async(task_id: str) -> Optional[Dict[str, Any]]:
+    """Async variant of `get_task` for use inside the event loop (SSE handlers)."""
+    r = get_redis_async()
+    return _decode_state(await r.hgetall(_key(task_id)))
+
+
+async def subscribe_task(task_id: str) -> HubSubscription:
+    """
+    Subscribe to state changes published by `init_task`/`update_task`.
+
+    Subscriptions are served by the process-wide hub, so N open streams share a
+    single Redis connection. `get()` yields decoded task states; the caller must
+    `aclose()` the subscription when done.
+    """
+    return await get_progress_hub().subscribe(task_id)
+
 
+async def read_task_events(task_id: str, *, after_id: str) -> List[Dict[str, Any]]:
+    """
+    Return every state recorded after stream entry `after_id`, oldest first.
 
+    Each state carries its own `event_id`. Entries trimmed by STREAM_MAXLEN are
+    gone; callers should fall back to the current snapshot when this is empty.
+    """
+    r = get_redis_async()
+    entries = await r.xrange(_stream(task_id), min=f"({after_id}", max="+")
+    states: List[Dict[str, Any]] = []
+    for entry_id, fields in entries:
+        try:
+            state = json.loads(fields["state"])
+        except (KeyError, TypeError, ValueError):
+            continue
+        state["event_id"] = entry_id
+        states.append(state)
+    return states
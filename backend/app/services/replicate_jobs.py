@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+import logging
+import time
+from typing import Any, Dict, Mapping, Optional
+
+from replicate.webhook import WebhookSigningSecret, WebhookValidationError, Webhooks
+
+from app.core.cache import get_redis
+from app.core.config import get_settings
+from app.services.ace_step_api_service import AceStepApiError, AceStepApiParams, create_replicate_prediction, prediction_output_url
+from app.services.image_gen_service import FluxNotInstalledError, get_runpod_image_status, submit_runpod_image_job
+from app.services.progress_service import update_task
+from app.services.runpod_jobs import DONE_STATUSES, FAILED_STATUSES, finalize_runpod_job
+from app.services.storage_service import get_storage
+
+logger = logging.getLogger(__name__)
+
+_FINALIZE_LOCK_TTL_SECONDS = 60 * 60
+# Replicate signs each delivery with a timestamp; older deliveries are rejected as replays.
+_WEBHOOK_TOLERANCE_SECONDS = 5 * 60
+
+
+def replicate_webhooks_enabled() -> bool:
+    s = get_settings()
+    return bool(s.replicate_webhook_base_url and s.replicate_webhook_secret)
+
+
+def replicate_webhook_url(job_id: str) -> str:
+    s = get_settings()
+    return f"{s.replicate_webhook_base_url.rstrip('/')}{s.api_prefix}/music/replicate-webhook/{job_id}"
+
+
+def verify_replicate_webhook(headers: Mapping[str, str], body: str) -> bool:
+    """Check Replicate's webhook-id/webhook-timestamp/webhook-signature headers against the signing secret."""
+    if not replicate_webhooks_enabled() or not body:
+        return False
+    try:
+        Webhooks.validate(
+            headers=dict(headers),
+            body=body,
+            secret=WebhookSigningSecret(key=get_settings().replicate_webhook_secret),
+            tolerance=_WEBHOOK_TOLERANCE_SECONDS,
+        )
+    except (WebhookValidationError, ValueError):
+        return False
+    return True
+
+
+def _claim_finalization(job_id: str) -> bool:
+    return bool(get_redis().set(f"replicate-finalize:{job_id}", "1", nx=True, ex=_FINALIZE_LOCK_TTL_SECONDS))
+
+
+def submit_replicate_job(*, job_id: str, params: AceStepApiParams, cover_prompt: str, title: Optional[str]) -> None:
+    """
+    Start the Replicate prediction (and the RunPod cover job, when available) and return.
+
+    Runs as a short BackgroundTask: the only waits are the optional LLM expansion and
+    the create calls. The rest of the pipeline runs from the webhook.
+    """
+    update_task(job_id, status="running", progress=5, message="replicate: submitting")
+
+    cover_image_job_id = None
+    cover_image_error = None
+    try:
+        cover_image_job_id = submit_runpod_image_job(prompt=cover_prompt, title=title).runpod_job_id
+    except FluxNotInstalledError as e:
+        # finalize_runpod_job generates the cover locally when there is no RunPod image job.
+        cover_image_error = str(e)
+        logger.info("[replicate_jobs] RunPod cover job not submitted for job_id=%s: %s", job_id, e)
+
+    def progress_cb(pct: int, msg: str) -> None:
+        update_task(job_id, status="running", progress=min(int(pct), 9), message=msg)
+
+    try:
+        prediction_id = create_replicate_prediction(params, webhook_url=replicate_webhook_url(job_id), progress_cb=progress_cb)
+    except AceStepApiError as e:
+        logger.error("[replicate_jobs] submit failed for job_id=%s: %s", job_id, e)
+        update_task(job_id, status="failed", progress=100, message=str(e))
+        return
+
+    update_task(
+        job_id,
+        status="running",
+        progress=10,
+        message="replicate: running prediction",
+        result={
+            "generation_backend": "replicate",
+            "replicate_prediction_id": prediction_id,
+            "runpod_image_job_id": cover_image_job_id,
+            "cover_image_error": cover_image_error,
+        },
+    )
+
+
+def apply_replicate_prediction(job_id: str, state: Dict[str, Any], prediction: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Fold a Replicate prediction document into the task state.
+
+    Returns kwargs for finalize_replicate_job when the prediction succeeded and this
+    caller won the finalization claim; otherwise None.
+    """
+    if state.get("status") in ("completed", "failed") or state.get("message") == "finalizing":
+        return None
+    result = state.get("result") if isinstance(state.get("result"), dict) else {}
+    status = str(prediction.get("status") or "").lower()
+
+    if status == "succeeded":
+        output_url = prediction_output_url(prediction.get("output"))
+        if not output_url:
+            update_task(job_id, status="failed", progress=100, message="replicate: succeeded but returned no audio")
+            return None
+        if not _claim_finalization(job_id):
+            return None
+        update_task(job_id, status="running", progress=85, message="finalizing", result={**result, "replicate_output_url": output_url})
+        return {
+            "job_id": job_id,
+            "user_id": str(state.get("user_id")),
+            "output_url": output_url,
+            "runpod_image_job_id": result.get("runpod_image_job_id"),
+            "payload": state.get("payload") or {},
+        }
+
+    if status in ("failed", "canceled"):
+        error = prediction.get("error") or status
+        update_task(job_id, status="failed", progress=100, message=f"replicate: {status}: {error}")
+        return None
+
+    update_task(job_id, status="running", progress=30, message=f"replicate: {status or 'processing'}")
+    return None
+
+
+def _wait_for_cover(runpod_image_job_id: str) -> Optional[str]:
+    """
+    Poll the RunPod cover job until it finishes or REPLICATE_COVER_WAIT_SECONDS pass.
+    The cover usually finishes first; when it is still queued or running we wait for it
+    rather than paying for it and then generating a second cover locally.
+    """
+    s = get_settings()
+    deadline = time.monotonic() + max(float(s.replicate_cover_wait_seconds), 0.0)
+    interval = max(float(s.runpod_poll_min_interval_seconds), 0.5)
+    while True:
+        try:
+            image_status = get_runpod_image_status(runpod_job_id=runpod_image_job_id)
+            status = (image_status.status or "").upper()
+            if status in DONE_STATUSES:
+                return image_status.image_url
+            if status in FAILED_STATUSES:
+                logger.warning("[replicate_jobs] cover job %s ended %s", runpod_image_job_id, status)
+                return None
+        except FluxNotInstalledError as e:
+            logger.warning("[replicate_jobs] cover job %s status failed: %s", runpod_image_job_id, e)
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            logger.warning("[replicate_jobs] cover job %s not done in time; generating a cover locally", runpod_image_job_id)
+            return None
+        time.sleep(min(interval, remaining))
+        interval = min(interval * 2, max(float(s.runpod_poll_max_interval_seconds), interval))
+
+
+def finalize_replicate_job(
+    *,
+    job_id: str,
+    user_id: str,
+    output_url: str,
+    runpod_image_job_id: Optional[str],
+    payload: Dict[str, Any],
+) -> None:
+    """Copy the prediction audio to R2, pick up the cover, then create the Song via finalize_runpod_job."""
+    audio_format = str(payload.get("audio_format") or "mp3")
+    try:
+        update_task(job_id, status="running", progress=88, message="uploading audio")
+        content_type = f"audio/{audio_format}" if audio_format in ["mp3", "wav", "flac"] else "audio/mpeg"
+        stored = get_storage().copy_url_to_r2(output_url, f".{audio_format}", content_type)
+    except Exception as e:
+        logger.error("[replicate_jobs] audio upload failed for job_id=%s: %s", job_id, e, exc_info=True)
+        update_task(job_id, status="failed", progress=100, message=f"replicate: audio upload failed: {e}")
+        return
+
+    cover_image_url = None
+    if runpod_image_job_id:
+        update_task(job_id, status="running", progress=89, message="waiting for cover")
+        cover_image_url = _wait_for_cover(str(runpod_image_job_id))
+
+    finalize_runpod_job(job_id=job_id, user_id=user_id, audio_url=stored.url, cover_image_url=cover_image_url, payload=payload)
@@ -0,0 +1,416 @@
+from __future__ import annotations
+
+import hashlib
+import hmac
+import logging
+import time
+from dataclasses import dataclass
+from datetime import date
+from typing import Any, Dict, Optional
+from uuid import UUID
+
+from sqlmodel import Session
+
+from app.core.cache import get_redis
+from app.core.config import get_settings
+from app.core.database import engine
+from app.models.song import Song
+from app.services.image_gen_service import FluxNotInstalledError, RunPodImageStatusResult, download_image_from_url, generate_cover_image
+from app.services.progress_service import get_task, transact_task, update_task
+from app.services.runpod_music_service import RunPodStatusResult
+from app.services.storage_service import get_storage
+from app.tasks.audio_renditions import schedule_audio_renditions
+from app.tasks.image_variants import schedule_image_variants
+
+logger = logging.getLogger(__name__)
+
+# In-flight RunPod jobs: sorted set of task ids scored by the next poll time (epoch ms).
+INFLIGHT_KEY = "runpod-inflight"
+# Finalization must run once per task even if several pollers (or webhooks) see COMPLETED.
+_FINALIZE_LOCK_TTL_SECONDS = 60 * 60
+
+DONE_STATUSES = ("COMPLETED", "SUCCEEDED", "SUCCESS")
+RUNNING_STATUSES = ("IN_PROGRESS", "RUNNING", "EXECUTING")
+QUEUED_STATUSES = ("IN_QUEUE", "QUEUED")
+FAILED_STATUSES = ("FAILED", "CANCELLED", "TIMED_OUT")
+
+
+@dataclass
+class RunPodJobTransition:
+    status: str  # running | finalizing | failed | completed
+    signature: str  # "<music status>/<image status>", changes whenever RunPod reports progress
+    finalize: Optional[Dict[str, Any]] = None  # kwargs for finalize_runpod_job when it should run now
+
+
+def track_runpod_job(job_id: str, *, delay_seconds: float = 0.0) -> None:
+    """Register a task with the RunPod poller; it is first polled after `delay_seconds`."""
+    due_ms = int((time.time() + delay_seconds) * 1000)
+    get_redis().zadd(INFLIGHT_KEY, {job_id: due_ms})
+
+
+def untrack_runpod_job(job_id: str) -> None:
+    get_redis().zrem(INFLIGHT_KEY, job_id)
+
+
+def runpod_webhooks_enabled() -> bool:
+    s = get_settings()
+    return bool(s.runpod_webhook_base_url and s.runpod_webhook_secret)
+
+
+def _webhook_signature(job_id: str, kind: str) -> str:
+    secret = get_settings().runpod_webhook_secret.encode("utf-8")
+    return hmac.new(secret, f"{job_id}:{kind}".encode("utf-8"), hashlib.sha256).hexdigest()
+
+
+def runpod_webhook_url(job_id: str, kind: str) -> Optional[str]:
+    """
+    Signed callback URL for one of a task's RunPod jobs (kind: "music" | "image").
+
+    RunPod cannot sign its webhook requests, so the HMAC of (task id, kind) travels
+    in the URL we hand it; verify_runpod_webhook checks it on the way back in.
+    Returns None when webhooks are not configured.
+    """
+    if not runpod_webhooks_enabled():
+        return None
+    s = get_settings()
+    base = s.runpod_webhook_base_url.rstrip("/")
+    return f"{base}{s.api_prefix}/music/runpod-webhook/{job_id}/{kind}?sig={_webhook_signature(job_id, kind)}"
+
+
+def verify_runpod_webhook(job_id: str, kind: str, sig: str) -> bool:
+    if not runpod_webhooks_enabled() or not sig:
+        return False
+    return hmac.compare_digest(_webhook_signature(job_id, kind), sig)
+
+
+def _claim_finalization(job_id: str) -> bool:
+    return bool(get_redis().set(f"runpod-finalize:{job_id}", "1", nx=True, ex=_FINALIZE_LOCK_TTL_SECONDS))
+
+
+def _stage_progress(rp_status: str) -> int:
+    if rp_status in DONE_STATUSES:
+        return 100
+    if rp_status in RUNNING_STATUSES:
+        return 60
+    if rp_status in QUEUED_STATUSES:
+        return 25
+    return 30
+
+
+def _plan_runpod_status(
+    job_id: str,
+    state: Optional[Dict[str, Any]],
+    music: Optional[RunPodStatusResult],
+    image: Optional[RunPodImageStatusResult],
+) -> tuple[Optional[Dict[str, Any]], RunPodJobTransition]:
+    """The task update (update_task kwargs, or None) and transition for `state` plus the new statuses."""
+    if state is None:
+        return None, RunPodJobTransition(status="failed", signature="missing")
+    current_status = state.get("status")
+    current_result = state.get("result") if isinstance(state.get("result"), dict) else {}
+
+    if current_status in ("completed", "failed"):
+        return None, RunPodJobTransition(status=current_status, signature="done")
+    if current_status == "running" and state.get("message") == "finalizing":
+        return None, RunPodJobTransition(status="finalizing", signature="finalizing")
+
+    runpod_job_id = current_result.get("runpod_job_id")
+    runpod_image_job_id = current_result.get("runpod_image_job_id")
+    if not runpod_job_id and isinstance(state.get("payload"), dict):
+        runpod_job_id = state["payload"].get("runpod_job_id")
+    if not runpod_job_id:
+        return (
+            dict(status="failed", progress=100, message="missing runpod_job_id", result=None),
+            RunPodJobTransition(status="failed", signature="missing"),
+        )
+
+    if music is not None:
+        rp_status = (music.status or "UNKNOWN").upper()
+        output_url = music.output_url
+    else:
+        rp_status = str(current_result.get("runpod_status") or "UNKNOWN").upper()
+        output_url = current_result.get("output_url")
+
+    image_url = current_result.get("cover_image_url")
+    image_rp_status = None
+    if runpod_image_job_id:
+        if image is not None:
+            image_rp_status = (image.status or "UNKNOWN").upper()
+            image_url = image.image_url or image_url
+        else:
+            image_rp_status = str(current_result.get("runpod_image_status") or "UNKNOWN").upper()
+
+    result = {
+        "runpod_job_id": runpod_job_id,
+        "runpod_image_job_id": runpod_image_job_id,
+        "runpod_status": rp_status,
+        "runpod_image_status": image_rp_status,
+        "output_url": output_url if rp_status in DONE_STATUSES else None,
+        "cover_image_url": image_url,
+        "cover_image_error": current_result.get("cover_image_error"),
+    }
+    signature = f"{rp_status}/{image_rp_status or '-'}"
+
+    # Overall progress is weighted music 70%, image 30% when a cover job exists.
+    music_progress = _stage_progress(rp_status)
+    if runpod_image_job_id:
+        overall_progress = int((music_progress * 0.7) + (_stage_progress(image_rp_status) * 0.3))
+    else:
+        overall_progress = music_progress
+
+    if rp_status in DONE_STATUSES:
+        if not output_url:
+            return (
+                dict(status="failed", progress=100, message="runpod: completed but missing output_url", result=result),
+                RunPodJobTransition(status="failed", signature=signature),
+            )
+
+        # A failed cover job does not block the song: finalize_runpod_job generates a fallback cover.
+        image_done = (
+            not runpod_image_job_id
+            or image_rp_status in DONE_STATUSES
+            or image_rp_status in FAILED_STATUSES
+        )
+        if not image_done:
+            return (
+                dict(status="running", progress=overall_progress, message="runpod: music complete, generating cover", result=result),
+                RunPodJobTransition(status="running", signature=signature),
+            )
+
+        return (
+            dict(status="running", progress=90, message="finalizing", result=result),
+            RunPodJobTransition(
+                status="finalizing",
+                signature=signature,
+                finalize={
+                    "job_id": job_id,
+                    "user_id": str(state.get("user_id")),
+                    "audio_url": output_url,
+                    "cover_image_url": image_url if image_rp_status not in FAILED_STATUSES else None,
+                    "payload": state.get("payload") or {},
+                },
+            ),
+        )
+
+    if rp_status in FAILED_STATUSES:
+        return (
+            dict(status="failed", progress=100, message=f"runpod: {rp_status.lower()}", result=result),
+            RunPodJobTransition(status="failed", signature=signature),
+        )
+
+    if rp_status in RUNNING_STATUSES:
+        status_msg = "runpod: generating music"
+        if runpod_image_job_id:
+            if image_rp_status in RUNNING_STATUSES:
+                status_msg = "runpod: generating music and cover"
+            elif image_rp_status in QUEUED_STATUSES:
+                status_msg = "runpod: generating music, cover queued"
+    elif rp_status in QUEUED_STATUSES:
+        status_msg = "runpod: queued"
+        if runpod_image_job_id:
+            status_msg = "runpod: music and cover queued"
+    else:
+        status_msg = f"runpod: {rp_status.lower()}"
+
+    return (
+        dict(status="running", progress=overall_progress, message=status_msg, result=result),
+        RunPodJobTransition(status="running", signature=signature),
+    )
+
+
+def apply_runpod_status(
+    job_id: str,
+    *,
+    music: Optional[RunPodStatusResult] = None,
+    image: Optional[RunPodImageStatusResult] = None,
+) -> RunPodJobTransition:
+    """
+    Fold the latest RunPod music/image job statuses into the task state in Redis.
+
+    Either status may be None (not polled this round, or delivered separately by a
+    webhook); the last known value stored in the task result is used instead. The
+    task is re-read and written in one transaction, so a music and a cover webhook
+    arriving together never drop each other's stage. When both jobs are done this
+    moves the task to "finalizing" and returns the kwargs for finalize_runpod_job;
+    the caller runs it.
+    """
+    transition = transact_task(job_id, lambda state: _plan_runpod_status(job_id, state, music, image))
+    if transition.finalize is not None:
+        if not _claim_finalization(job_id):
+            return RunPodJobTransition(status="finalizing", signature=transition.signature)
+        logger.info("[runpod_jobs] Starting finalization for job_id=%s", job_id)
+    return transition
+
+
+def finalize_runpod_job(
+    *,
+    job_id: str,
+    user_id: str,
+    audio_url: str,
+    cover_image_url: Optional[str] = None,
+    payload: Dict[str, Any],
+) -> None:
+    """
+    Finalize a completed RunPod job by:
+    1. Downloading cover image from RunPod (if provided) or generating it as fallback
+    2. Creating Song record in database
+    3. Updating task result with song_id and cover_image_url
+    """
+    import traceback
+    
+    print(f"\n{'='*80}", flush=True)
+    print(f"[runpod_jobs] FINALIZING JOB: job_id={job_id}", flush=True)
+    print(f"[runpod_jobs] Audio URL: {audio_url}", flush=True)
+    print(f"[runpod_jobs] Cover Image URL: {cover_image_url or 'None (will generate)'}", flush=True)
+    print(f"{'='*80}\n", flush=True)
+    
+    try:
+        # Extract payload fields
+        title = payload.get("title")
+        mode = payload.get("mode", "custom")
+        prompt = payload.get("prompt")
+        sample_query = payload.get("sample_query")
+        lyrics = payload.get("lyrics")
+        audio_duration = payload.get("audio_duration", 60)
+        genre = payload.get("genre")
+        bpm = payload.get("bpm")
+        
+        # Use appropriate prompt for cover image
+        cover_prompt = prompt if mode == "custom" else (sample_query or "Generated music")
+        song_prompt = prompt if mode == "custom" else (sample_query or "Generated")
+        
+        print(f"[runpod_jobs] Cover prompt: '{cover_prompt[:100] if cover_prompt else 'N/A'}...'", flush=True)
+        print(f"[runpod_jobs] Title: '{title}'", flush=True)
+        
+        # Use cover image URL directly from RunPod (already an R2 URL) or generate fallback
+        final_cover_image_url = None
+        cover_image_error = None
+        
+        if cover_image_url:
+            # Check if the URL is already a valid, accessible R2 URL
+            # RunPod returns R2 URLs that are already public and accessible
+            if cover_image_url.startswith(("http://", "https://")):
+                # Use the R2 URL directly - no need to download and re-upload
+                print(f"[runpod_jobs] ========== USING COVER IMAGE URL DIRECTLY FROM R2 ==========", flush=True)
+                print(f"[runpod_jobs] Using R2 URL: {cover_image_url}", flush=True)
+                final_cover_image_url = cover_image_url
+                print(f"[runpod_jobs] Cover image URL set: {final_cover_image_url}", flush=True)
+            else:
+                # Invalid URL format, try to download and re-upload
+                try:
+                    print(f"[runpod_jobs] ========== DOWNLOADING COVER IMAGE FROM RUNPOD ==========", flush=True)
+                    print(f"[runpod_jobs] Downloading from: {cover_image_url}", flush=True)
+                    image_bytes = download_image_from_url(cover_image_url)
+                    print(f"[runpod_jobs] Cover image downloaded successfully, size: {len(image_bytes)} bytes", flush=True)
+                    cover_stored = get_storage().store_bytes(content=image_bytes, suffix=".png", content_type="image/png", folder=f"image/{date.today().isoformat()}")
+                    final_cover_image_url = cover_stored.url
+                    print(f"[runpod_jobs] Cover image uploaded: {final_cover_image_url}", flush=True)
+                except Exception as e:
+                    error_msg = f"Failed to download cover image: {type(e).__name__}: {str(e)}"
+                    print(f"[runpod_jobs] Error downloading cover image: {error_msg}", flush=True)
+                    print(f"[runpod_jobs] Traceback: {traceback.format_exc()}", flush=True)
+                    cover_image_error = error_msg
+                    # Fallback to generating cover image
+                    print(f"[runpod_jobs] Falling back to generating cover image...", flush=True)
+                    try:
+                        cover_res = generate_cover_image(prompt=cover_prompt, title=title)
+                        print(f"[runpod_jobs] Cover image generated successfully, size: {len(cover_res.image_bytes)} bytes", flush=True)
+                        cover_stored = get_storage().store_bytes(content=cover_res.image_bytes, suffix=".png", content_type="image/png", folder=f"image/{date.today().isoformat()}")
+                        final_cover_image_url = cover_stored.url
+                        print(f"[runpod_jobs] Cover image uploaded: {final_cover_image_url}", flush=True)
+                        cover_image_error = None  # Clear error since fallback succeeded
+                    except Exception as e2:
+                        error_msg2 = f"{type(e2).__name__}: {str(e2)}" if str(e2) else f"{type(e2).__name__}: Unknown error occurred"
+                        print(f"[runpod_jobs] Error generating cover image (fallback): {error_msg2}", flush=True)
+                        print(f"[runpod_jobs] Traceback: {traceback.format_exc()}", flush=True)
+                        cover_image_error = f"{cover_image_error}; fallback generation also failed: {error_msg2}"
+        else:
+            # Generate cover image (fallback if RunPod image generation was not available)
+            try:
+                print(f"[runpod_jobs] ========== GENERATING COVER IMAGE (FALLBACK) ==========", flush=True)
+                print(f"[runpod_jobs] Calling generate_cover_image...", flush=True)
+                cover_res = generate_cover_image(prompt=cover_prompt, title=title)
+                print(f"[runpod_jobs] Cover image generated successfully, size: {len(cover_res.image_bytes)} bytes", flush=True)
+                cover_stored = get_storage().store_bytes(content=cover_res.image_bytes, suffix=".png", content_type="image/png", folder=f"image/{date.today().isoformat()}")
+                final_cover_image_url = cover_stored.url
+                print(f"[runpod_jobs] Cover image uploaded: {final_cover_image_url}", flush=True)
+            except FluxNotInstalledError as e:
+                error_msg = str(e).strip() if str(e) else "FLUX.1 Schnell is not available or not properly configured"
+                print(f"[runpod_jobs] FLUX.1 Schnell not available, skipping cover image: {error_msg}", flush=True)
+                print(f"[runpod_jobs] Traceback: {traceback.format_exc()}", flush=True)
+                cover_image_error = error_msg
+            except Exception as e:
+                error_msg = f"{type(e).__name__}: {str(e)}" if str(e) else f"{type(e).__name__}: Unknown error occurred"
+                print(f"[runpod_jobs] Error generating cover image: {error_msg}", flush=True)
+                print(f"[runpod_jobs] Traceback: {traceback.format_exc()}", flush=True)
+                cover_image_error = error_msg
+        
+        # Create Song record
+        print(f"[runpod_jobs] Creating Song record...", flush=True)
+        song_id = None
+        with Session(engine) as db:
+            song = Song(
+                user_id=UUID(user_id),
+                title=title or "Generated",
+                prompt=song_prompt,
+                lyrics=lyrics,
+                duration=audio_duration,
+                bpm=bpm,
+                audio_url=audio_url,
+                cover_image_url=final_cover_image_url,
+                genre=genre,
+            )
+            db.add(song)
+            db.commit()
+            db.refresh(song)
+            song_id = str(song.id)
+            print(f"[runpod_jobs] Song created: song_id={song_id}", flush=True)
+        schedule_image_variants("cover", song_id, final_cover_image_url)
+        schedule_audio_renditions(song_id, audio_url)
+        
+        # Update task result with song_id and cover_image_url
+        if not song_id:
+            raise ValueError("Failed to create Song record: song_id is None")
+        
+        result = {
+            "song_id": song_id,
+            "audio_url": audio_url,
+            "cover_image_url": final_cover_image_url,
+        }
+        if cover_image_error:
+            result["cover_image_error"] = cover_image_error
+            print(f"[runpod_jobs] Adding cover_image_error to result: {cover_image_error[:100]}...", flush=True)
+        
+        print(f"[runpod_jobs] Final result before update_task: cover_image_url={final_cover_image_url}, result keys={list(result.keys())}", flush=True)
+        update_task(job_id, status="completed", progress=100, message="completed", result=result)
+        print(f"[runpod_jobs] Task finalized successfully", flush=True)
+        
+        # Verify the result was saved correctly
+        try:
+            verify_state = get_task(job_id)
+            verify_result = verify_state.get("result") if verify_state else None
+            print(f"[runpod_jobs] Verification - saved cover_image_url: {verify_result.get('cover_image_url') if isinstance(verify_result, dict) else 'N/A'}", flush=True)
+        except Exception as e:
+            print(f"[runpod_jobs] Error verifying saved state: {e}", flush=True)
+    except Exception as e:
+        error_traceback = traceback.format_exc()
+        print(f"[runpod_jobs] ========== ERROR FINALIZING JOB ==========", flush=True)
+        print(f"[runpod_jobs] Error type: {type(e).__name__}", flush=True)
+        print(f"[runpod_jobs] Error message: {str(e)}", flush=True)
+        print(f"[runpod_jobs] Full traceback:\n{error_traceback}", flush=True)
+        print(f"[runpod_jobs] ========================================", flush=True)
+        # Update task with error but don't fail the whole job
+        # Try to preserve existing result data if available
+        try:
+            current_state = get_task(job_id)
+            existing_result = current_state.get("result") or {} if current_state else {}
+            if isinstance(existing_result, dict):
+                current_result = existing_result.copy()
+            else:
+                current_result = {}
+        except Exception:
+            current_result = {}
+        
+        current_result["output_url"] = audio_url
+        current_result["finalization_error"] = str(e)
+        update_task(job_id, status="completed", progress=100, message="completed (with errors)", result=current_result)
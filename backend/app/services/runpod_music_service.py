@@ -7,6 +7,7 @@ from typing import Any, Dict, Optional
 import httpx
 
 from app.core.config import get_settings
+from app.core.http_clients import get_async_http_client, get_http_client
 
 logger = logging.getLogger(__name__)
 
@@ -42,14 +43,18 @@ def _endpoint_id() -> str:
     return s.runpod_endpoint_id
 
 
-def submit_runpod_job(*, input_payload: Dict[str, Any]) -> RunPodSubmitResult:
+def submit_runpod_job(*, input_payload: Dict[str, Any], webhook_url: Optional[str] = None) -> RunPodSubmitResult:
     """
     Submit a Serverless job:
       POST https://api.runpod.ai/v2/{endpoint_id}/run
+
+    If webhook_url is given RunPod POSTs the finished job document to it.
     """
     s = get_settings()
     url = f"{(s.runpod_api_base_url or 'https://api.runpod.ai/v2').rstrip('/')}/{_endpoint_id()}/run"
-    body = {"input": input_payload}
+    body: Dict[str, Any] = {"input": input_payload}
+    if webhook_url:
+        body["webhook"] = webhook_url
 
     logger.info("[runpod] submit job -> %s", url)
     # Helpful for debugging RunPod-side input validation/runtime issues.
@@ -65,10 +70,9 @@ def submit_runpod_job(*, input_payload: Dict[str, Any]) -> RunPodSubmitResult:
     except Exception:
         logger.info("[runpod] submit body.input = <unloggable payload>")
     try:
-        with httpx.Client(timeout=float(s.runpod_request_timeout_seconds or 30)) as client:
-            resp = client.post(url, json=body, headers={"Content-Type": "application/json", **_auth_headers()})
-            resp.raise_for_status()
-            data = resp.json()
+        resp = get_http_client("runpod").post(url, json=body, headers={"Content-Type": "application/json", **_auth_headers()})
+        resp.raise_for_status()
+        data = resp.json()
     except httpx.HTTPError as e:
         raise RunPodError(f"RunPod submit failed: {e}") from e
     except Exception as e:
@@ -82,25 +86,13 @@ def submit_runpod_job(*, input_payload: Dict[str, Any]) -> RunPodSubmitResult:
     return RunPodSubmitResult(runpod_job_id=str(job_id), raw=data)
 
 
-def get_runpod_status(*, runpod_job_id: str) -> RunPodStatusResult:
-    """
-    Poll job status:
-      GET https://api.runpod.ai/v2/{endpoint_id}/status/{job_id}
-    """
+def _status_url(runpod_job_id: str) -> str:
     s = get_settings()
-    url = f"{(s.runpod_api_base_url or 'https://api.runpod.ai/v2').rstrip('/')}/{_endpoint_id()}/status/{runpod_job_id}"
+    return f"{(s.runpod_api_base_url or 'https://api.runpod.ai/v2').rstrip('/')}/{_endpoint_id()}/status/{runpod_job_id}"
 
-    logger.debug("[runpod] status -> %s", url)
-    try:
-        with httpx.Client(timeout=float(s.runpod_request_timeout_seconds or 30)) as client:
-            resp = client.get(url, headers=_auth_headers())
-            resp.raise_for_status()
-            data = resp.json()
-    except httpx.HTTPError as e:
-        raise RunPodError(f"RunPod status failed: {e}") from e
-    except Exception as e:
-        raise RunPodError(f"RunPod status failed: {type(e).__name__}: {e}") from e
 
+def parse_runpod_status(data: Dict[str, Any]) -> RunPodStatusResult:
+    """Map a RunPod job document (status response or webhook body) to RunPodStatusResult."""
     raw_status = str(data.get("status") or "UNKNOWN").upper()
 
     # Output URL is application-specific; we support a few common shapes:
@@ -116,3 +108,39 @@ def get_runpod_status(*, runpod_job_id: str) -> RunPodStatusResult:
 
     return RunPodStatusResult(status=raw_status, output_url=output_url, raw=data)
 
+
+def get_runpod_status(*, runpod_job_id: str) -> RunPodStatusResult:
+    """
+    Poll job status:
+      GET https://api.runpod.ai/v2/{endpoint_id}/status/{job_id}
+    """
+    url = _status_url(runpod_job_id)
+
+    logger.debug("[runpod] status -> %s", url)
+    try:
+        resp = get_http_client("runpod").get(url, headers=_auth_headers())
+        resp.raise_for_status()
+        data = resp.json()
+    except httpx.HTTPError as e:
+        raise RunPodError(f"RunPod status failed: {e}") from e
+    except Exception as e:
+        raise RunPodError(f"RunPod status failed: {type(e).__name__}: {e}") from e
+
+    return parse_runpod_status(data)
+
+
+async def get_runpod_status_async(*, runpod_job_id: str) -> RunPodStatusResult:
+    """Async variant of get_runpod_status on the shared pooled AsyncClient."""
+    url = _status_url(runpod_job_id)
+
+    logger.debug("[runpod] status -> %s", url)
+    try:
+        resp = await get_async_http_client("runpod").get(url, headers=_auth_headers())
+        resp.raise_for_status()
+        data = resp.json()
+    except httpx.HTTPError as e:
+        raise RunPodError(f"RunPod status failed: {e}") from e
+    except Exception as e:
+        raise RunPodError(f"RunPod status failed: {type(e).__name__}: {e}") from e
+
+    return parse_runpod_status(data)
@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Dict, Optional, Set, Tuple
+
+from app.core.cache import get_redis_async
+from app.core.config import get_settings
+from app.core.http_clients import aclose_http_clients
+from app.services.image_gen_service import FluxNotInstalledError, RunPodImageStatusResult, get_runpod_image_status_async
+from app.services.progress_service import get_task_async
+from app.services.runpod_jobs import (
+    DONE_STATUSES,
+    FAILED_STATUSES,
+    INFLIGHT_KEY,
+    RunPodJobTransition,
+    apply_runpod_status,
+    finalize_runpod_job,
+    runpod_webhooks_enabled,
+)
+from app.services.runpod_music_service import get_runpod_status_async
+
+logger = logging.getLogger(__name__)
+
+
+class RunPodPoller:
+    """
+    Drives in-flight RunPod jobs to completion without a browser in the loop.
+
+    Tracked task ids live in the INFLIGHT_KEY sorted set, scored by when they are
+    next due. Each tick the poller takes the due ids, fetches the music and cover
+    job statuses over the shared pooled AsyncClient, folds them into the task state and
+    runs finalization itself. A job whose RunPod status has not changed is polled
+    progressively less often (up to max_interval_seconds); any change resets it.
+
+    Several processes may run a poller: a short per-job lease in Redis keeps two
+    of them from polling the same job at once.
+    """
+
+    def __init__(
+        self,
+        *,
+        min_interval_seconds: float = 2.0,
+        max_interval_seconds: float = 30.0,
+        backoff_factor: float = 1.5,
+        concurrency: int = 8,
+        tick_seconds: float = 1.0,
+        lease_seconds: int = 60,
+    ) -> None:
+        self.min_interval_seconds = min_interval_seconds
+        self.max_interval_seconds = max_interval_seconds
+        self.backoff_factor = backoff_factor
+        self.concurrency = concurrency
+        self.tick_seconds = tick_seconds
+        self.lease_seconds = lease_seconds
+        self._backoff: Dict[str, Tuple[str, float]] = {}  # job_id -> (last signature, interval)
+        self._active: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._runner: Optional[asyncio.Task] = None
+        self.polls = 0
+        self.errors = 0
+        self.finalized = 0
+
+    async def start(self) -> None:
+        if self._runner is not None and not self._runner.done():
+            return
+        self._sem = asyncio.Semaphore(self.concurrency)
+        self._runner = asyncio.create_task(self._run(), name="runpod-poller")
+        logger.info("[runpod_poller] started (concurrency=%s)", self.concurrency)
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            self._runner.cancel()
+            try:
+                await self._runner
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._runner = None
+        for task in list(self._tasks):
+            task.cancel()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.poll_due_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logger.warning("[runpod_poller] tick failed: %s", e)
+            await asyncio.sleep(self.tick_seconds)
+
+    async def poll_due_once(self) -> int:
+        """Start a poll for every tracked job that is due; returns how many were started."""
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.concurrency)
+        now_ms = int(time.time() * 1000)
+        due = await get_redis_async().zrangebyscore(INFLIGHT_KEY, 0, now_ms, start=0, num=self.concurrency * 4)
+        started = 0
+        for job_id in due:
+            if job_id in self._active:
+                continue
+            self._active.add(job_id)
+            task = asyncio.create_task(self._poll_job(job_id))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+            started += 1
+        return started
+
+    def _next_interval(self, job_id: str, signature: str) -> float:
+        last = self._backoff.get(job_id)
+        if last is None or last[0] != signature:
+            interval = self.min_interval_seconds
+        else:
+            interval = min(last[1] * self.backoff_factor, self.max_interval_seconds)
+        self._backoff[job_id] = (signature, interval)
+        return interval
+
+    async def _forget(self, job_id: str) -> None:
+        self._backoff.pop(job_id, None)
+        await get_redis_async().zrem(INFLIGHT_KEY, job_id)
+
+    async def _poll_job(self, job_id: str) -> None:
+        redis = get_redis_async()
+        lease_key = f"runpod-poll-lease:{job_id}"
+        try:
+            if not await redis.set(lease_key, "1", nx=True, ex=self.lease_seconds):
+                return  # another poller has it
+            try:
+                async with self._sem:
+                    transition = await self._check(job_id)
+                if transition is None:
+                    await self._forget(job_id)
+                    return
+                if transition.finalize is not None:
+                    await asyncio.to_thread(finalize_runpod_job, **transition.finalize)
+                    self.finalized += 1
+                if transition.status in ("completed", "failed") or transition.finalize is not None:
+                    await self._forget(job_id)
+                    return
+                interval = self._next_interval(job_id, transition.signature)
+                await redis.zadd(INFLIGHT_KEY, {job_id: int((time.time() + interval) * 1000)}, xx=True)
+            finally:
+                await redis.delete(lease_key)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Transient (RunPod or Redis) failure: leave the job tracked and back off.
+            self.errors += 1
+            logger.warning("[runpod_poller] poll failed for job_id=%s: %s", job_id, e)
+            try:
+                interval = self._next_interval(job_id, "error")
+                await redis.zadd(INFLIGHT_KEY, {job_id: int((time.time() + interval) * 1000)}, xx=True)
+            except Exception:
+                pass
+        finally:
+            self._active.discard(job_id)
+
+    async def _check(self, job_id: str) -> Optional[RunPodJobTransition]:
+        """Fetch RunPod statuses for one task and apply them; None if the task is gone."""
+        state = await get_task_async(job_id)
+        if state is None:
+            return None
+        result = state.get("result") if isinstance(state.get("result"), dict) else {}
+        runpod_job_id = result.get("runpod_job_id")
+        runpod_image_job_id = result.get("runpod_image_job_id")
+
+        music = None
+        if runpod_job_id and str(result.get("runpod_status") or "").upper() not in DONE_STATUSES:
+            music = await get_runpod_status_async(runpod_job_id=str(runpod_job_id))
+        self.polls += 1
+
+        image: Optional[RunPodImageStatusResult] = None
+        image_status = str(result.get("runpod_image_status") or "").upper()
+        if runpod_image_job_id and image_status not in DONE_STATUSES and image_status not in FAILED_STATUSES:
+            try:
+                image = await get_runpod_image_status_async(runpod_job_id=str(runpod_image_job_id))
+            except FluxNotInstalledError as e:
+                logger.warning("[runpod_poller] Error polling image job %s: %s", runpod_image_job_id, e)
+
+        return await asyncio.to_thread(apply_runpod_status, job_id, music=music, image=image)
+
+    def metrics(self) -> dict:
+        return {
+            "running": self._runner is not None and not self._runner.done(),
+            "active": len(self._active),
+            "polls": self.polls,
+            "errors": self.errors,
+            "finalized": self.finalized,
+        }
+
+
+_poller: Optional[RunPodPoller] = None
+
+
+def get_runpod_poller() -> RunPodPoller:
+    global _poller
+    if _poller is None:
+        s = get_settings()
+        min_interval = float(s.runpod_poll_min_interval_seconds)
+        max_interval = float(s.runpod_poll_max_interval_seconds)
+        if runpod_webhooks_enabled():
+            # RunPod pushes completions to the webhook; polling only catches lost callbacks.
+            min_interval = max(min_interval, float(s.runpod_webhook_safety_poll_seconds))
+            max_interval = max(max_interval, min_interval)
+        _poller = RunPodPoller(
+            min_interval_seconds=min_interval,
+            max_interval_seconds=max_interval,
+            concurrency=int(s.runpod_poll_concurrency),
+        )
+    return _poller
+
+
+async def _main() -> None:
+    """Run the poller as a dedicated process: python -m app.services.runpod_poller"""
+    logging.basicConfig(level=logging.INFO)
+    poller = get_runpod_poller()
+    await poller.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await poller.stop()
+        await aclose_http_clients()
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
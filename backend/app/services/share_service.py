@@ -11,7 +11,8 @@ from app.core.config import get_settings
 from app.models.file_object import FileObject
 from app.models.file_share import FileShare
 from app.models.user import User
-from app.services.storage_service import get_signed_url
+from app.services.signed_url_cache import get_cached_signed_url, invalidate_signed_url
+from app.services.storage_service import storage_backend_name
 
 
 class ShareService:
@@ -64,6 +65,9 @@ class ShareService:
             self.db.add(share)
             self.db.commit()
             self.db.refresh(share)
+            fo = self.db.get(FileObject, share.file_object_id)
+            if fo:
+                invalidate_signed_url(fo.key)
         return share
 
     def _get_share(self, slug: str) -> Optional[FileShare]:
@@ -91,11 +95,15 @@ class ShareService:
         self.db.commit()
 
         # Local backend: content_url will be /api/files/{key}
-        backend = (self.settings.storage_backend or "local").lower()
-        if backend == "local":
+        content_url_max_age = None
+        if storage_backend_name() == "local":
             content_url = f"{self.settings.api_prefix}/files/{fo.key}"
         else:
-            content_url = get_signed_url(fo.key)
+            signed = get_cached_signed_url(fo.key)
+            content_url = signed.url
+            content_url_max_age = signed.max_age()
+            if share.expires_at:
+                content_url_max_age = min(content_url_max_age, max(int((share.expires_at - now).total_seconds()), 0))
 
         return {
             "slug": share.slug,
@@ -106,6 +114,7 @@ class ShareService:
                 "original_filename": fo.original_filename,
             },
             "content_url": content_url,
+            "content_url_max_age": content_url_max_age,
             "expires_at": share.expires_at.isoformat() if share.expires_at else None,
             "revoked_at": share.revoked_at.isoformat() if share.revoked_at else None,
         }
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from app.core.cache import get_redis
+from app.core.config import get_settings
+from app.services.storage_service import get_signed_url
+
+logger = logging.getLogger(__name__)
+
+_REDIS_PREFIX = "signed-url:"
+
+
+@dataclass
+class SignedUrl:
+    url: str
+    expires_at: float
+
+    def max_age(self, now: Optional[float] = None) -> int:
+        """Seconds a client may reuse the URL: remaining validity minus the safety margin."""
+        now = time.time() if now is None else now
+        margin = get_settings().signed_url_safety_margin_seconds
+        return max(int(self.expires_at - margin - now), 0)
+
+    def cache_control(self) -> str:
+        max_age = self.max_age()
+        return f"private, max-age={max_age}" if max_age > 0 else "no-store"
+
+
+class SignedUrlCache:
+    """
+    Hand out the same presigned GET URL for an object key until shortly before it expires.
+
+    Two tiers: an in-process LRU and a Redis entry shared by every API process, so a
+    hot key is signed once per TTL window instead of once per request. Local entries
+    live at most signed_url_local_ttl_seconds, which bounds how long another process
+    can keep serving a URL after `invalidate`.
+    """
+
+    def __init__(self) -> None:
+        self._entries: "OrderedDict[str, tuple[SignedUrl, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _local_get(self, key: str, now: float) -> Optional[SignedUrl]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            signed, local_deadline = entry
+            if now >= local_deadline or signed.max_age(now) <= 0:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return signed
+
+    def _local_put(self, key: str, signed: SignedUrl, now: float) -> None:
+        s = get_settings()
+        local_deadline = now + max(float(s.signed_url_local_ttl_seconds), 0.0)
+        with self._lock:
+            self._entries[key] = (signed, local_deadline)
+            self._entries.move_to_end(key)
+            while len(self._entries) > max(int(s.signed_url_cache_size), 1):
+                self._entries.popitem(last=False)
+
+    def _redis_get(self, key: str, now: float) -> Optional[SignedUrl]:
+        try:
+            raw = get_redis().get(_REDIS_PREFIX + key)
+        except Exception as e:
+            logger.warning("[signed_url_cache] redis read failed for %s: %s", key, e)
+            return None
+        if not raw:
+            return None
+        try:
+            data = json.loads(raw)
+            signed = SignedUrl(url=str(data["url"]), expires_at=float(data["expires_at"]))
+        except (ValueError, KeyError, TypeError):
+            return None
+        return signed if signed.max_age(now) > 0 else None
+
+    def _redis_put(self, key: str, signed: SignedUrl, now: float) -> None:
+        ttl = signed.max_age(now)
+        if ttl <= 0:
+            return
+        try:
+            get_redis().set(_REDIS_PREFIX + key, json.dumps({"url": signed.url, "expires_at": signed.expires_at}), ex=ttl)
+        except Exception as e:
+            logger.warning("[signed_url_cache] redis write failed for %s: %s", key, e)
+
+    def get(self, key: str) -> SignedUrl:
+        """
+        Return a cached SignedUrl for `key`, signing a new one on a miss.
+
+        Raises RuntimeError if R2 credentials are missing or signing fails.
+        """
+        now = time.time()
+        signed = self._local_get(key, now)
+        if signed is not None:
+            return signed
+
+        signed = self._redis_get(key, now)
+        if signed is None:
+            ttl_seconds = int(get_settings().signed_url_ttl_seconds)
+            signed = SignedUrl(url=get_signed_url(key, ttl_seconds=ttl_seconds), expires_at=now + ttl_seconds)
+            self._redis_put(key, signed, now)
+        self._local_put(key, signed, now)
+        return signed
+
+    def invalidate(self, key: str) -> None:
+        """Drop `key` from both tiers; the next `get` signs a fresh URL."""
+        with self._lock:
+            self._entries.pop(key, None)
+        try:
+            get_redis().delete(_REDIS_PREFIX + key)
+        except Exception as e:
+            logger.warning("[signed_url_cache] redis invalidate failed for %s: %s", key, e)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = SignedUrlCache()
+
+
+def get_signed_url_cache() -> SignedUrlCache:
+    return _cache
+
+
+def get_cached_signed_url(key: str) -> SignedUrl:
+    return _cache.get(key)
+
+
+async def get_cached_signed_url_async(key: str) -> SignedUrl:
+    """Async variant of get_cached_signed_url for use from async routes."""
+    return await asyncio.to_thread(_cache.get, key)
+
+
+def invalidate_signed_url(key: str) -> None:
+    _cache.invalidate(key)
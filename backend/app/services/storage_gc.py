@@ -0,0 +1,265 @@
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import re
+from dataclasses import asdict, dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterable, Iterator, Optional
+from urllib.parse import urlparse
+
+from botocore.exceptions import ClientError
+from sqlmodel import Session, select
+
+from app.core.cache import get_redis
+from app.core.config import get_settings
+from app.core.database import engine
+from app.models.file_object import FileObject
+from app.models.playlist_song import PlaylistSong  # noqa: F401 - needed for relationship resolution
+from app.models.playlist import Playlist  # noqa: F401 - needed for relationship resolution
+from app.models.share import Share
+from app.models.song import Song
+from app.models.user import User
+from app.services.audio_renditions import rendition_urls
+from app.services.content_store import GC_CANDIDATES_KEY, REFS_KEY, is_content_addressed, key_from_url
+from app.services.image_variants import variant_urls
+from app.services.signed_url_cache import invalidate_signed_url
+from app.services.storage_service import _get_r2_config, get_r2_storage
+from app.services.waveform import waveform_urls
+
+logger = logging.getLogger(__name__)
+
+# Date-partitioned roots (songs/YYYY-MM-DD/, image/YYYY-MM-DD/) are scanned incrementally;
+# the rest only on full runs. Deleted/replaced records reach GC through GC_CANDIDATES_KEY.
+PARTITIONED_PREFIXES = ("songs/", "image/")
+FLAT_PREFIXES = ("audio/", "avatars/", "backgrounds/", "files/")
+CURSOR_KEY = "storage-gc-cursor:{prefix}"
+LOCK_KEY = "storage-gc-lock"
+
+_DELETE_BATCH = 1000  # DeleteObjects limit
+_DATE_PARTITION = re.compile(r"^\d{4}-\d{2}-\d{2}/$")
+
+
+@dataclass
+class GcReport:
+    dry_run: bool
+    full: bool
+    prefixes: list[str] = field(default_factory=list)
+    scanned: int = 0
+    referenced: int = 0
+    recent: int = 0
+    orphans: list[str] = field(default_factory=list)
+    orphan_bytes: int = 0
+    deleted: int = 0
+    errors: list[str] = field(default_factory=list)
+
+
+class StorageGarbageCollector:
+    """
+    Delete R2 objects that no song, user, share poster or file_object references.
+
+    Objects younger than `grace` are never touched: generations upload audio and
+    covers before the Song row exists. Each incremental run lists the date partitions
+    at or after the stored cursor plus the queued candidates. A full run lists every
+    known prefix. Deletes go out through DeleteObjects in batches of 1000.
+    """
+
+    def __init__(self, *, grace: timedelta, dry_run: bool = False) -> None:
+        self.grace = grace
+        self.dry_run = dry_run
+        self.storage = get_r2_storage()
+        _, _, _, self.bucket, _ = _get_r2_config()
+
+    # -- references ---------------------------------------------------------
+
+    def referenced_keys(self) -> set[str]:
+        keys: set[str] = set()
+
+        def add_url(url: Optional[str]) -> None:
+            if not url:
+                return
+            key = key_from_url(self.storage, url)
+            if key is None:
+                # URLs minted under an older R2_PUBLIC_URL still point at our keys; match on
+                # the path so a changed public domain can never make live objects look orphaned.
+                path = urlparse(url if "://" in url else f"https://{url}").path.lstrip("/")
+                if path.startswith(PARTITIONED_PREFIXES + FLAT_PREFIXES):
+                    key = path
+            if key:
+                keys.add(key)
+
+        with Session(engine) as db:
+            for audio_url, cover_url, cover_variants, renditions, waveform in db.exec(
+                select(Song.audio_url, Song.cover_image_url, Song.cover_variants, Song.audio_renditions, Song.waveform)
+            ):
+                derived = (*variant_urls(cover_variants), *rendition_urls(renditions), *waveform_urls(waveform))
+                for url in (audio_url, cover_url, *derived):
+                    add_url(url)
+            for row in db.exec(select(User.avatar_url, User.background_url, User.avatar_variants, User.background_variants)):
+                avatar_url, background_url, avatar_variants, background_variants = row
+                for url in (avatar_url, background_url, *variant_urls(avatar_variants), *variant_urls(background_variants)):
+                    add_url(url)
+            for poster_url in db.exec(select(Share.poster_url).where(Share.poster_url.is_not(None))):
+                add_url(poster_url)
+            keys.update(db.exec(select(FileObject.key)))
+        return keys
+
+    def _is_live_cas(self, key: str) -> bool:
+        return is_content_addressed(key) and int(get_redis().hget(REFS_KEY, key) or 0) > 0
+
+    # -- listing -------------------------------------------------------------
+
+    def _list(self, prefix: str) -> Iterator[dict]:
+        paginator = self.storage.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix, PaginationConfig={"PageSize": 1000}):
+            yield from page.get("Contents", [])
+
+    def _date_partitions(self, root: str) -> list[str]:
+        paginator = self.storage.client.get_paginator("list_objects_v2")
+        found = []
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=root, Delimiter="/"):
+            for cp in page.get("CommonPrefixes", []):
+                part = cp["Prefix"][len(root):]
+                if _DATE_PARTITION.match(part):
+                    found.append(part[:-1])
+        return sorted(found)
+
+    def _incremental_prefixes(self, root: str, today: date) -> tuple[list[str], Optional[str]]:
+        """Partitions at or after the cursor, and the new cursor (last partition now past the grace period)."""
+        cursor = get_redis().get(CURSOR_KEY.format(prefix=root))
+        settled = (today - timedelta(days=self.grace.days + 1)).isoformat()
+        parts = [p for p in self._date_partitions(root) if cursor is None or p >= cursor]
+        new_cursor = max((p for p in parts if p <= settled), default=cursor)
+        return [f"{root}{p}/" for p in parts], new_cursor
+
+    # -- run -------------------------------------------------------------------
+
+    def _sweep(self, objects: Iterable[dict], referenced: set[str], now: datetime, report: GcReport) -> list[str]:
+        orphans = []
+        for obj in objects:
+            key = obj["Key"]
+            report.scanned += 1
+            if key in referenced or self._is_live_cas(key):
+                report.referenced += 1
+                continue
+            if now - obj["LastModified"] < self.grace:
+                report.recent += 1
+                continue
+            orphans.append(key)
+            report.orphan_bytes += int(obj.get("Size") or 0)
+        return orphans
+
+    def _sweep_candidates(self, referenced: set[str], now: datetime, report: GcReport, skip: set[str]) -> list[str]:
+        """Check queued candidates; drop ones that are gone or referenced again, keep recent ones queued."""
+        redis = get_redis()
+        orphans: list[str] = []
+        resolved: list[str] = []
+        for key in redis.zrange(GC_CANDIDATES_KEY, 0, -1):
+            if key in skip:
+                continue
+            try:
+                head = self.storage.client.head_object(Bucket=self.bucket, Key=key)
+            except ClientError as e:
+                if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                    resolved.append(key)
+                else:
+                    report.errors.append(f"{key}: {e}")
+                continue
+            obj = {"Key": key, "LastModified": head["LastModified"], "Size": head.get("ContentLength", 0)}
+            if self._sweep([obj], referenced, now, report):
+                orphans.append(key)
+            elif key in referenced or self._is_live_cas(key):
+                resolved.append(key)
+        if resolved and not self.dry_run:
+            redis.zrem(GC_CANDIDATES_KEY, *resolved)
+        return orphans
+
+    def _delete(self, keys: list[str], report: GcReport) -> None:
+        # A content-addressed key can be re-referenced after the sweep; re-check right before deleting.
+        keys = [k for k in keys if not self._is_live_cas(k)]
+        for i in range(0, len(keys), _DELETE_BATCH):
+            batch = keys[i : i + _DELETE_BATCH]
+            resp = self.storage.client.delete_objects(
+                Bucket=self.bucket,
+                Delete={"Objects": [{"Key": k} for k in batch], "Quiet": True},
+            )
+            failed = {e["Key"]: e.get("Message", e.get("Code", "")) for e in resp.get("Errors", [])}
+            for key in batch:
+                if key in failed:
+                    report.errors.append(f"{key}: {failed[key]}")
+                    continue
+                report.deleted += 1
+                invalidate_signed_url(key)
+            done = [k for k in batch if k not in failed]
+            if done:
+                get_redis().zrem(GC_CANDIDATES_KEY, *done)
+
+    def run(self, *, full: bool = False) -> GcReport:
+        report = GcReport(dry_run=self.dry_run, full=full)
+        redis = get_redis()
+        if not redis.set(LOCK_KEY, "1", nx=True, ex=6 * 60 * 60):
+            report.errors.append("another GC run holds the lock")
+            return report
+        try:
+            now = datetime.now(timezone.utc)
+            referenced = self.referenced_keys()
+            orphans: list[str] = []
+            cursors: dict[str, Optional[str]] = {}
+
+            for root in PARTITIONED_PREFIXES:
+                if full:
+                    prefixes = [root]
+                else:
+                    prefixes, cursors[root] = self._incremental_prefixes(root, now.date())
+                for prefix in prefixes:
+                    report.prefixes.append(prefix)
+                    orphans += self._sweep(self._list(prefix), referenced, now, report)
+            if full:
+                for prefix in FLAT_PREFIXES:
+                    report.prefixes.append(prefix)
+                    orphans += self._sweep(self._list(prefix), referenced, now, report)
+
+            orphans += self._sweep_candidates(referenced, now, report, skip=set(orphans))
+            report.orphans = orphans
+
+            if not self.dry_run:
+                self._delete(orphans, report)
+                for root, cursor in cursors.items():
+                    if cursor:
+                        redis.set(CURSOR_KEY.format(prefix=root), cursor)
+        finally:
+            redis.delete(LOCK_KEY)
+
+        logger.info(
+            "[storage_gc] %s run: scanned=%d referenced=%d recent=%d orphans=%d (%d bytes) deleted=%d errors=%d",
+            "dry" if self.dry_run else "live",
+            report.scanned,
+            report.referenced,
+            report.recent,
+            len(report.orphans),
+            report.orphan_bytes,
+            report.deleted,
+            len(report.errors),
+        )
+        return report
+
+
+def run_storage_gc(*, dry_run: bool = False, full: bool = False) -> GcReport:
+    s = get_settings()
+    return StorageGarbageCollector(grace=timedelta(hours=float(s.storage_gc_grace_hours)), dry_run=dry_run).run(full=full)
+
+
+def _main() -> None:
+    """python -m app.services.storage_gc [--dry-run] [--full]"""
+    parser = argparse.ArgumentParser(description="Delete unreferenced R2 objects.")
+    parser.add_argument("--dry-run", action="store_true", help="report orphans without deleting them")
+    parser.add_argument("--full", action="store_true", help="scan every prefix instead of new partitions only")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    report = run_storage_gc(dry_run=args.dry_run, full=args.full)
+    print(json.dumps(asdict(report), indent=2), flush=True)
+
+
+if __name__ == "__main__":
+    _main()
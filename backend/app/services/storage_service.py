@@ -1,12 +1,39 @@
 from __future__ import annotations
 
+import asyncio
+import hashlib
+import io
+import itertools
+import logging
 import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass
 from datetime import date, datetime
-from typing import Optional
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO, Deque, Iterable, Iterator, Optional
 from uuid import uuid4
 
 import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+from app.core.config import get_settings
+from app.core.http_clients import get_http_client
+from app.services.content_store import content_addressed_enabled, store_content_addressed
+
+if TYPE_CHECKING:
+    from app.services.local_storage import LocalStorageBackend
+
+logger = logging.getLogger(__name__)
+
+_MiB = 1024 * 1024
+# S3/R2 require every multipart part except the last to be at least 5 MiB.
+_MIN_PART_SIZE = 5 * _MiB
+# Read size for file-like sources; parts are assembled from these reads.
+_READ_CHUNK_SIZE = _MiB
 
 
 @dataclass
@@ -15,6 +42,18 @@ class StoredFile:
     url: str
 
 
+@dataclass
+class StreamedUpload:
+    key: str
+    url: str
+    size: int
+    sha256: str
+
+
+class UploadTooLargeError(RuntimeError):
+    """A streamed upload went past its max_bytes limit; the partial upload was aborted."""
+
+
 @dataclass
 class AudioStorageResult:
     bytes: bytes
@@ -53,6 +92,32 @@ def _get_r2_config() -> tuple[str, str, str, str, str]:
     return r2_endpoint, r2_access_key, r2_secret_key, r2_bucket_name, r2_public_url
 
 
+def _r2_client():
+    return get_r2_storage().client
+
+
+def _transfer_config() -> TransferConfig:
+    s = get_settings()
+    return TransferConfig(
+        multipart_threshold=max(int(s.r2_multipart_threshold_mb), 5) * _MiB,
+        multipart_chunksize=max(int(s.r2_multipart_chunk_mb), 5) * _MiB,
+        max_concurrency=max(int(s.r2_multipart_concurrency), 1),
+    )
+
+
+def _public_url(key: str) -> str:
+    _, _, _, r2_bucket_name, r2_public_url = _get_r2_config()
+    if r2_public_url:
+        return f"{r2_public_url}/{key}"
+    return f"{r2_bucket_name}.r2.dev/{key}"
+
+
+def _songs_key(suffix: str, folder_date: Optional[date]) -> str:
+    if folder_date is None:
+        folder_date = datetime.now().date()
+    return f"songs/{folder_date.strftime('%Y-%m-%d')}/{uuid4().hex}{suffix}"
+
+
 def _upload_bytes_to_r2(
     content: bytes,
     key: str,
@@ -60,34 +125,163 @@ def _upload_bytes_to_r2(
 ) -> str:
     """
     Upload bytes to R2 using the S3-compatible API.
+    Payloads at or above r2_multipart_threshold_mb go up as a parallel multipart upload.
     Returns the public URL of the uploaded file.
     Raises RuntimeError on any R2 error.
     """
-    r2_endpoint, r2_access_key, r2_secret_key, r2_bucket_name, r2_public_url = _get_r2_config()
-
-    client = boto3.client(
-        "s3",
-        endpoint_url=r2_endpoint,
-        aws_access_key_id=r2_access_key,
-        aws_secret_access_key=r2_secret_key,
-        region_name="auto",
-    )
+    _, _, _, r2_bucket_name, _ = _get_r2_config()
+
+    client = _r2_client()
+    transfer_config = _transfer_config()
     try:
-        client.put_object(
-            Bucket=r2_bucket_name,
-            Key=key,
-            Body=content,
-            ContentType=content_type,
-        )
+        if len(content) >= transfer_config.multipart_threshold:
+            client.upload_fileobj(
+                io.BytesIO(content),
+                r2_bucket_name,
+                key,
+                ExtraArgs={"ContentType": content_type},
+                Config=transfer_config,
+            )
+        else:
+            client.put_object(
+                Bucket=r2_bucket_name,
+                Key=key,
+                Body=content,
+                ContentType=content_type,
+            )
     except Exception as e:
         raise RuntimeError(f"R2 upload failed for key '{key}': {type(e).__name__}: {e}") from e
 
-    if r2_public_url:
-        return f"{r2_public_url}/{key}"
-    return f"{r2_bucket_name}.r2.dev/{key}"
+    return _public_url(key)
+
+
+def _upload_stream_to_r2(
+    chunks: Iterable[bytes],
+    key: str,
+    content_type: str,
+    *,
+    part_size: Optional[int] = None,
+) -> str:
+    """
+    Upload a stream of byte chunks to R2 without holding the whole object.
+
+    Chunks are regrouped into parts for an S3 multipart upload and up to
+    r2_multipart_concurrency parts are uploaded in parallel, so memory stays
+    bounded by concurrency x part size. Streams shorter than one part go up as a
+    single PUT. Returns the public URL; raises RuntimeError (after aborting the
+    upload) on any error.
+    """
+    _, _, _, r2_bucket_name, _ = _get_r2_config()
+    transfer_config = _transfer_config()
+    part_size = max(int(part_size or transfer_config.multipart_chunksize), _MIN_PART_SIZE)
+    concurrency = transfer_config.max_concurrency
+
+    client = _r2_client()
+    upload_id: Optional[str] = None
+    parts: list[dict] = []
+    pending: Deque[Future] = deque()
+    buf = bytearray()
+    next_number = 1
+
+    def upload_part(number: int, body: bytes) -> dict:
+        resp = client.upload_part(Bucket=r2_bucket_name, Key=key, UploadId=upload_id, PartNumber=number, Body=body)
+        return {"PartNumber": number, "ETag": resp["ETag"]}
+
+    executor: Optional[ThreadPoolExecutor] = None
+    try:
+        def submit(body: bytes) -> None:
+            nonlocal next_number, executor
+            if executor is None:
+                executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="r2-part")
+            while len(pending) >= concurrency:
+                parts.append(pending.popleft().result())
+            pending.append(executor.submit(upload_part, next_number, body))
+            next_number += 1
+
+        for chunk in chunks:
+            if not chunk:
+                continue
+            buf += chunk
+            while len(buf) >= part_size:
+                if upload_id is None:
+                    upload_id = client.create_multipart_upload(Bucket=r2_bucket_name, Key=key, ContentType=content_type)["UploadId"]
+                submit(bytes(buf[:part_size]))
+                del buf[:part_size]
+
+        if upload_id is None:
+            client.put_object(Bucket=r2_bucket_name, Key=key, Body=bytes(buf), ContentType=content_type)
+        else:
+            if buf:
+                submit(bytes(buf))
+            while pending:
+                parts.append(pending.popleft().result())
+            client.complete_multipart_upload(
+                Bucket=r2_bucket_name,
+                Key=key,
+                UploadId=upload_id,
+                MultipartUpload={"Parts": sorted(parts, key=lambda p: p["PartNumber"])},
+            )
+    except Exception as e:
+        for fut in pending:
+            fut.cancel()
+        if upload_id is not None:
+            try:
+                client.abort_multipart_upload(Bucket=r2_bucket_name, Key=key, UploadId=upload_id)
+            except Exception:
+                pass
+        if isinstance(e, UploadTooLargeError):
+            raise
+        raise RuntimeError(f"R2 streaming upload failed for key '{key}': {type(e).__name__}: {e}") from e
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    return _public_url(key)
+
+
+def _read_chunks(fileobj: BinaryIO, *, max_bytes: Optional[int], digest, counter: list[int]) -> Iterator[bytes]:
+    """Yield fixed-size reads from `fileobj`, hashing and counting as they pass."""
+    while True:
+        chunk = fileobj.read(_READ_CHUNK_SIZE)
+        if not chunk:
+            return
+        counter[0] += len(chunk)
+        if max_bytes is not None and counter[0] > max_bytes:
+            raise UploadTooLargeError(f"File too large (max {max_bytes} bytes)")
+        digest.update(chunk)
+        yield chunk
 
 
 class StorageService:
+    """
+    R2 storage. Owns one boto3 S3 client per process: boto3 clients are thread-safe,
+    and reusing one keeps its connection pool (r2_max_pool_connections) warm
+    instead of paying client construction and a new TLS handshake per call.
+    """
+
+    def __init__(self) -> None:
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    r2_endpoint, r2_access_key, r2_secret_key, _, _ = _get_r2_config()
+                    self._client = boto3.client(
+                        "s3",
+                        endpoint_url=r2_endpoint,
+                        aws_access_key_id=r2_access_key,
+                        aws_secret_access_key=r2_secret_key,
+                        region_name="auto",
+                        config=Config(
+                            max_pool_connections=int(get_settings().r2_max_pool_connections),
+                            retries={"max_attempts": 3, "mode": "standard"},
+                        ),
+                    )
+        return self._client
+
     def store_bytes(
         self,
         *,
@@ -95,15 +289,18 @@ class StorageService:
         suffix: str,
         content_type: str = "application/octet-stream",
         folder: str = "audio",
+        content_addressed: Optional[bool] = None,
     ) -> StoredFile:
         """
         Upload arbitrary bytes to R2.
 
         Args:
-            content:       Raw bytes to upload.
-            suffix:        File suffix (e.g. ".mp3", ".png").
-            content_type:  MIME type for the Content-Type header.
-            folder:        Top-level folder key in R2 (default "audio").
+            content:            Raw bytes to upload.
+            suffix:             File suffix (e.g. ".mp3", ".png").
+            content_type:       MIME type for the Content-Type header.
+            folder:             Top-level folder key in R2 (default "audio").
+            content_addressed:  Key by SHA-256 and skip the upload if the content is
+                                already stored; defaults to storage_content_addressed.
 
         Returns:
             StoredFile with the R2 public URL.
@@ -111,6 +308,9 @@ class StorageService:
         Raises:
             RuntimeError if R2 credentials are missing or upload fails.
         """
+        if content_addressed_enabled(content_addressed):
+            cas = store_content_addressed(self, content=content, suffix=suffix, content_type=content_type, folder=folder)
+            return StoredFile(key=cas.key, url=cas.url)
         key = f"{folder}/{uuid4().hex}{suffix}"
         url = _upload_bytes_to_r2(content=content, key=key, content_type=content_type)
         return StoredFile(key=key, url=url)
@@ -122,11 +322,13 @@ class StorageService:
         content_type: str = "audio/mpeg",
         *,
         folder_date: Optional[date] = None,
+        content_addressed: Optional[bool] = None,
     ) -> AudioStorageResult:
         """
         Upload audio bytes to R2 with a date-based folder path.
 
-        Key format: songs/{YYYY-MM-DD}/{uuid}{suffix}
+        Key format: songs/{YYYY-MM-DD}/{uuid}{suffix}, or songs/sha256/{hh}/{digest}{suffix}
+        in content-addressed mode (see store_bytes).
 
         Args:
             content:       Raw audio bytes.
@@ -140,22 +342,274 @@ class StorageService:
         Raises:
             RuntimeError if R2 credentials are missing or upload fails.
         """
-        if folder_date is None:
-            folder_date = datetime.now().date()
-
-        date_str = folder_date.strftime("%Y-%m-%d")
-        key = f"songs/{date_str}/{uuid4().hex}{suffix}"
+        if content_addressed_enabled(content_addressed):
+            cas = store_content_addressed(self, content=content, suffix=suffix, content_type=content_type, folder="songs")
+            return AudioStorageResult(bytes=content, r2_url=cas.url, key=cas.key)
+        key = _songs_key(suffix, folder_date)
         url = _upload_bytes_to_r2(content=content, key=key, content_type=content_type)
         return AudioStorageResult(bytes=content, r2_url=url, key=key)
 
+    def upload_stream_to_r2(
+        self,
+        chunks: Iterable[bytes],
+        suffix: str,
+        content_type: str = "audio/mpeg",
+        *,
+        folder_date: Optional[date] = None,
+    ) -> StoredFile:
+        """
+        Stream audio chunks to R2 under songs/{YYYY-MM-DD}/ via multipart upload.
+
+        Unlike upload_to_r2 the content is never materialized, so only the key
+        and URL come back.
+        """
+        key = _songs_key(suffix, folder_date)
+        url = _upload_stream_to_r2(chunks, key=key, content_type=content_type)
+        return StoredFile(key=key, url=url)
 
-_storage: Optional[StorageService] = None
+    def store_stream(
+        self,
+        fileobj: BinaryIO,
+        *,
+        suffix: str,
+        content_type: str = "application/octet-stream",
+        folder: str = "audio",
+        max_bytes: Optional[int] = None,
+    ) -> StreamedUpload:
+        """
+        Upload a file-like object to R2 as it is read, computing its SHA-256 on the fly.
+
+        Peak memory is bounded by the multipart window (concurrency x part size)
+        rather than the file size.
 
+        Raises:
+            ValueError if the stream is empty.
+            UploadTooLargeError if more than `max_bytes` are read (the upload is aborted).
+            RuntimeError if R2 credentials are missing or upload fails.
+        """
+        first = fileobj.read(_READ_CHUNK_SIZE)
+        if not first:
+            raise ValueError("Empty file")
+        if max_bytes is not None and len(first) > max_bytes:
+            raise UploadTooLargeError(f"File too large (max {max_bytes} bytes)")
+
+        digest = hashlib.sha256(first)
+        counter = [len(first)]
+        chunks = itertools.chain([first], _read_chunks(fileobj, max_bytes=max_bytes, digest=digest, counter=counter))
+        key = f"{folder}/{uuid4().hex}{suffix}"
+        url = _upload_stream_to_r2(chunks, key=key, content_type=content_type)
+        return StreamedUpload(key=key, url=url, size=counter[0], sha256=digest.hexdigest())
 
-def get_storage() -> StorageService:
+    def copy_url_to_r2(
+        self,
+        source_url: str,
+        suffix: str,
+        content_type: str = "audio/mpeg",
+        *,
+        folder_date: Optional[date] = None,
+    ) -> StoredFile:
+        """Download `source_url` in chunks and stream it straight into R2 (see upload_stream_to_r2)."""
+        with get_http_client("download").stream("GET", source_url) as resp:
+            resp.raise_for_status()
+            return self.upload_stream_to_r2(resp.iter_bytes(), suffix, content_type, folder_date=folder_date)
+
+    def put_bytes(self, key: str, content: bytes, content_type: str) -> str:
+        """Upload `content` under an exact key; returns its public URL."""
+        return _upload_bytes_to_r2(content=content, key=key, content_type=content_type)
+
+    def get_bytes(self, key: str) -> Optional[bytes]:
+        """
+        Download `key`, or None if it does not exist.
+
+        Raises RuntimeError if R2 credentials are missing or the request fails.
+        """
+        _, _, _, r2_bucket_name, _ = _get_r2_config()
+        try:
+            return self.client.get_object(Bucket=r2_bucket_name, Key=key)["Body"].read()
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise RuntimeError(f"R2 GET failed for key '{key}': {type(e).__name__}: {e}") from e
+        except Exception as e:
+            raise RuntimeError(f"R2 GET failed for key '{key}': {type(e).__name__}: {e}") from e
+
+    def download_to(self, key: str, path: Path) -> bool:
+        """
+        Stream `key` into the file at `path` (ranged, concurrent GETs for large objects)
+        without holding it in memory. Returns False if it does not exist.
+
+        Raises RuntimeError if R2 credentials are missing or the request fails.
+        """
+        _, _, _, r2_bucket_name, _ = _get_r2_config()
+        try:
+            self.client.download_file(r2_bucket_name, key, str(path), Config=_transfer_config())
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise RuntimeError(f"R2 GET failed for key '{key}': {type(e).__name__}: {e}") from e
+        except Exception as e:
+            raise RuntimeError(f"R2 GET failed for key '{key}': {type(e).__name__}: {e}") from e
+        return True
+
+    def public_url(self, key: str) -> str:
+        return _public_url(key)
+
+    def presign_put(self, key: str, *, content_type: str, ttl_seconds: int) -> str:
+        """
+        Return a presigned PUT URL for `key`. Content-Type is part of the signature,
+        so the browser must send exactly `content_type`.
+
+        Raises RuntimeError if R2 credentials are missing or signing fails.
+        """
+        _, _, _, r2_bucket_name, _ = _get_r2_config()
+        try:
+            return self.client.generate_presigned_url(
+                "put_object",
+                Params={"Bucket": r2_bucket_name, "Key": key, "ContentType": content_type},
+                ExpiresIn=ttl_seconds,
+            )
+        except Exception as e:
+            raise RuntimeError(f"R2 presigned PUT failed for key '{key}': {type(e).__name__}: {e}") from e
+
+    def head_object(self, key: str) -> Optional[dict]:
+        """
+        HEAD `key`. Returns {"size", "content_type", "etag"} or None if the object does not exist.
+
+        Raises RuntimeError if R2 credentials are missing or the request fails.
+        """
+        _, _, _, r2_bucket_name, _ = _get_r2_config()
+        try:
+            head = self.client.head_object(Bucket=r2_bucket_name, Key=key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise RuntimeError(f"R2 HEAD failed for key '{key}': {type(e).__name__}: {e}") from e
+        except Exception as e:
+            raise RuntimeError(f"R2 HEAD failed for key '{key}': {type(e).__name__}: {e}") from e
+        return {
+            "size": int(head.get("ContentLength") or 0),
+            "content_type": head.get("ContentType") or "application/octet-stream",
+            "etag": (head.get("ETag") or "").strip('"'),
+        }
+
+    def delete_object(self, key: str) -> None:
+        """
+        Delete `key` from R2 and drop any cached signed URL for it.
+
+        Raises RuntimeError if R2 credentials are missing or the delete fails.
+        """
+        from app.services.signed_url_cache import invalidate_signed_url
+
+        _, _, _, r2_bucket_name, _ = _get_r2_config()
+        try:
+            self.client.delete_object(Bucket=r2_bucket_name, Key=key)
+        except Exception as e:
+            raise RuntimeError(f"R2 delete failed for key '{key}': {type(e).__name__}: {e}") from e
+        finally:
+            invalidate_signed_url(key)
+
+    # Async variants: boto3 is blocking, so these run the call on a worker thread
+    # and keep async routes from stalling the event loop.
+
+    async def store_bytes_async(
+        self,
+        *,
+        content: bytes,
+        suffix: str,
+        content_type: str = "application/octet-stream",
+        folder: str = "audio",
+        content_addressed: Optional[bool] = None,
+    ) -> StoredFile:
+        return await asyncio.to_thread(
+            self.store_bytes,
+            content=content,
+            suffix=suffix,
+            content_type=content_type,
+            folder=folder,
+            content_addressed=content_addressed,
+        )
+
+    async def store_stream_async(
+        self,
+        fileobj: BinaryIO,
+        *,
+        suffix: str,
+        content_type: str = "application/octet-stream",
+        folder: str = "audio",
+        max_bytes: Optional[int] = None,
+    ) -> StreamedUpload:
+        return await asyncio.to_thread(
+            self.store_stream, fileobj, suffix=suffix, content_type=content_type, folder=folder, max_bytes=max_bytes
+        )
+
+    async def upload_to_r2_async(
+        self,
+        content: bytes,
+        suffix: str,
+        content_type: str = "audio/mpeg",
+        *,
+        folder_date: Optional[date] = None,
+        content_addressed: Optional[bool] = None,
+    ) -> AudioStorageResult:
+        return await asyncio.to_thread(
+            self.upload_to_r2, content, suffix, content_type, folder_date=folder_date, content_addressed=content_addressed
+        )
+
+
+_r2_storage: Optional[StorageService] = None
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_r2_storage() -> StorageService:
+    """The R2 service itself, whatever STORAGE_BACKEND says (signed URLs, R2-only helpers)."""
+    global _r2_storage
+    if _r2_storage is None:
+        with _storage_lock:
+            if _r2_storage is None:
+                _r2_storage = StorageService()
+    return _r2_storage
+
+
+def r2_configured() -> bool:
+    try:
+        _get_r2_config()
+    except RuntimeError:
+        return False
+    return True
+
+
+def storage_backend_name() -> str:
+    """
+    "local" or "s3". An explicit STORAGE_BACKEND wins; unset means R2 whenever its
+    credentials are configured, so existing R2 deployments keep storing there.
+    """
+    backend = (get_settings().storage_backend or "").strip().lower()
+    if backend:
+        return "local" if backend == "local" else "s3"
+    return "s3" if r2_configured() else "local"
+
+
+def get_storage() -> "StorageService | LocalStorageBackend":
+    """
+    Storage backend selected by storage_backend_name(): "local" writes under
+    LOCAL_STORAGE_DIR (see app/services/local_storage.py); "s3" uses R2.
+    """
     global _storage
     if _storage is None:
-        _storage = StorageService()
+        settings = get_settings()
+        if storage_backend_name() == "local":
+            from app.services.local_storage import LocalStorageBackend
+
+            if os.environ.get("R2_ENDPOINT"):
+                logger.warning(
+                    "[storage_service] R2_ENDPOINT is set but STORAGE_BACKEND=local; files are stored under %s. "
+                    "Set STORAGE_BACKEND=s3 (or leave it unset) to store them in R2.",
+                    settings.local_storage_dir,
+                )
+            _storage = LocalStorageBackend(settings.local_storage_dir)
+        else:
+            _storage = get_r2_storage()
     return _storage
 
 
@@ -165,15 +619,9 @@ def get_signed_url(key: str, *, ttl_seconds: int = 600) -> str:
 
     Raises RuntimeError if R2 credentials are missing or signing fails.
     """
-    r2_endpoint, r2_access_key, r2_secret_key, r2_bucket_name, _ = _get_r2_config()
-
-    client = boto3.client(
-        "s3",
-        endpoint_url=r2_endpoint,
-        aws_access_key_id=r2_access_key,
-        aws_secret_access_key=r2_secret_key,
-        region_name="auto",
-    )
+    _, _, _, r2_bucket_name, _ = _get_r2_config()
+
+    client = _r2_client()
     try:
         return client.generate_presigned_url(
             "get_object",
@@ -182,3 +630,8 @@ def get_signed_url(key: str, *, ttl_seconds: int = 600) -> str:
         )
     except Exception as e:
         raise RuntimeError(f"R2 signed URL generation failed for key '{key}': {type(e).__name__}: {e}") from e
+
+
+async def get_signed_url_async(key: str, *, ttl_seconds: int = 600) -> str:
+    """Async variant of get_signed_url for use from async routes."""
+    return await asyncio.to_thread(get_signed_url, key, ttl_seconds=ttl_seconds)
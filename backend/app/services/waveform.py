@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import struct
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from app.core.config import get_settings
+from app.services.audio_renditions import _run_ffmpeg
+from app.services.storage_service import get_storage
+
+# Peaks are stored in the audiowaveform .dat v1 layout (little-endian), which
+# waveform-data.js / peaks.js read directly:
+#   int32 version=1, uint32 flags (bit 0: 8-bit samples), int32 sample_rate,
+#   int32 samples_per_pixel, uint32 length, then `length` (min, max) int8 pairs.
+DAT_VERSION = 1
+DAT_FLAG_8BIT = 0x1
+_DAT_HEADER = struct.Struct("<iIiiI")
+CONTENT_TYPE = "application/octet-stream"
+
+
+def waveform_resolutions() -> tuple[int, ...]:
+    """Peak counts from WAVEFORM_RESOLUTIONS ("256,1024,4096"), smallest first."""
+    return tuple(sorted({int(r) for r in get_settings().waveform_resolutions.split(",") if r.strip()}))
+
+
+def decode_mono(src: Path, sample_rate: int) -> np.ndarray:
+    """Decode the whole file once to mono int16 PCM at `sample_rate`."""
+    pcm = _run_ffmpeg(
+        ["-i", str(src), "-vn", "-map", "0:a:0", "-ac", "1", "-ar", str(sample_rate), "-f", "s16le", "pipe:1"],
+        cwd=src.parent,
+    )
+    return np.frombuffer(pcm, dtype="<i2")
+
+
+def compute_peaks(samples: np.ndarray, points: int) -> tuple[int, np.ndarray]:
+    """
+    Min/max of `samples` over at most `points` equal windows.
+
+    Returns (samples_per_pixel, int8 array of shape (n, 2)). The tail is padded with
+    its last sample so the final partial window doesn't pick up fake silence.
+    """
+    if samples.size == 0:
+        return 1, np.zeros((0, 2), dtype=np.int8)
+    spp = max(1, -(-samples.size // points))
+    n = -(-samples.size // spp)
+    frames = np.pad(samples, (0, n * spp - samples.size), mode="edge").reshape(n, spp)
+    peaks = np.stack([frames.min(axis=1), frames.max(axis=1)], axis=1)
+    # int16 -> int8 keeps the sign and top 8 bits; plenty for drawing.
+    return spp, (peaks >> 8).astype(np.int8)
+
+
+def encode_dat(peaks: np.ndarray, *, sample_rate: int, samples_per_pixel: int) -> bytes:
+    header = _DAT_HEADER.pack(DAT_VERSION, DAT_FLAG_8BIT, sample_rate, samples_per_pixel, len(peaks))
+    return header + np.ascontiguousarray(peaks, dtype=np.int8).tobytes()
+
+
+def decode_dat(blob: bytes) -> tuple[int, int, np.ndarray]:
+    """Inverse of encode_dat: (sample_rate, samples_per_pixel, int8 (n, 2) array)."""
+    version, flags, sample_rate, spp, length = _DAT_HEADER.unpack_from(blob)
+    if version != DAT_VERSION or not flags & DAT_FLAG_8BIT:
+        raise ValueError(f"Unsupported waveform blob (version={version}, flags={flags})")
+    data = np.frombuffer(blob, dtype=np.int8, offset=_DAT_HEADER.size, count=length * 2)
+    return sample_rate, spp, data.reshape(length, 2)
+
+
+def build_waveform(src: Path, prefix: str) -> dict:
+    """
+    Decode `src` once and store one .dat blob per resolution under `prefix`peaks/.
+
+    Returns {"sample_rate": int, "peaks": {"256": url, ...}}.
+    """
+    sample_rate = int(get_settings().waveform_sample_rate)
+    samples = decode_mono(src, sample_rate)
+    storage = get_storage()
+    peaks: dict[str, str] = {}
+    for points in waveform_resolutions():
+        spp, data = compute_peaks(samples, points)
+        blob = encode_dat(data, sample_rate=sample_rate, samples_per_pixel=spp)
+        peaks[str(points)] = storage.put_bytes(f"{prefix}peaks/{points}.dat", blob, CONTENT_TYPE)
+    return {"sample_rate": sample_rate, "peaks": peaks}
+
+
+def waveform_url(waveform: Optional[dict], points: Optional[int] = None) -> Optional[str]:
+    """URL of the `points` resolution, or the smallest one when not given."""
+    by_points = (waveform or {}).get("peaks") or {}
+    if points is not None:
+        return by_points.get(str(points))
+    return by_points[min(by_points, key=int)] if by_points else None
+
+
+def waveform_urls(waveform: Optional[dict]) -> list[str]:
+    return list(((waveform or {}).get("peaks") or {}).values())
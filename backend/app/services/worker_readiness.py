@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Optional
+
+from app.core.config import get_settings
+from app.services.ace_step_service import warm_up
+from app.services.inference_client import InferenceUnavailableError, ping
+from app.services.model_residency import get_model_residency
+from app.services.worker_registry import record_worker, remove_worker, worker_name
+
+logger = logging.getLogger(__name__)
+
+# Worker side of readiness: warm-up and the heartbeat. States and Redis keys are
+# described in app/services/worker_registry.py.
+
+
+def _sidecar_state() -> dict:
+    try:
+        pong = ping()
+    except InferenceUnavailableError as e:
+        return {"status": "unavailable", "model": None, "error": str(e), "models": None}
+    if pong.get("ready"):
+        status = "ready"
+    else:
+        status = "error" if pong.get("error") else "warming"
+    return {"status": status, "model": pong.get("model"), "error": pong.get("error"), "models": pong.get("models")}
+
+
+class WorkerReadiness:
+    """This worker's readiness entry in Redis, refreshed by a heartbeat thread until stop()."""
+
+    def __init__(self, name: Optional[str] = None):
+        settings = get_settings()
+        self.name = name or worker_name()
+        self.ttl = max(3, int(settings.worker_readiness_ttl_seconds))
+        self.sidecar = settings.ace_step_inference == "sidecar"
+        self.state: dict = {
+            "worker": self.name,
+            "status": "warming",
+            "inference": settings.ace_step_inference,
+            "model": None,
+            "error": None,
+            "since": time.time(),
+        }
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def publish(self, **fields) -> None:
+        with self._lock:
+            self.state.update(fields)
+            state = dict(self.state)
+        try:
+            record_worker(self.name, state, ttl=self.ttl)
+        except Exception as e:
+            logger.warning(f"[worker_readiness] could not publish state for {self.name}: {e}")
+
+    def warm_up(self) -> dict:
+        """
+        Block until this worker can run generation jobs warm: load the models in-process,
+        or wait (up to WORKER_WARMUP_TIMEOUT_SECONDS) for the inference sidecar to report ready.
+        """
+        settings = get_settings()
+        self.publish(status="warming")
+        start = time.monotonic()
+        if self.sidecar:
+            deadline = start + settings.worker_warmup_timeout_seconds
+            fields = _sidecar_state()
+            while fields["status"] in ("warming", "unavailable") and time.monotonic() < deadline:
+                if self._stop.wait(1.0):
+                    break
+                fields = _sidecar_state()
+        else:
+            try:
+                model = warm_up(generation_seconds=settings.worker_warmup_generation_seconds)
+                fields = {"status": "ready", "model": model, "error": None}
+            except Exception as e:
+                logger.exception("[worker_readiness] model warm-up failed")
+                fields = {"status": "error", "model": None, "error": str(e)}
+            fields["models"] = get_model_residency().metrics()
+        fields["warmup_seconds"] = round(time.monotonic() - start, 3)
+        self.publish(**fields)
+        print(f"[worker_readiness] {self.name}: {fields['status']} after {fields['warmup_seconds']}s", flush=True)
+        return fields
+
+    def start_heartbeat(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._heartbeat, name="worker-readiness", daemon=True)
+            self._thread.start()
+
+    def _heartbeat(self) -> None:
+        while not self._stop.wait(self.ttl / 3):
+            # The sidecar can restart underneath us; in-process, only model residency changes.
+            self.publish(**(_sidecar_state() if self.sidecar else {"models": get_model_residency().metrics()}))
+
+    def stop(self) -> None:
+        self._stop.set()
+        try:
+            remove_worker(self.name)
+        except Exception:
+            pass
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import json
+import os
+import socket
+import time
+
+from app.core.cache import get_redis
+from app.core.config import get_settings
+
+# Redis side of worker readiness, kept free of model imports so the API process can read it.
+# Workers publish through app/services/worker_readiness.py.
+#
+# Worker states published under worker-ready:<host>:<pid> (JSON, expiring after
+# WORKER_READINESS_TTL_SECONDS without a heartbeat):
+#   warming      models are loading; the worker hasn't started consuming yet
+#   ready        jobs start warm ("model": "loaded", or "fallback" when ACE-Step isn't
+#                installed and jobs use the synth tone)
+#   error        warm-up failed; jobs retry initialization themselves
+#   unavailable  sidecar mode only: the inference sidecar isn't reachable
+# "models" carries the residency metrics of whichever process holds the models.
+# Ready workers are also in the READY_KEY sorted set, scored by when their entry expires,
+# so the generate gate can check for one without scanning.
+STATUSES = ("warming", "ready", "error", "unavailable")
+
+_KEY_PREFIX = "worker-ready:"
+READY_KEY = "worker-ready-set"
+
+
+def worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _state_key(name: str) -> str:
+    return _KEY_PREFIX + name
+
+
+def record_worker(name: str, state: dict, *, ttl: int) -> None:
+    r = get_redis()
+    now = time.time()
+    r.set(_state_key(name), json.dumps(state), ex=ttl)
+    if state.get("status") == "ready":
+        r.zadd(READY_KEY, {name: now + ttl})
+    else:
+        r.zrem(READY_KEY, name)
+    r.zremrangebyscore(READY_KEY, "-inf", now)  # workers that died without stopping
+
+
+def remove_worker(name: str) -> None:
+    r = get_redis()
+    r.delete(_state_key(name))
+    r.zrem(READY_KEY, name)
+
+
+def list_workers() -> list[dict]:
+    """Every live worker's published state."""
+    r = get_redis()
+    keys = list(r.scan_iter(match=_KEY_PREFIX + "*", count=100))
+    if not keys:
+        return []
+    return [json.loads(value) for value in r.mget(keys) if value]
+
+
+def readiness_summary() -> dict:
+    """Worker counts per status, for /health."""
+    try:
+        workers = list_workers()
+    except Exception as e:
+        return {"error": str(e)}
+    counts = {status: 0 for status in STATUSES}
+    for worker in workers:
+        counts[worker.get("status")] = counts.get(worker.get("status"), 0) + 1
+    return {**counts, "workers": sorted(workers, key=lambda w: w.get("worker", ""))}
+
+
+def generation_worker_available() -> bool:
+    """
+    False only when GENERATION_REQUIRE_READY_WORKER is set and no worker reports ready.
+    A Redis error counts as available; queueing fails loudly on its own then.
+    """
+    if not get_settings().generation_require_ready_worker:
+        return True
+    try:
+        return get_redis().zcount(READY_KEY, time.time(), "+inf") > 0
+    except Exception:
+        return True
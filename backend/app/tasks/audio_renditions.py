@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import logging
+from typing import Optional
+from uuid import UUID
+
+from sqlmodel import Session
+
+from app.core.config import get_settings
+from app.core.database import engine
+from app.models.playlist_song import PlaylistSong  # noqa: F401 - needed for relationship resolution
+from app.models.playlist import Playlist  # noqa: F401 - needed for relationship resolution
+from app.models.song import Song
+from app.services.audio_renditions import local_source, render_renditions, rendition_urls
+from app.services.content_store import release_url
+from app.services.storage_service import get_storage
+from app.services.waveform import build_waveform, waveform_urls
+from app.worker import celery_app
+
+logger = logging.getLogger(__name__)
+
+# Song attribute -> every stored URL in its value (for GC of stale outputs).
+_URLS = {
+    "audio_renditions": rendition_urls,
+    "waveform": waveform_urls,
+}
+
+
+def _stage(name: str, song_id: str, fn, *args, **kwargs) -> Optional[dict]:
+    """Run one post-processing stage; a failure only loses that stage's output."""
+    try:
+        return fn(*args, **kwargs)
+    except Exception as e:
+        logger.warning("[audio_renditions] %s failed for song %s: %s", name, song_id, e)
+        return None
+
+
+@celery_app.task(name="audio.renditions")
+def build_audio_renditions_task(*, song_id: str, source_url: str) -> None:
+    """Fetch the stored original once, then build the HLS ladder, preview clip and waveform peaks."""
+    with Session(engine) as db:
+        song = db.get(Song, UUID(song_id))
+        duration = song.duration if song is not None else None
+    if song is None:
+        return
+
+    with local_source(source_url) as source:
+        if source is None:
+            return
+        src, prefix = source
+        outputs = {
+            "audio_renditions": _stage("renditions", song_id, render_renditions, src, prefix, duration=duration),
+            "waveform": _stage("waveform", song_id, build_waveform, src, prefix),
+        }
+    outputs = {attr: value for attr, value in outputs.items() if value}
+    if not outputs:
+        return
+
+    storage = get_storage()
+    stale: set[str] = set()
+    with Session(engine) as db:
+        song = db.get(Song, UUID(song_id))
+        if song is None or song.audio_url != source_url:
+            # The song was deleted (or its audio replaced) while we were transcoding.
+            for attr, value in outputs.items():
+                stale.update(_URLS[attr](value))
+        else:
+            for attr, value in outputs.items():
+                previous = getattr(song, attr)
+                stale.update(set(_URLS[attr](previous)) - set(_URLS[attr](value)))
+                setattr(song, attr, value)
+            db.add(song)
+            db.commit()
+
+    for url in stale:
+        release_url(storage, url)
+    logger.info("[audio_renditions] song %s: built %s", song_id, ", ".join(outputs))
+
+
+def schedule_audio_renditions(song_id: UUID | str, source_url: str | None) -> None:
+    """Queue HLS/preview transcoding and waveform peaks for a freshly stored song; never fails the caller."""
+    if not source_url or not get_settings().audio_renditions_enabled:
+        return
+    try:
+        build_audio_renditions_task.delay(song_id=str(song_id), source_url=source_url)
+    except Exception as e:
+        logger.warning("[audio_renditions] could not queue renditions for %s: %s", song_id, e)
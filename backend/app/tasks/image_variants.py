@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import logging
+from uuid import UUID
+
+from sqlmodel import Session
+
+from app.core.config import get_settings
+from app.core.database import engine
+from app.models.playlist_song import PlaylistSong  # noqa: F401 - needed for relationship resolution
+from app.models.playlist import Playlist  # noqa: F401 - needed for relationship resolution
+from app.models.song import Song
+from app.models.user import User
+from app.services.content_store import release_url
+from app.services.image_variants import build_variants, variant_urls
+from app.services.storage_service import get_storage
+from app.worker import celery_app
+
+logger = logging.getLogger(__name__)
+
+# kind -> (model, source URL attribute, variants attribute)
+KINDS = {
+    "cover": (Song, "cover_image_url", "cover_variants"),
+    "avatar": (User, "avatar_url", "avatar_variants"),
+    "background": (User, "background_url", "background_variants"),
+}
+
+
+@celery_app.task(name="images.variants")
+def build_image_variants_task(*, kind: str, row_id: str, source_url: str) -> None:
+    model, url_attr, variants_attr = KINDS[kind]
+    variants = build_variants(source_url)
+    if not variants:
+        return
+
+    storage = get_storage()
+    with Session(engine) as db:
+        row = db.get(model, UUID(row_id))
+        if row is None or getattr(row, url_attr) != source_url:
+            # The image was replaced or the row deleted while we were encoding.
+            for url in variant_urls(variants):
+                release_url(storage, url)
+            return
+        previous = getattr(row, variants_attr)
+        setattr(row, variants_attr, variants)
+        db.add(row)
+        db.commit()
+
+    for url in set(variant_urls(previous)) - set(variant_urls(variants)):
+        release_url(storage, url)
+    logger.info("[image_variants] %s %s: %d variants", kind, row_id, len(variant_urls(variants)))
+
+
+def schedule_image_variants(kind: str, row_id: UUID | str, source_url: str | None) -> None:
+    """Queue variant generation for a freshly stored image; never fails the caller."""
+    if not source_url or not get_settings().image_variants_enabled:
+        return
+    try:
+        build_image_variants_task.delay(kind=kind, row_id=str(row_id), source_url=source_url)
+    except Exception as e:
+        logger.warning("[image_variants] could not queue %s variants for %s: %s", kind, row_id, e)
@@ -13,10 +13,12 @@ from app.models.playlist_song import PlaylistSong  # noqa: F401 - needed for rel
 from app.models.playlist import Playlist  # noqa: F401 - needed for relationship resolution
 from app.models.song import Song
 from app.services.image_gen_service import FluxNotInstalledError, generate_cover_image
-from app.services.music_gen_service import MusicGenResult, generate_music
+from app.services.music_gen_service import generate_music
 from app.services.ace_step_api_service import AceStepApiError, AceStepApiParams, generate_music_via_api
-from app.services.progress_service import update_task
+from app.services.progress_service import ProgressEmitter
 from app.services.storage_service import get_storage
+from app.tasks.audio_renditions import schedule_audio_renditions
+from app.tasks.image_variants import schedule_image_variants
 from app.worker import celery_app
 
 
@@ -63,7 +65,10 @@ def run_generation_task(
         effective_caption = caption or prompt
         print(f"[music_generation] Caption: '{effective_caption[:50] if effective_caption else 'N/A'}...'", flush=True)
     print(f"{'='*80}\n", flush=True)
-    
+
+    # Coalesces the frequent progress_cb calls from both generation threads.
+    emitter = ProgressEmitter(task_id)
+
     try:
         print(f"\n{'='*80}", flush=True)
         if mode == "simple":
@@ -84,7 +89,7 @@ def run_generation_task(
             if pct_i > 85:
                 pct_i = 85
             last_progress = pct_i
-            update_task(task_id, status="running", progress=pct_i, message=msg)
+            emitter.emit(status="running", progress=pct_i, message=msg)
 
         report(5, "starting")
         
@@ -102,6 +107,7 @@ def run_generation_task(
 
         # Concurrent audio and cover image generation
         res = None
+        song_bpm = None
         cover_res = None
         cover_image_error = None
 
@@ -144,22 +150,38 @@ def run_generation_task(
 
             # Wait for audio generation result
             try:
-                audio_bytes, replicate_r2_url = audio_future.result()
+                # Replicate streams the audio straight to R2; only the URL comes back.
+                replicate_r2_url = audio_future.result()
                 print(f"[music_generation] Audio generation completed", flush=True)
-                res_bpm = bpm if bpm else 120
-                res = MusicGenResult(wav_bytes=audio_bytes, bpm=res_bpm)
+                song_bpm = bpm if bpm else 120
             except AceStepApiError as e:
                 print(f"[music_generation] ACE-Step API failed: {e}, falling back to local inference", flush=True)
                 # Fallback to local inference
                 if mode == "custom" and effective_prompt:
                     report(15, "fallback: loading local model")
                     report(25, "fallback: generating")
-                    res = generate_music(prompt=effective_prompt, lyrics=lyrics, duration=audio_duration, progress_cb=audio_progress_cb)
+                    res = generate_music(
+                        prompt=effective_prompt,
+                        lyrics=lyrics,
+                        duration=audio_duration,
+                        audio_format=audio_format,
+                        thinking=thinking,
+                        progress_cb=audio_progress_cb,
+                    )
+                    song_bpm = res.bpm
                 elif mode == "simple" and sample_query:
                     report(15, "fallback: loading local model")
                     report(25, "fallback: generating")
                     fallback_lyrics = "[Instrumental]" if instrumental else None
-                    res = generate_music(prompt=sample_query, lyrics=fallback_lyrics, duration=audio_duration, progress_cb=audio_progress_cb)
+                    res = generate_music(
+                        prompt=sample_query,
+                        lyrics=fallback_lyrics,
+                        duration=audio_duration,
+                        audio_format=audio_format,
+                        thinking=thinking,
+                        progress_cb=audio_progress_cb,
+                    )
+                    song_bpm = res.bpm
                 else:
                     raise RuntimeError(f"Cannot fallback: mode={mode}, prompt={prompt}, sample_query={sample_query}") from e
 
@@ -181,15 +203,14 @@ def run_generation_task(
                 cover_image_error = error_msg
 
         # Upload audio
-        update_task(task_id, status="running", progress=85, message="uploading audio")
+        emitter.emit(status="running", progress=85, message="uploading audio", force=True)
         print(f"[music_generation] Uploading audio...", flush=True)
         if replicate_r2_url is not None:
             stored_url = replicate_r2_url
             print(f"[music_generation] Audio already on R2: {stored_url}", flush=True)
         else:
-            suffix = f".{audio_format}"
-            content_type = f"audio/{audio_format}" if audio_format in ["mp3", "wav", "flac"] else "audio/mpeg"
-            stored = get_storage().store_bytes(content=res.wav_bytes, suffix=suffix, content_type=content_type)
+            # Local inference encodes to the requested format; label it with what was produced.
+            stored = get_storage().store_bytes(content=res.audio_bytes, suffix=res.suffix, content_type=res.content_type)
             stored_url = stored.url
             print(f"[music_generation] Audio uploaded successfully: {stored_url}", flush=True)
 
@@ -202,7 +223,7 @@ def run_generation_task(
             cover_image_url = cover_stored.url
             print(f"[music_generation] Cover image uploaded: {cover_image_url}", flush=True)
 
-        update_task(task_id, status="running", progress=90, message="saving")
+        emitter.emit(status="running", progress=90, message="saving", force=True)
         with Session(engine) as db:
             # Use appropriate prompt for song record
             song_prompt = (caption or prompt) if mode == "custom" else (sample_query or "Generated")
@@ -212,7 +233,7 @@ def run_generation_task(
                 prompt=song_prompt,
                 lyrics=lyrics,
                 duration=audio_duration,
-                bpm=res.bpm,
+                bpm=song_bpm,
                 audio_url=stored_url,
                 cover_image_url=cover_image_url,
                 genre=genre,
@@ -222,6 +243,8 @@ def run_generation_task(
             db.add(song)
             db.commit()
             db.refresh(song)
+        schedule_image_variants("cover", song.id, cover_image_url)
+        schedule_audio_renditions(song.id, stored_url)
 
         result = {
             "song_id": str(song.id),
@@ -238,7 +261,7 @@ def run_generation_task(
         if cover_image_error:
             print(f"[music_generation] cover_image_error length: {len(cover_image_error)}", flush=True)
         # Ensure result dict is properly serialized and includes all fields
-        update_task(task_id, status="completed", progress=100, message="completed", result=result)
+        emitter.emit(status="completed", progress=100, message="completed", result=result)
         return result
     except Exception as e:
         import traceback
@@ -248,5 +271,7 @@ def run_generation_task(
         print(f"[music_generation] Error message: {str(e)}", flush=True)
         print(f"[music_generation] Full traceback:\n{error_traceback}", flush=True)
         print(f"[music_generation] ========================================", flush=True)
-        update_task(task_id, status="failed", progress=100, message=str(e), result=None)
+        emitter.emit(status="failed", progress=100, message=str(e))
         raise
+    finally:
+        emitter.flush()
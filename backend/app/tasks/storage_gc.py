@@ -0,0 +1,15 @@
+from __future__ import annotations
+
+from dataclasses import asdict
+
+from app.services.storage_gc import run_storage_gc
+from app.worker import celery_app
+
+
+@celery_app.task(name="storage.gc")
+def run_storage_gc_task(*, dry_run: bool = False, full: bool = False) -> dict:
+    """Celery entry point for the orphaned-object GC; returns the report."""
+    report = asdict(run_storage_gc(dry_run=dry_run, full=full))
+    # Keep the result payload small; `python -m app.services.storage_gc --dry-run` prints the full list.
+    report["orphans"] = report["orphans"][:100]
+    return report
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from datetime import timedelta
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -8,16 +9,20 @@ from dotenv import load_dotenv
 load_dotenv(Path(__file__).parent.parent / ".env")
 
 from celery import Celery
+from celery.signals import worker_init, worker_process_init, worker_process_shutdown, worker_shutdown
 
 from app.core.config import get_settings
+from app.core.http_clients import close_http_clients
+from app.services.image_variants import shutdown_variant_pool
 
 settings = get_settings()
+worker_pool = settings.celery_worker_pool or ("threads" if settings.ace_step_inference == "sidecar" else "solo")
 
 celery_app = Celery(
     "aimusic",
     broker=settings.redis_url,
     backend=settings.redis_url,
-    include=["app.tasks.music_generation"],
+    include=["app.tasks.music_generation", "app.tasks.storage_gc", "app.tasks.image_variants", "app.tasks.audio_renditions"],
 )
 
 celery_app.conf.update(
@@ -26,13 +31,67 @@ celery_app.conf.update(
     result_serializer="json",
     timezone="UTC",
     enable_utc=True,
-    # Use solo pool to avoid forking issues with large ML models
-    # Solo pool runs in the main process (no forking), which is safer for ML models
-    # that consume significant memory. Trade-off: only one task at a time.
-    worker_pool="solo",
-    # Alternative: use threads pool if you need concurrency (but may have issues with MPS/CUDA)
-    # worker_pool="threads",
-    # worker_threads=1,  # Use with threads pool
+    # With in-process ACE-Step inference the worker must use the solo pool: the model handlers
+    # can't survive forking and MPS/CUDA aren't safe across threads, so it runs one task at a
+    # time. With the inference sidecar the models live in that process instead, and the worker
+    # can run the I/O-bound stages (uploads, DB writes, LLM calls) concurrently.
+    worker_pool=worker_pool,
+    worker_concurrency=1 if worker_pool == "solo" else settings.celery_worker_concurrency,
 )
 
+if settings.storage_gc_enabled:
+    # Needs `celery -A app.worker beat` alongside the worker.
+    celery_app.conf.beat_schedule = {
+        "storage-gc": {
+            "task": "storage.gc",
+            "schedule": timedelta(hours=float(settings.storage_gc_interval_hours)),
+        },
+    }
 
+
+_readiness: "WorkerReadiness | None" = None
+
+
+def _warm_up() -> None:
+    # Imported here: the API process imports this module to send tasks and must not load
+    # the model stack with it.
+    from app.services.worker_readiness import WorkerReadiness
+
+    global _readiness
+    if _readiness is not None or not settings.worker_warmup_enabled:
+        return
+    _readiness = WorkerReadiness()
+    _readiness.warm_up()
+    _readiness.start_heartbeat()
+
+
+def _pool_name(worker) -> str:
+    pool = getattr(worker, "pool_cls", None) or worker_pool  # may still be the -P string here
+    return pool if isinstance(pool, str) else pool.__module__.rsplit(".", 1)[-1]
+
+
+@worker_init.connect
+def _warm_up_worker(sender=None, **_kwargs) -> None:
+    # Runs before the consumer starts, so this worker takes no job until the models are warm.
+    # Prefork children load their own copy after forking instead (worker_process_init).
+    if _pool_name(sender) != "prefork":
+        _warm_up()
+
+
+@worker_process_init.connect
+def _warm_up_process(**_kwargs) -> None:
+    _warm_up()
+
+
+@worker_shutdown.connect
+@worker_process_shutdown.connect
+def _release_resources(**_kwargs) -> None:
+    # worker_process_shutdown only fires in prefork children; solo and threads workers
+    # (and the prefork parent) only see worker_shutdown. A prefork child can get both,
+    # so every step below is safe to run twice.
+    global _readiness
+    readiness, _readiness = _readiness, None
+    if readiness is not None:
+        readiness.stop()
+    close_http_clients()
+    shutdown_variant_pool()
@@ -14,6 +14,8 @@ CREATE TABLE IF NOT EXISTS users (
     credits_balance INTEGER NOT NULL DEFAULT 1000,
     avatar_url       VARCHAR(500),
     background_url   VARCHAR(500),
+    avatar_variants      JSON,
+    background_variants  JSON,
     details          VARCHAR(2000) DEFAULT '',
     created_at   TIMESTAMPTZ NOT NULL DEFAULT NOW()
 );
@@ -31,6 +33,9 @@ CREATE TABLE IF NOT EXISTS songs (
     o3ics          TEXT,
     audio_url      VARCHAR(500),
     cover_image_url VARCHAR(500),
+    cover_variants JSON,
+    audio_renditions JSON,
+    waveform JSON,
     duration       INTEGER NOT NULL DEFAULT 30,
     genre          VARCHAR(100),
     bpm            INTEGER,
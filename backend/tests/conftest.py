@@ -3,12 +3,20 @@ from __future__ import annotations
 import pytest
 from fastapi.testclient import TestClient
 from sqlmodel import Session, select
+from sse_starlette.sse import AppStatus
 
 from app.core.database import engine
 from app.main import create_app
 from app.models.user import User
 
 
+@pytest.fixture(autouse=True)
+def reset_sse_app_status():
+    # sse-starlette caches an asyncio.Event on first use; each TestClient runs its own loop.
+    AppStatus.should_exit_event = None
+    yield
+
+
 @pytest.fixture(scope="function")
 def cleanup_test_users():
     yield
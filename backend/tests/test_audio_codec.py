@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+import io
+import math
+import wave
+from array import array
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from app.services.audio_codec import _BLOCK, as_channels, encode_audio, encode_wav, float_to_pcm16, sine, sine_wav
+from app.services.audio_renditions import ffmpeg_binary
+from app.services.music_gen_service import generate_music
+
+
+def _read_wav(data: bytes) -> tuple[int, int, np.ndarray]:
+    with wave.open(io.BytesIO(data), "rb") as wf:
+        assert wf.getsampwidth() == 2
+        frames = wf.readframes(wf.getnframes())
+        return wf.getnchannels(), wf.getframerate(), np.frombuffer(frames, dtype="<i2")
+
+
+def test_matches_per_sample_reference():
+    rng = np.random.default_rng(1)
+    audio = rng.uniform(-1.3, 1.3, size=200_000).astype(np.float32)
+    reference = array("h", (int(min(max(float(x), -1.0), 1.0) * 32767.0) for x in audio))
+
+    channels, rate, pcm = _read_wav(encode_wav(audio, sample_rate=48000))
+    assert (channels, rate) == (1, 48000)
+    assert pcm.tolist() == reference.tolist()
+
+
+def test_downmixes_channels_first_across_blocks():
+    n = _BLOCK * 2 + 123
+    stereo = np.stack([np.full(n, 0.5, dtype=np.float32), np.full(n, -0.1, dtype=np.float32)])
+    _, _, pcm = _read_wav(encode_wav(stereo, sample_rate=44100))
+    assert pcm.size == n
+    assert set(pcm.tolist()) == {int(0.2 * 32767.0)}
+
+    assert as_channels(np.ones((3, 1))).shape == (1, 3)
+    assert as_channels([0.1, 0.2]).shape == (1, 2)
+
+
+def test_non_finite_samples_are_clamped():
+    pcm = float_to_pcm16(np.array([np.nan, np.inf, -np.inf, 2.0, -0.5]))
+    assert pcm.tolist() == [0, 32767, -32767, 32767, -16383]
+
+
+def test_sine_wav_matches_previous_fallback():
+    sample_rate, freq = 8000, 220.0
+    _, rate, pcm = _read_wav(sine_wav(seconds=1, sample_rate=sample_rate, freq=freq))
+    expected = [int(0.2 * 32767.0 * math.sin(2.0 * math.pi * freq * i / sample_rate)) for i in range(sample_rate)]
+    assert rate == sample_rate
+    # float32 scratch buffer: allow an off-by-one at truncation boundaries.
+    assert np.max(np.abs(pcm.astype(np.int32) - np.array(expected))) <= 1
+
+
+def test_encode_audio_keeps_channels_for_wav():
+    stereo = np.stack([np.full(1000, 0.5), np.full(1000, -0.5)])
+    encoded = encode_audio(stereo, sample_rate=48000, fmt="wav")
+    assert (encoded.format, encoded.suffix, encoded.content_type) == ("wav", ".wav", "audio/wav")
+    channels, rate, pcm = _read_wav(encoded.data)
+    assert (channels, rate) == (2, 48000)
+    assert pcm[:4].tolist() == [16383, -16383, 16383, -16383]
+
+
+def test_compressed_formats_fall_back_to_wav_without_ffmpeg():
+    with patch("app.services.audio_codec.ffmpeg_binary", return_value=None):
+        encoded = encode_audio(np.zeros(100), sample_rate=44100, fmt="mp3")
+    assert (encoded.format, encoded.suffix) == ("wav", ".wav")
+
+    with patch("app.services.audio_codec.ffmpeg_binary", return_value=None):
+        res = generate_music(prompt="p", lyrics=None, duration=1, audio_format="mp3")
+    assert (res.audio_format, res.suffix, res.bpm) == ("wav", ".wav", 120)
+
+
+@pytest.mark.skipif(ffmpeg_binary() is None, reason="ffmpeg not installed")
+@pytest.mark.parametrize("fmt,magic", [("flac", b"fLaC"), ("mp3", None), ("opus", b"OggS")])
+def test_encode_audio_streams_through_ffmpeg(fmt, magic):
+    tone = np.stack([sine(seconds=2, sample_rate=48000)] * 2)
+    encoded = encode_audio(tone, sample_rate=48000, fmt=fmt)
+    assert encoded.format == fmt
+    if magic:
+        assert encoded.data.startswith(magic)
+    else:
+        assert encoded.data[:3] == b"ID3" or encoded.data[0] == 0xFF
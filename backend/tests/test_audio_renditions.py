@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import io
+import wave
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from app.services.audio_renditions import build_renditions, ffmpeg_binary, master_playlist, preview_start, rendition_urls
+from app.services.local_storage import LocalStorageBackend
+
+
+def _wav(seconds: float = 1.0, rate: int = 8000) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(b"\x00\x01" * int(seconds * rate))
+    return buf.getvalue()
+
+
+@pytest.fixture
+def local_storage(tmp_path):
+    storage = LocalStorageBackend(str(tmp_path / "store"))
+    with patch("app.services.audio_renditions.get_storage", return_value=storage):
+        yield storage
+
+
+def _fake_ffmpeg(args: list[str], *, cwd: Path) -> None:
+    """Write the files the real invocation would, named from its output argument."""
+    out = args[-1]
+    if out == "index.m3u8":
+        (cwd / "stream.ts").write_bytes(b"ts")
+    (cwd / out).write_bytes(b"data")
+
+
+def test_master_playlist_lists_lowest_rendition_first():
+    text = master_playlist((64, 128))
+    assert text.splitlines() == [
+        "#EXTM3U",
+        "#EXT-X-VERSION:4",
+        "#EXT-X-INDEPENDENT-SEGMENTS",
+        '#EXT-X-STREAM-INF:BANDWIDTH=70400,CODECS="mp4a.40.2"',
+        "64k/index.m3u8",
+        '#EXT-X-STREAM-INF:BANDWIDTH=140800,CODECS="mp4a.40.2"',
+        "128k/index.m3u8",
+    ]
+
+
+def test_preview_start_stays_inside_the_song():
+    assert preview_start(None, 30) == 0.0
+    assert preview_start(20, 30) == 0.0
+    assert preview_start(200, 30) == 60.0
+    assert preview_start(40, 30) == 10.0
+
+
+def test_build_renditions_stores_ladder_next_to_source(local_storage: LocalStorageBackend):
+    source = local_storage.store_bytes(content=_wav(), suffix=".wav", folder="audio")
+    stem = source.key.rsplit(".", 1)[0]
+    with (
+        patch("app.services.audio_renditions.ffmpeg_binary", return_value="/usr/bin/ffmpeg"),
+        patch("app.services.audio_renditions._run_ffmpeg", side_effect=_fake_ffmpeg),
+    ):
+        renditions = build_renditions(source.url, duration=120)
+
+    assert renditions["hls"] == local_storage.public_url(f"{stem}/hls/master.m3u8")
+    assert renditions["preview"] == local_storage.public_url(f"{stem}/preview.m4a")
+    assert renditions["bitrates"] == [64, 128, 256]
+    keys = {url.removeprefix(local_storage.public_url("")) for url in rendition_urls(renditions)}
+    assert keys == {f"{stem}/hls/master.m3u8", f"{stem}/preview.m4a"} | {
+        f"{stem}/hls/{k}k/{name}" for k in (64, 128, 256) for name in ("index.m3u8", "stream.ts")
+    }
+    assert "64k/index.m3u8" in local_storage.get_bytes(f"{stem}/hls/master.m3u8").decode()
+
+
+def test_build_renditions_without_ffmpeg_is_a_noop(local_storage: LocalStorageBackend):
+    source = local_storage.store_bytes(content=_wav(), suffix=".wav", folder="audio")
+    with patch("app.services.audio_renditions.ffmpeg_binary", return_value=None):
+        assert build_renditions(source.url) is None
+
+
+@pytest.mark.skipif(ffmpeg_binary() is None, reason="ffmpeg not installed")
+def test_build_renditions_with_real_ffmpeg(local_storage: LocalStorageBackend):
+    source = local_storage.store_bytes(content=_wav(seconds=8), suffix=".wav", folder="audio")
+    renditions = build_renditions(source.url, duration=8)
+    stem = source.key.rsplit(".", 1)[0]
+    playlist = local_storage.get_bytes(f"{stem}/hls/64k/index.m3u8").decode()
+    assert "#EXT-X-BYTERANGE" in playlist and "stream.ts" in playlist
+    assert local_storage.head_object(f"{stem}/preview.m4a")["size"] > 0
+    assert len(rendition_urls(renditions)) == 8
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import hashlib
+from unittest.mock import patch
+
+import pytest
+
+from app.services.content_store import GC_CANDIDATES_KEY, REFS_KEY, ref_count, release_url
+from app.services.local_storage import LocalStorageBackend
+
+
+class FakeRedis:
+    def __init__(self):
+        self.hashes: dict[str, dict[str, int]] = {}
+        self.zsets: dict[str, dict[str, float]] = {}
+
+    def hget(self, name, key):
+        return self.hashes.get(name, {}).get(key)
+
+    def hincrby(self, name, key, amount):
+        h = self.hashes.setdefault(name, {})
+        h[key] = h.get(key, 0) + amount
+        return h[key]
+
+    def hdel(self, name, key):
+        self.hashes.get(name, {}).pop(key, None)
+
+    def zadd(self, name, mapping):
+        self.zsets.setdefault(name, {}).update(mapping)
+
+    def zrem(self, name, key):
+        self.zsets.get(name, {}).pop(key, None)
+
+
+@pytest.fixture
+def redis():
+    fake = FakeRedis()
+    with patch("app.services.content_store.get_redis", return_value=fake):
+        yield fake
+
+
+def test_identical_content_is_stored_once(tmp_path, redis):
+    storage = LocalStorageBackend(str(tmp_path))
+    png = b"\x89PNG fake cover"
+    digest = hashlib.sha256(png).hexdigest()
+
+    with patch.object(storage, "put_bytes", wraps=storage.put_bytes) as put:
+        first = storage.store_bytes(content=png, suffix=".png", folder="image/2026-01-01", content_addressed=True)
+        second = storage.store_bytes(content=png, suffix=".png", folder="image/2026-01-02", content_addressed=True)
+
+    assert first.key == second.key == f"image/sha256/{digest[:2]}/{digest}.png"
+    assert put.call_count == 1
+    assert ref_count(first.key) == 2
+
+    # Without the Redis index, a HEAD (stat) still finds the object.
+    redis.hashes.clear()
+    with patch.object(storage, "put_bytes") as put:
+        storage.store_bytes(content=png, suffix=".png", folder="image", content_addressed=True)
+    put.assert_not_called()
+
+
+def test_release_moves_unreferenced_keys_to_gc_candidates(tmp_path, redis):
+    storage = LocalStorageBackend(str(tmp_path))
+    stored = storage.upload_to_r2(b"audio", ".mp3", "audio/mpeg", content_addressed=True)
+    storage.upload_to_r2(b"audio", ".mp3", "audio/mpeg", content_addressed=True)
+    assert stored.key.startswith("songs/sha256/")
+
+    release_url(storage, stored.r2_url)
+    assert ref_count(stored.key) == 1
+    assert stored.key not in redis.zsets.get(GC_CANDIDATES_KEY, {})
+
+    release_url(storage, stored.r2_url)
+    assert stored.key not in redis.hashes[REFS_KEY]
+    assert stored.key in redis.zsets[GC_CANDIDATES_KEY]
+    # The object itself is left for GC to remove.
+    assert storage.head_object(stored.key) is not None
+
+
+def test_uuid_keys_remain_the_default(tmp_path, redis):
+    storage = LocalStorageBackend(str(tmp_path))
+    a = storage.store_bytes(content=b"same", suffix=".bin")
+    b = storage.store_bytes(content=b"same", suffix=".bin")
+    assert a.key != b.key
+    assert redis.hashes == {}
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import json
+from uuid import uuid4
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.models.user import User
+from app.services.direct_upload_service import DirectUploadService
+
+MiB = 1024 * 1024
+
+
+class FakeRedis:
+    def __init__(self):
+        self.kv: dict[str, str] = {}
+
+    def get(self, key):
+        return self.kv.get(key)
+
+    def set(self, key, value, ex=None, px=None, nx=False):
+        if nx and key in self.kv:
+            return None
+        self.kv[key] = value
+        return True
+
+    def delete(self, key):
+        self.kv.pop(key, None)
+
+    def register_script(self, _source):
+        # Same semantics as the intent claim script in direct_upload_service.
+        def claim(keys, args, client):
+            raw = client.kv.get(keys[0])
+            if raw is None:
+                return None
+            intent = json.loads(raw)
+            if intent["user_id"] != args[0] or intent["purpose"] != args[1]:
+                return [raw, -1]
+            del client.kv[keys[0]]
+            return [raw, 60_000]
+
+        return claim
+
+
+class FakeStorage:
+    def __init__(self):
+        self.objects: dict[str, dict] = {}
+        self.deleted: list[str] = []
+
+    def presign_put(self, key, *, content_type, ttl_seconds):
+        return f"https://r2.example.com/{key}?X-Amz-Signature=sig"
+
+    def head_object(self, key):
+        return self.objects.get(key)
+
+    def delete_object(self, key):
+        self.deleted.append(key)
+        self.objects.pop(key, None)
+
+    def public_url(self, key):
+        return f"https://cdn.example.com/{key}"
+
+
+@pytest.fixture
+def fakes():
+    redis, storage = FakeRedis(), FakeStorage()
+    with patch("app.services.direct_upload_service.get_redis", return_value=redis), \
+         patch("app.services.direct_upload_service.get_storage", return_value=storage):
+        yield redis, storage
+
+
+def test_create_and_confirm_upload(fakes):
+    redis, storage = fakes
+    service, user_id = DirectUploadService(), uuid4()
+
+    ticket = service.create_upload(user_id=user_id, purpose="avatar", filename="me.png", content_type="image/png", size=2048)
+    assert ticket.key.startswith("avatars/") and ticket.key.endswith(".png")
+    assert ticket.method == "PUT" and ticket.headers == {"Content-Type": "image/png"}
+
+    with pytest.raises(LookupError):
+        service.confirm_upload(user_id=user_id, key=ticket.key, purpose="avatar")  # not uploaded yet
+    with pytest.raises(PermissionError):
+        service.confirm_upload(user_id=uuid4(), key=ticket.key, purpose="avatar")
+
+    storage.objects[ticket.key] = {"size": 2048, "content_type": "image/png", "etag": "e"}
+    uploaded = service.confirm_upload(user_id=user_id, key=ticket.key, purpose="avatar")
+    assert uploaded.url == f"https://cdn.example.com/{ticket.key}"
+    assert uploaded.original_filename == "me.png"
+    # The reservation is single-use.
+    with pytest.raises(LookupError):
+        service.confirm_upload(user_id=user_id, key=ticket.key, purpose="avatar")
+
+
+def test_concurrent_confirms_claim_the_intent_once(fakes):
+    _, storage = fakes
+    service, user_id = DirectUploadService(), uuid4()
+    ticket = service.create_upload(user_id=user_id, purpose="file", filename="a.bin", content_type="application/octet-stream", size=10)
+    storage.objects[ticket.key] = {"size": 10, "content_type": "application/octet-stream", "etag": "e"}
+
+    # The second confirm arrives while the first is still checking the object.
+    second = []
+    head_object = storage.head_object
+
+    def head_during_second_confirm(key):
+        with pytest.raises(LookupError):
+            service.confirm_upload(user_id=user_id, key=key, purpose="file")
+        second.append(True)
+        return head_object(key)
+
+    storage.head_object = head_during_second_confirm
+    assert service.confirm_upload(user_id=user_id, key=ticket.key, purpose="file").size == 10
+    assert second == [True]
+
+
+def test_create_upload_validates_declared_type_and_size(fakes):
+    service = DirectUploadService()
+    with pytest.raises(ValueError):
+        service.create_upload(user_id=uuid4(), purpose="avatar", filename="a.pdf", content_type="application/pdf", size=10)
+    with pytest.raises(ValueError):
+        service.create_upload(user_id=uuid4(), purpose="avatar", filename="a.png", content_type="image/png", size=500 * MiB)
+    with pytest.raises(ValueError):
+        service.create_upload(user_id=uuid4(), purpose="nope", filename="a.png", content_type="image/png", size=10)
+
+
+def test_confirm_rejects_and_deletes_oversized_object(fakes):
+    _, storage = fakes
+    service, user_id = DirectUploadService(), uuid4()
+    ticket = service.create_upload(user_id=user_id, purpose="file", filename="a.bin", content_type="application/octet-stream", size=10)
+    storage.objects[ticket.key] = {"size": ticket.max_bytes + 1, "content_type": "application/octet-stream", "etag": "e"}
+
+    with pytest.raises(ValueError):
+        service.confirm_upload(user_id=user_id, key=ticket.key, purpose="file")
+    assert storage.deleted == [ticket.key]
+
+
+def test_avatar_direct_upload_routes(client: TestClient, test_user: tuple[User, str], fakes):
+    _, storage = fakes
+    _, token = test_user
+    headers = {"Authorization": f"Bearer {token}"}
+
+    r = client.post(
+        "/api/users/me/avatar/upload-url",
+        json={"filename": "me.jpg", "content_type": "image/jpeg", "size": 4096},
+        headers=headers,
+    )
+    assert r.status_code == 200
+    key = r.json()["key"]
+    assert r.json()["upload_url"].startswith("https://r2.example.com/avatars/")
+
+    storage.objects[key] = {"size": 4096, "content_type": "image/jpeg", "etag": "e"}
+    r = client.post("/api/users/me/avatar/confirm", json={"key": key}, headers=headers)
+    assert r.status_code == 200
+    assert r.json()["avatar_url"] == f"https://cdn.example.com/{key}"
+
+    r = client.post("/api/users/me/avatar/confirm", json={"key": key}, headers=headers)
+    assert r.status_code == 404
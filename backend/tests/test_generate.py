@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 import json
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 from fastapi.testclient import TestClient
@@ -13,6 +13,22 @@ from app.core.database import engine, get_session
 from app.models.user import User
 
 
+class FakeSubscription:
+    """In-memory stand-in for a progress hub subscription to one task."""
+
+    def __init__(self, states: list[dict] | None = None):
+        self.states = list(states or [])
+        self.closed = False
+
+    async def get(self, timeout: float | None = None):
+        if self.states:
+            return self.states.pop(0)
+        return None
+
+    async def aclose(self):
+        self.closed = True
+
+
 @pytest.fixture(scope="function")
 def cleanup_test_users():
     """Cleanup test users after each test."""
@@ -388,7 +404,8 @@ def test_generate_events_not_found(client: TestClient, test_user: tuple[User, st
     user, token = test_user
     
     # Mock Redis to return None (task not found)
-    with patch("app.api.routes.generate.get_task", return_value=None):
+    with patch("app.api.routes.generate.get_task_async", AsyncMock(return_value=None)), \
+         patch("app.api.routes.generate.subscribe_task", AsyncMock(return_value=FakeSubscription())):
         response = client.get(
             "/api/generate/events/non-existent-task-id",
             headers={"Authorization": f"Bearer {token}"}
@@ -423,7 +440,8 @@ def test_generate_events_wrong_user(client: TestClient, test_user: tuple[User, s
         "message": "generating"
     }
     
-    with patch("app.api.routes.generate.get_task", return_value=fake_task_state):
+    with patch("app.api.routes.generate.get_task_async", AsyncMock(return_value=fake_task_state)), \
+         patch("app.api.routes.generate.subscribe_task", AsyncMock(return_value=FakeSubscription())):
         response = client.get(
             "/api/generate/events/some-task-id",
             headers={"Authorization": f"Bearer {token}"}
@@ -432,3 +450,60 @@ def test_generate_events_wrong_user(client: TestClient, test_user: tuple[User, s
         # Should return 200 but with error event
         assert response.status_code == 200
 
+
+def test_generate_events_streams_published_updates(client: TestClient, test_user: tuple[User, str]):
+    """Test that events endpoint forwards published state changes until a terminal state."""
+    user, token = test_user
+
+    base = {"task_id": "some-task-id", "user_id": str(user.id), "message": ""}
+    snapshot = {**base, "status": "queued", "progress": 0}
+    published = [
+        {**base, "status": "running", "progress": 40},
+        {**base, "status": "completed", "progress": 100, "result": {"song_id": "s1"}},
+    ]
+    subscription = FakeSubscription(published)
+
+    with patch("app.api.routes.generate.get_task_async", AsyncMock(return_value=snapshot)), \
+         patch("app.api.routes.generate.subscribe_task", AsyncMock(return_value=subscription)):
+        response = client.get(
+            "/api/generate/events/some-task-id",
+            headers={"Authorization": f"Bearer {token}"}
+        )
+
+        assert response.status_code == 200
+        events = [
+            json.loads(line[len("data:"):].strip())
+            for line in response.text.splitlines()
+            if line.startswith("data:")
+        ]
+        assert [e["status"] for e in events] == ["queued", "running", "completed"]
+        assert events[-1]["result"] == {"song_id": "s1"}
+        assert subscription.closed
+
+
+def test_generate_events_resumes_from_last_event_id(client: TestClient, test_user: tuple[User, str]):
+    """Test that a reconnect with Last-Event-ID replays missed transitions with SSE ids."""
+    user, token = test_user
+
+    base = {"task_id": "some-task-id", "user_id": str(user.id), "message": ""}
+    missed = [
+        {**base, "status": "running", "progress": 60, "event_id": "1700000000002-0"},
+        {**base, "status": "completed", "progress": 100, "event_id": "1700000000003-0"},
+    ]
+    snapshot = missed[-1]
+
+    with patch("app.api.routes.generate.get_task_async", AsyncMock(return_value=snapshot)), \
+         patch("app.api.routes.generate.subscribe_task", AsyncMock(return_value=FakeSubscription())), \
+         patch("app.api.routes.generate.read_task_events", AsyncMock(return_value=missed)) as mock_read:
+        response = client.get(
+            "/api/generate/events/some-task-id",
+            headers={"Authorization": f"Bearer {token}", "Last-Event-ID": "1700000000001-0"}
+        )
+
+        assert response.status_code == 200
+        mock_read.assert_awaited_once_with("some-task-id", after_id="1700000000001-0")
+        lines = response.text.splitlines()
+        ids = [line[len("id:"):].strip() for line in lines if line.startswith("id:")]
+        events = [json.loads(line[len("data:"):].strip()) for line in lines if line.startswith("data:")]
+        assert ids == ["1700000000002-0", "1700000000003-0"]
+        assert [e["progress"] for e in events] == [60, 100]
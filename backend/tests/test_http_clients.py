@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+
+import pytest
+
+from app.core.http_clients import aclose_http_clients, close_http_clients, get_async_http_client, get_http_client
+
+
+def test_sync_clients_are_pooled_per_provider():
+    runpod = get_http_client("runpod")
+    assert get_http_client("runpod") is runpod
+    assert get_http_client("llm") is not runpod
+
+    close_http_clients()
+    assert runpod.is_closed
+    assert get_http_client("runpod") is not runpod
+    close_http_clients()
+
+
+def test_unknown_provider_is_rejected():
+    with pytest.raises(ValueError):
+        get_http_client("nope")
+
+
+def test_async_clients_are_reused_within_a_loop_and_closed_on_shutdown():
+    async def scenario():
+        client = get_async_http_client("runpod")
+        assert get_async_http_client("runpod") is client
+        await aclose_http_clients()
+        return client
+
+    first = asyncio.run(scenario())
+    assert first.is_closed
+
+    # A new event loop gets a fresh pool rather than one bound to a dead loop.
+    async def other_loop():
+        client = get_async_http_client("runpod")
+        await aclose_http_clients()
+        return client
+
+    assert asyncio.run(other_loop()) is not first
+
+
+def test_async_clients_are_kept_per_loop_and_closed_from_any_thread():
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    try:
+
+        async def make():
+            return get_async_http_client("runpod")
+
+        other = asyncio.run_coroutine_threadsafe(make(), loop).result(timeout=5)
+
+        async def here():
+            client = get_async_http_client("runpod")
+            assert client is not other and not other.is_closed  # another loop's client is left alone
+            await aclose_http_clients()  # closes ours, then the other loop's on its own loop
+            return client
+
+        assert asyncio.run(here()).is_closed
+        assert other.is_closed
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=5)
+        loop.close()
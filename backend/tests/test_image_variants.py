@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import io
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+import pytest
+from PIL import Image
+from sqlmodel import Session
+
+from app.core.database import engine
+from app.models.user import User
+from app.services.image_variants import build_variants, render_variants, thumbnail_url, variant_urls
+from app.services.local_storage import LocalStorageBackend
+from app.tasks.image_variants import build_image_variants_task
+
+
+def _png(width: int, height: int) -> bytes:
+    buf = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 40, 90)).save(buf, "PNG")
+    return buf.getvalue()
+
+
+@pytest.fixture
+def local_storage(tmp_path):
+    storage = LocalStorageBackend(str(tmp_path))
+    pool = ThreadPoolExecutor(max_workers=2)
+    with (
+        patch("app.services.image_variants.get_storage", return_value=storage),
+        patch("app.services.image_variants.get_variant_pool", return_value=pool),
+        patch("app.services.image_variants.variant_formats", return_value=("webp",)),
+        patch("app.tasks.image_variants.get_storage", return_value=storage),
+    ):
+        yield storage
+    pool.shutdown()
+
+
+def test_render_variants_downscales_without_upscaling():
+    out = render_variants(_png(400, 200), "webp", (64, 256, 768))
+    sizes = {}
+    for size, data in out.items():
+        with Image.open(io.BytesIO(data)) as img:
+            assert img.format == "WEBP"
+            sizes[size] = img.size
+    assert sizes == {64: (64, 32), 256: (256, 128), 768: (400, 200)}
+
+
+def test_build_variants_stores_next_to_source(local_storage: LocalStorageBackend):
+    source = local_storage.store_bytes(content=_png(300, 300), suffix=".png", folder="image/2024-01-01")
+    variants = build_variants(source.url)
+
+    stem = source.key.rsplit(".", 1)[0]
+    assert variants == {"webp": {str(s): local_storage.public_url(f"{stem}_{s}.webp") for s in (64, 256, 768)}}
+    for url in variant_urls(variants):
+        assert local_storage.head_object(url.removeprefix(local_storage.public_url("")))["content_type"] == "image/webp"
+
+    assert build_variants(local_storage.public_url("image/missing.png")) is None
+
+
+def test_thumbnail_url_falls_back_to_original():
+    assert thumbnail_url(None, "orig.png") == "orig.png"
+    assert thumbnail_url({"webp": {"64": "small.webp"}}, "orig.png") == "orig.png"
+    assert thumbnail_url({"avif": {"256": "t.avif"}, "webp": {"256": "t.webp"}}, "orig.png") == "t.webp"
+
+
+def test_task_skips_replaced_image(local_storage: LocalStorageBackend, test_user):
+    user, _ = test_user
+    first = local_storage.store_bytes(content=_png(100, 100), suffix=".png", folder="avatars")
+    second = local_storage.store_bytes(content=_png(120, 120), suffix=".png", folder="avatars")
+    with Session(engine) as db:
+        row = db.get(User, user.id)
+        row.avatar_url = second.url
+        db.add(row)
+        db.commit()
+
+    with patch("app.tasks.image_variants.release_url") as release:
+        build_image_variants_task(kind="avatar", row_id=str(user.id), source_url=first.url)
+        assert release.call_count == 3  # variants of the stale image are handed to GC
+        build_image_variants_task(kind="avatar", row_id=str(user.id), source_url=second.url)
+        assert release.call_count == 3
+
+    with Session(engine) as db:
+        assert set(db.get(User, user.id).avatar_variants["webp"]) == {"64", "256", "768"}
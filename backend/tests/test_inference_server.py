@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import io
+import os
+import threading
+import time
+import wave
+from multiprocessing.shared_memory import SharedMemory
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from app.core.config import get_settings
+from app.services.ace_step_service import AceStepGenerateParams, AceStepNotInstalledError
+from app.services.inference_client import InferenceUnavailableError, attach_shared_memory, generate_audio_remote, ping
+from app.services.inference_server import InferenceServer
+from app.services.music_gen_service import generate_music
+
+_AUTHKEY = b"test-inference-key"
+
+
+@pytest.fixture
+def sidecar(tmp_path, monkeypatch):
+    address = str(tmp_path / "inference.sock")
+    settings = get_settings()
+    monkeypatch.setattr(settings, "inference_socket_path", address)
+    monkeypatch.setattr(settings, "inference_authkey", _AUTHKEY.decode())
+    # Server and client share this process's resource tracker here; in production the
+    # worker un-tracks blocks it attaches to, which would drop the sidecar's registration.
+    monkeypatch.setattr("app.services.inference_client.resource_tracker.unregister", lambda *a: None)
+    server = InferenceServer(address, _AUTHKEY)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    for _ in range(100):
+        if os.path.exists(address):
+            break
+        time.sleep(0.01)
+    yield server
+    server.close()
+    thread.join(timeout=5)
+    assert not os.path.exists(address)
+
+
+def _fake_waveform(params, *, progress_cb=None):
+    progress_cb(30, "ace-step: generating music")
+    t = np.arange(params.sample_rate * params.duration, dtype=np.float32) / params.sample_rate
+    left = 0.5 * np.sin(2 * np.pi * 440 * t)
+    return np.stack([left, -left]).astype(np.float32), params.sample_rate
+
+
+def test_result_comes_back_through_shared_memory(sidecar):
+    created = []
+
+    def tracking_shm(*args, **kwargs):
+        shm = SharedMemory(*args, **kwargs)
+        created.append(shm.name)
+        return shm
+
+    events = []
+    params = AceStepGenerateParams(prompt="p", lyrics=None, duration=1, sample_rate=8000)
+    with patch("app.services.inference_server.generate_waveform", side_effect=_fake_waveform), patch(
+        "app.services.inference_server.SharedMemory", side_effect=tracking_shm
+    ):
+        encoded = generate_audio_remote(params, progress_cb=lambda pct, msg: events.append(pct))
+
+    assert events == [30, 85, 90]
+    assert encoded.format == "wav"
+    with wave.open(io.BytesIO(encoded.data), "rb") as wf:
+        assert (wf.getnchannels(), wf.getframerate(), wf.getnframes()) == (2, 8000, 8000)
+        pcm = np.frombuffer(wf.readframes(4), dtype="<i2")
+    expected, _ = _fake_waveform(params, progress_cb=lambda *_: None)
+    assert pcm[2:4].tolist() == [int(expected[0, 1] * 32767), int(expected[1, 1] * 32767)]
+
+    # The sidecar unlinks the block once the worker has released it.
+    assert len(created) == 1
+    for _ in range(100):
+        try:
+            attach_shared_memory(created[0]).close()
+        except FileNotFoundError:
+            break
+        time.sleep(0.01)
+    else:
+        pytest.fail("shared-memory block was not unlinked")
+
+
+def test_errors_map_to_in_process_exceptions(sidecar):
+    params = AceStepGenerateParams(prompt="p", lyrics=None, duration=1)
+    with patch("app.services.inference_server.generate_waveform", side_effect=AceStepNotInstalledError("no torch")):
+        with pytest.raises(AceStepNotInstalledError):
+            generate_audio_remote(params)
+        # generate_music falls back to the synth tone exactly as it does in-process.
+        with patch.object(get_settings(), "ace_step_inference", "sidecar"):
+            res = generate_music(prompt="p", lyrics=None, duration=1)
+        assert res.bpm == 120
+
+    with patch("app.services.inference_server.generate_waveform", side_effect=ValueError("bad shape")):
+        with pytest.raises(RuntimeError, match="bad shape"):
+            generate_audio_remote(params)
+
+    pong = ping()
+    assert (pong["ready"], pong["model"], pong["error"]) == (False, None, None)
+    assert "budget_mb" in pong["models"]
+
+
+def test_unreachable_sidecar(tmp_path, monkeypatch):
+    monkeypatch.setattr(get_settings(), "inference_socket_path", str(tmp_path / "missing.sock"))
+    with pytest.raises(InferenceUnavailableError):
+        generate_audio_remote(AceStepGenerateParams(prompt="p", lyrics=None, duration=1))
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import hashlib
+import io
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.services.local_storage import LocalStorageBackend
+from app.services.storage_service import UploadTooLargeError
+
+
+@pytest.fixture
+def local_storage(tmp_path):
+    storage = LocalStorageBackend(str(tmp_path))
+    with patch("app.api.routes.files.get_storage", return_value=storage):
+        yield storage
+
+
+def test_writes_are_atomic_and_keys_stay_under_root(local_storage: LocalStorageBackend):
+    stored = local_storage.store_bytes(content=b"abc", suffix=".txt", folder="files")
+    path = local_storage.path_for(stored.key)
+    assert path.read_bytes() == b"abc"
+    assert stored.url == f"/api/files/{stored.key}"
+    assert [p.name for p in path.parent.iterdir()] == [path.name]  # no temp files left behind
+
+    with pytest.raises(ValueError):
+        local_storage.path_for("../outside.txt")
+    assert local_storage.head_object("../outside.txt") is None
+
+
+def test_store_stream_over_limit_leaves_nothing(local_storage: LocalStorageBackend):
+    payload = b"x" * (3 * 1024 * 1024)
+    stored = local_storage.store_stream(io.BytesIO(payload), suffix=".bin", folder="files")
+    assert stored.sha256 == hashlib.sha256(payload).hexdigest()
+    assert local_storage.head_object(stored.key)["size"] == len(payload)
+
+    with pytest.raises(UploadTooLargeError):
+        local_storage.store_stream(io.BytesIO(payload), suffix=".bin", folder="big", max_bytes=2 * 1024 * 1024)
+    assert not (local_storage.root / "big").exists() or not any((local_storage.root / "big").iterdir())
+
+
+def test_get_file_serves_ranges_and_etags(client: TestClient, local_storage: LocalStorageBackend):
+    content = bytes(range(256)) * 16
+    stored = local_storage.store_bytes(content=content, suffix=".mp3", folder="songs")
+
+    full = client.get(f"/api/files/{stored.key}")
+    assert full.status_code == 200
+    assert full.content == content
+    assert full.headers["accept-ranges"] == "bytes"
+    assert full.headers["content-type"] == "audio/mpeg"
+    etag = full.headers["etag"]
+
+    part = client.get(f"/api/files/{stored.key}", headers={"Range": "bytes=100-199"})
+    assert part.status_code == 206
+    assert part.content == content[100:200]
+    assert part.headers["content-range"] == f"bytes 100-199/{len(content)}"
+
+    cached = client.get(f"/api/files/{stored.key}", headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+
+    assert client.get("/api/files/songs/missing.mp3").status_code == 404
+
+
+@pytest.mark.parametrize(
+    ("configured", "r2_env", "expected"),
+    [("", True, "s3"), ("", False, "local"), ("local", True, "local"), ("S3", False, "s3")],
+)
+def test_backend_defaults_to_r2_when_configured(monkeypatch, configured, r2_env, expected):
+    from app.core.config import get_settings
+    from app.services.storage_service import storage_backend_name
+
+    monkeypatch.setattr(get_settings(), "storage_backend", configured)
+    for name in ("R2_ENDPOINT", "R2_ACCESS_KEY", "R2_SECRET_KEY", "R2_BUCKET_NAME"):
+        if r2_env:
+            monkeypatch.setenv(name, "x")
+        else:
+            monkeypatch.delenv(name, raising=False)
+    assert storage_backend_name() == expected
@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import sys
+import types
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+from app.services import ace_step_service
+from app.services.ace_step_service import AceStepGenerateParams, generate_waveform
+from app.services.model_residency import ModelResidencyManager
+
+_MiB = 1024 * 1024
+
+
+class StubModel:
+    """Handle with a fixed device footprint; offloading moves it to "host"."""
+
+    def __init__(self, name: str, device_mb: int):
+        self.name = name
+        self.device_mb = device_mb
+        self.where = "device"
+        self.unloaded = False
+
+
+def _register(manager: ModelResidencyManager, name: str, device_mb: int, events: list, *, offload: bool = True):
+    def load(**_kwargs):
+        events.append(("load", name))
+        return StubModel(name, device_mb)
+
+    def measure(model: StubModel):
+        on_device = model.device_mb * _MiB if model.where == "device" else 0
+        return model.device_mb * _MiB - on_device, on_device
+
+    def do_offload(model: StubModel):
+        events.append(("offload", name))
+        model.where = "host"
+        return "device"
+
+    def do_restore(model: StubModel, saved):
+        events.append(("restore", name))
+        model.where = saved
+
+    def unload(model: StubModel):
+        events.append(("unload", name))
+        model.unloaded = True
+
+    manager.register(
+        name,
+        load=load,
+        unload=unload,
+        offload=do_offload if offload else None,
+        restore=do_restore if offload else None,
+        measure=measure,
+    )
+
+
+def test_loads_lazily_once_and_reports_metrics():
+    events: list = []
+    manager = ModelResidencyManager()
+    _register(manager, "dit", 500, events)
+    assert manager.metrics()["models"]["dit"]["state"] == "unloaded"
+
+    with manager.use("dit") as first:
+        assert manager.metrics()["models"]["dit"]["in_use"] == 1
+    with manager.use("dit") as second:
+        pass
+
+    assert first is second and events == [("load", "dit")]
+    stats = manager.metrics()["models"]["dit"]
+    assert (stats["state"], stats["loads"], stats["device_mb"], stats["in_use"]) == ("resident", 1, 500.0, 0)
+    assert stats["last_load_seconds"] is not None and stats["idle_seconds"] is not None
+
+
+def test_budget_evicts_least_recently_used_idle_model():
+    events: list = []
+    manager = ModelResidencyManager(budget_bytes=1000 * _MiB)
+    _register(manager, "dit", 600, events)
+    _register(manager, "lm", 600, events, offload=False)
+
+    with manager.use("lm"):
+        pass
+    with manager.use("dit"):
+        pass  # the DiT's size is only known once loaded; then the idle LM is unloaded to fit
+    assert events == [("load", "lm"), ("load", "dit"), ("unload", "lm")]
+
+    events.clear()
+    with manager.use("lm"):
+        pass  # sizes are known now; the DiT supports offloading, so it is parked in host RAM
+    with manager.use("dit"):
+        pass
+    assert events == [("offload", "dit"), ("load", "lm"), ("unload", "lm"), ("restore", "dit")]
+    stats = manager.metrics()["models"]
+    assert (stats["dit"]["offloads"], stats["dit"]["restores"], stats["lm"]["loads"]) == (1, 1, 2)
+
+
+def test_models_in_use_are_never_evicted():
+    events: list = []
+    manager = ModelResidencyManager(budget_bytes=1000 * _MiB)
+    _register(manager, "dit", 600, events)
+    _register(manager, "lm", 600, events)
+
+    with manager.use("dit") as dit, manager.use("lm") as lm:
+        assert dit.where == "device" and not lm.unloaded
+        assert manager.metrics()["device_mb"] == 1200.0  # over budget, but both are pinned
+    assert manager.evict("lm") and events[-1] == ("unload", "lm")
+    assert not manager.evict("lm")
+
+
+def test_idle_models_are_unloaded():
+    events: list = []
+    manager = ModelResidencyManager(idle_seconds=60)
+    _register(manager, "lm", 100, events)
+    with manager.use("lm") as lm:
+        pass
+    manager._reaper = object()  # drive release_idle by hand instead of the background thread
+
+    assert manager.release_idle() == []
+    last_used = manager._models["lm"].last_used
+    assert manager.release_idle(now=last_used + 61) == ["lm"]
+    assert lm.unloaded and manager.metrics()["models"]["lm"]["state"] == "unloaded"
+
+
+def test_failed_load_is_retried_and_not_pinned():
+    manager = ModelResidencyManager()
+    calls = []
+
+    def load(**_kwargs):
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("weights missing")
+        return StubModel("dit", 1)
+
+    manager.register("dit", load=load, measure=lambda _m: (0, 0))
+    with pytest.raises(RuntimeError):
+        with manager.use("dit"):
+            pass
+    assert manager.metrics()["models"]["dit"]["in_use"] == 0
+    with manager.use("dit") as dit:
+        assert dit.name == "dit"
+    assert len(calls) == 2
+
+
+@pytest.fixture
+def fake_acestep():
+    """Minimal torch / acestep.inference stand-ins so generate_waveform runs without the real models."""
+    seen = {}
+
+    def generate_music(*, dit_handler, llm_handler, params, config, save_dir, progress):
+        seen.update(dit=dit_handler, llm=llm_handler, thinking=params.thinking)
+        audio = np.full((2, 10), 0.25, dtype=np.float32)
+        return types.SimpleNamespace(success=True, error=None, audios=[{"tensor": audio, "sample_rate": 48000}])
+
+    inference = types.ModuleType("acestep.inference")
+    inference.GenerationParams = lambda **kw: types.SimpleNamespace(**kw)
+    inference.GenerationConfig = lambda **kw: types.SimpleNamespace(**kw)
+    inference.generate_music = generate_music
+    torch = types.ModuleType("torch")
+    torch.nn = types.SimpleNamespace(Module=type("Module", (), {}))
+    modules = {"torch": torch, "acestep": types.ModuleType("acestep"), "acestep.inference": inference}
+
+    manager = ModelResidencyManager()
+    loaded = []
+
+    def load_llm(progress_cb=None):
+        loaded.append("lm")
+        return types.SimpleNamespace(llm_initialized=True)
+
+    def load_dit(progress_cb=None):
+        loaded.append("dit")
+        return types.SimpleNamespace(name="dit")
+
+    with patch.dict(sys.modules, modules), patch.object(
+        ace_step_service, "get_model_residency", return_value=manager
+    ), patch.object(ace_step_service, "_load_dit", side_effect=load_dit), patch.object(
+        ace_step_service, "_load_llm", side_effect=load_llm
+    ):
+        yield seen, loaded, manager
+
+
+def test_generation_without_thinking_leaves_the_lm_alone(fake_acestep):
+    seen, loaded, manager = fake_acestep
+    params = AceStepGenerateParams(prompt="p", lyrics=None, duration=1, thinking=False)
+    samples, sample_rate = generate_waveform(params)
+
+    assert loaded == ["dit"] and seen["llm"] is None and seen["thinking"] is False
+    assert samples.shape == (2, 10) and samples.dtype == np.float32 and sample_rate == 48000
+    assert manager.metrics()["models"]["ace-step-lm"]["state"] == "unloaded"
+
+    generate_waveform(AceStepGenerateParams(prompt="p", lyrics=None, duration=1))
+    assert loaded == ["dit", "lm"] and seen["thinking"] is True
+    assert manager.metrics()["models"]["ace-step-dit"]["in_use"] == 0
@@ -1,14 +1,20 @@
 from __future__ import annotations
 
+import json
 from types import SimpleNamespace
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 import pytest
+from redis.exceptions import WatchError
 from fastapi.testclient import TestClient
 from sqlmodel import Session, select
 
 from app.core.database import engine
 from app.models.user import User
+from app.services import progress_service
+from app.services.image_gen_service import FluxNotInstalledError, RunPodImageStatusResult
+from app.services.runpod_jobs import apply_runpod_status, runpod_webhook_url
+from app.services.runpod_music_service import RunPodStatusResult
 
 
 @pytest.fixture
@@ -54,16 +60,24 @@ def test_music_generate_and_poll_completed(client: TestClient, test_user: tuple[
     def fake_get_task(task_id: str):
         return store.get(task_id)
 
-    settings = SimpleNamespace(music_generation_backend="runpod")
+    def fake_transact_task(task_id: str, apply, *, ttl_seconds: int = 3600):
+        fields, value = apply(store.get(task_id))
+        if fields:
+            fake_update_task(task_id, **fields)
+        return value
+
+    settings = SimpleNamespace(music_generation_backend="runpod", runpod_poll_min_interval_seconds=2.0, runpod_webhook_safety_poll_seconds=60.0)
 
     with patch("app.api.routes.music.get_settings", return_value=settings), \
          patch("app.api.routes.music.init_task", side_effect=fake_init_task), \
          patch("app.api.routes.music.update_task", side_effect=fake_update_task), \
          patch("app.api.routes.music.get_task", side_effect=fake_get_task), \
          patch("app.api.routes.music.submit_runpod_job") as mock_submit, \
-         patch("app.api.routes.music.get_runpod_status") as mock_status:
+         patch("app.api.routes.music.submit_runpod_image_job", side_effect=FluxNotInstalledError("no flux")), \
+         patch("app.api.routes.music.track_runpod_job") as mock_track, \
+         patch("app.services.runpod_jobs.transact_task", side_effect=fake_transact_task), \
+         patch("app.services.runpod_jobs._claim_finalization", return_value=True):
         mock_submit.return_value = SimpleNamespace(runpod_job_id="rp_123", raw={"id": "rp_123"})
-        mock_status.return_value = SimpleNamespace(status="COMPLETED", output_url="https://r2.example.com/out.mp3", raw={})
 
         # Create job
         resp = client.post(
@@ -109,14 +123,28 @@ def test_music_generate_and_poll_completed(client: TestClient, test_user: tuple[
         for k in ("bpm", "lm_temperature", "lm_top_p", "lm_top_k", "lm_cfg_scale", "guidance_scale", "seed"):
             assert submitted[k] is not None
 
-        # Poll status
+        # The job is handed to the server-side poller
+        mock_track.assert_called_once()
+        assert mock_track.call_args.args[0] == job["job_id"]
+
+        # Poller sees RunPod report COMPLETED
+        transition = apply_runpod_status(
+            job["job_id"],
+            music=RunPodStatusResult(status="COMPLETED", output_url="https://r2.example.com/out.mp3", raw={}),
+        )
+        assert transition.status == "finalizing"
+        assert transition.finalize["audio_url"] == "https://r2.example.com/out.mp3"
+        assert transition.finalize["cover_image_url"] is None
+
+        # Status is a plain read of the task state
         resp2 = client.get(
             f"/api/music/status/{job['job_id']}",
             headers={"Authorization": f"Bearer {token}"},
         )
         assert resp2.status_code == 200
         st = resp2.json()
-        assert st["status"] == "completed"
+        assert st["status"] == "running"
+        assert st["message"] == "finalizing"
         assert st["result"]["output_url"] == "https://r2.example.com/out.mp3"
 
         # Verify credits deducted (2)
@@ -124,3 +152,129 @@ def test_music_generate_and_poll_completed(client: TestClient, test_user: tuple[
             u = session.exec(select(User).where(User.id == user.id)).one()
             assert u.credits_balance == 8
 
+
+
+def test_runpod_webhook_rejects_bad_signature(client: TestClient):
+    settings = SimpleNamespace(runpod_webhook_base_url="https://api.example.com", runpod_webhook_secret="s3cret", api_prefix="/api")
+    with patch("app.services.runpod_jobs.get_settings", return_value=settings), \
+         patch("app.api.routes.music.get_task") as mock_get_task:
+        resp = client.post("/api/music/runpod-webhook/job-1/music?sig=deadbeef", json={"id": "rp_1", "status": "COMPLETED"})
+        assert resp.status_code == 403
+        mock_get_task.assert_not_called()
+
+
+def test_runpod_webhook_completes_and_finalizes(client: TestClient):
+    settings = SimpleNamespace(runpod_webhook_base_url="https://api.example.com", runpod_webhook_secret="s3cret", api_prefix="/api")
+    state = {
+        "task_id": "job-1",
+        "user_id": "u1",
+        "status": "running",
+        "progress": 10,
+        "message": "runpod: queued",
+        "payload": {"title": "t"},
+        "result": {"runpod_job_id": "rp_1", "runpod_image_job_id": None, "output_url": None},
+    }
+    mock_update = MagicMock()
+
+    def fake_transact_task(task_id: str, apply, **_kwargs):
+        fields, value = apply(state)
+        if fields:
+            mock_update(task_id, **fields)
+        return value
+
+    with patch("app.services.runpod_jobs.get_settings", return_value=settings), \
+         patch("app.api.routes.music.get_task", return_value=state), \
+         patch("app.services.runpod_jobs.transact_task", side_effect=fake_transact_task), \
+         patch("app.services.runpod_jobs._claim_finalization", return_value=True), \
+         patch("app.api.routes.music.untrack_runpod_job") as mock_untrack, \
+         patch("app.api.routes.music.finalize_runpod_job") as mock_finalize:
+        url = runpod_webhook_url("job-1", "music")
+        assert url.startswith("https://api.example.com/api/music/runpod-webhook/job-1/music?sig=")
+
+        body = {"id": "rp_1", "status": "COMPLETED", "output": {"output_url": "https://r2.example.com/out.mp3"}}
+        resp = client.post(url.replace("https://api.example.com", ""), json=body)
+        assert resp.status_code == 200
+        assert resp.json()["status"] == "finalizing"
+
+        # A callback for some other RunPod job is refused.
+        mismatch = client.post(url.replace("https://api.example.com", ""), json={**body, "id": "rp_other"})
+        assert mismatch.status_code == 400
+
+    assert mock_update.call_args.kwargs["message"] == "finalizing"
+    mock_finalize.assert_called_once()
+    assert mock_finalize.call_args.kwargs["audio_url"] == "https://r2.example.com/out.mp3"
+    mock_untrack.assert_called_once_with("job-1")
+
+
+class FakeTaskPipeline:
+    """WATCH/MULTI/EXEC over one task hash; `interleave` runs before the first EXEC, like a concurrent writer."""
+
+    def __init__(self, store: dict, interleave=None):
+        self.store = store
+        self.interleave = interleave
+        self.queued: list = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def watch(self, key):
+        self.queued = []
+
+    def hgetall(self, key):
+        return {k: json.dumps(v) if k in ("payload", "result") else str(v) for k, v in self.store.items()}
+
+    def multi(self):
+        self.queued = []
+
+    def execute(self):
+        if self.interleave is not None:
+            interleave, self.interleave = self.interleave, None
+            interleave(self.store)
+            raise WatchError("task changed")
+        for fields in self.queued:
+            self.store.update(fields)
+
+
+def test_concurrent_stage_updates_are_not_lost():
+    store = {
+        "task_id": "job-2",
+        "user_id": "u1",
+        "status": "running",
+        "progress": 25,
+        "message": "runpod: music and cover queued",
+        "payload": {"title": "t"},
+        "result": {"runpod_job_id": "rp_m", "runpod_image_job_id": "rp_i", "runpod_status": "IN_QUEUE", "runpod_image_status": "IN_QUEUE"},
+    }
+
+    def image_webhook_lands_first(task: dict):
+        # The cover finished while the music update was being computed from the older state.
+        task["result"] = {**task["result"], "runpod_image_status": "COMPLETED", "cover_image_url": "https://r2.example.com/c.png"}
+
+    pipe = FakeTaskPipeline(store, interleave=image_webhook_lands_first)
+    redis = SimpleNamespace(pipeline=lambda: pipe)
+
+    def write_fields(task_id, fields, *, ttl_seconds, reset=False, client=None):
+        pipe.queued.append(fields)
+
+    with patch.object(progress_service, "get_redis", return_value=redis), \
+         patch.object(progress_service, "_write_fields", side_effect=write_fields), \
+         patch("app.services.runpod_jobs._claim_finalization", return_value=True):
+        transition = apply_runpod_status(
+            "job-2", music=RunPodStatusResult(status="COMPLETED", output_url="https://r2.example.com/out.mp3", raw={})
+        )
+
+    # Retried against the fresh state: both stages are done, so the task finalizes with the cover.
+    assert transition.status == "finalizing"
+    assert transition.finalize["cover_image_url"] == "https://r2.example.com/c.png"
+    assert store["message"] == "finalizing"
+    assert store["result"]["runpod_status"] == "COMPLETED"
+    assert store["result"]["runpod_image_status"] == "COMPLETED"
+
+    # A late duplicate of the cover webhook changes nothing once finalization started.
+    with patch.object(progress_service, "get_redis", return_value=redis), \
+         patch.object(progress_service, "_write_fields", side_effect=write_fields):
+        late = apply_runpod_status("job-2", image=RunPodImageStatusResult(status="COMPLETED", image_url=None, raw={}))
+    assert late.status == "finalizing" and late.finalize is None
@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+from unittest.mock import patch
+
+from app.services.progress_service import ProgressEmitter
+
+
+def test_emitter_coalesces_small_frequent_updates():
+    with patch("app.services.progress_service.update_task") as mock_update:
+        emitter = ProgressEmitter("t1", min_interval_seconds=60.0, min_delta=5)
+
+        assert emitter.emit(status="running", progress=1, message="a") is True  # status change
+        assert emitter.emit(status="running", progress=2, message="b") is False
+        assert emitter.emit(status="running", progress=3, message="c") is False
+        assert emitter.emit(status="running", progress=7, message="d") is True  # delta >= 5
+        assert mock_update.call_count == 2
+        assert mock_update.call_args.kwargs == {"status": "running", "progress": 7, "message": "d"}
+
+        emitter.emit(status="running", progress=8, message="e")
+        emitter.flush()
+        assert mock_update.call_count == 3
+        assert mock_update.call_args.kwargs["message"] == "e"
+
+        # Nothing pending: flush is a no-op.
+        emitter.flush()
+        assert mock_update.call_count == 3
+
+
+def test_emitter_always_writes_terminal_state():
+    with patch("app.services.progress_service.update_task") as mock_update:
+        emitter = ProgressEmitter("t1", min_interval_seconds=60.0, min_delta=50)
+        emitter.emit(status="running", progress=10, message="gen")
+        emitter.emit(status="running", progress=11, message="gen")
+        assert emitter.emit(status="completed", progress=100, message="completed", result={"song_id": "s"}) is True
+        assert mock_update.call_args.kwargs == {
+            "status": "completed",
+            "progress": 100,
+            "message": "completed",
+            "result": {"song_id": "s"},
+        }
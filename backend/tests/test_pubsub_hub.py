@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import asyncio
+from unittest.mock import patch
+
+from app.core.pubsub_hub import PubSubHub
+
+
+class FakeRedisPubSub:
+    async def psubscribe(self, *patterns):
+        return None
+
+    async def get_message(self, ignore_subscribe_messages: bool = False, timeout: float | None = 0.0):
+        await asyncio.sleep(timeout or 0)
+        return None
+
+    async def aclose(self):
+        return None
+
+
+class FakeRedis:
+    def pubsub(self, **kwargs):
+        return FakeRedisPubSub()
+
+
+def _is_terminal(state: dict) -> bool:
+    return state.get("status") in ("completed", "failed")
+
+
+def test_hub_drops_intermediate_frames_but_keeps_terminal():
+    async def scenario():
+        hub = PubSubHub(prefix="gen-events:", max_frames=3, is_terminal=_is_terminal)
+        sub = await hub.subscribe("t1")
+
+        for pct in range(10):
+            hub.publish_local("t1", {"status": "running", "progress": pct})
+        hub.publish_local("t1", {"status": "completed", "progress": 100})
+
+        frames = []
+        while (frame := await sub.get(timeout=0.01)) is not None:
+            frames.append(frame)
+
+        assert frames[-1]["status"] == "completed"
+        assert len(frames) == 3
+        # Latest intermediate frames win over older ones.
+        assert [f["progress"] for f in frames[:-1]] == [8, 9]
+        assert hub.metrics()["dropped_frames"] == 8
+
+        await sub.aclose()
+
+    with patch("app.core.pubsub_hub.get_redis_async", return_value=FakeRedis()):
+        asyncio.run(scenario())
+
+
+def test_hub_reference_counts_subscribers():
+    async def scenario():
+        hub = PubSubHub(prefix="gen-events:", is_terminal=_is_terminal)
+        a = await hub.subscribe("t1")
+        b = await hub.subscribe("t1")
+        c = await hub.subscribe("t2")
+        assert hub.metrics()["keys"] == 2
+        assert hub.metrics()["subscribers"] == 3
+        assert hub.metrics()["running"] is True
+
+        hub.publish_local("t1", {"status": "running", "progress": 5})
+        assert (await a.get(timeout=0.01))["progress"] == 5
+        assert (await b.get(timeout=0.01))["progress"] == 5
+        assert await c.get(timeout=0.01) is None
+
+        await a.aclose()
+        await b.aclose()
+        assert hub.metrics()["keys"] == 1
+        await c.aclose()
+        assert hub.metrics()["subscribers"] == 0
+        assert hub.metrics()["running"] is False
+
+    with patch("app.core.pubsub_hub.get_redis_async", return_value=FakeRedis()):
+        asyncio.run(scenario())
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import hmac
+import json
+import time
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from fastapi.testclient import TestClient
+
+from app.services.image_gen_service import RunPodImageStatusResult
+from app.services.replicate_jobs import finalize_replicate_job, verify_replicate_webhook
+
+_SECRET_BYTES = b"replicate-test-secret"
+_SETTINGS = SimpleNamespace(
+    replicate_webhook_base_url="https://api.example.com",
+    replicate_webhook_secret="whsec_" + base64.b64encode(_SECRET_BYTES).decode(),
+    api_prefix="/api",
+)
+
+
+def _signed_headers(body: str, *, webhook_id: str = "msg_1", timestamp: int | None = None) -> dict:
+    ts = str(timestamp if timestamp is not None else int(time.time()))
+    digest = hmac.new(_SECRET_BYTES, f"{webhook_id}.{ts}.{body}".encode(), hashlib.sha256).digest()
+    return {
+        "webhook-id": webhook_id,
+        "webhook-timestamp": ts,
+        "webhook-signature": "v1," + base64.b64encode(digest).decode(),
+        "content-type": "application/json",
+    }
+
+
+def test_verify_replicate_webhook_signature():
+    body = json.dumps({"id": "p1", "status": "succeeded"})
+    with patch("app.services.replicate_jobs.get_settings", return_value=_SETTINGS):
+        assert verify_replicate_webhook(_signed_headers(body), body) is True
+        # Tampered body, stale timestamp and missing headers are all rejected.
+        assert verify_replicate_webhook(_signed_headers(body), body.replace("p1", "p2")) is False
+        assert verify_replicate_webhook(_signed_headers(body, timestamp=int(time.time()) - 3600), body) is False
+        assert verify_replicate_webhook({}, body) is False
+
+
+def test_replicate_webhook_schedules_finalization(client: TestClient):
+    state = {
+        "task_id": "job-r",
+        "user_id": "u1",
+        "status": "running",
+        "progress": 10,
+        "message": "replicate: running prediction",
+        "payload": {"title": "t", "audio_format": "mp3"},
+        "result": {"generation_backend": "replicate", "replicate_prediction_id": "p1", "runpod_image_job_id": None},
+    }
+    body = json.dumps({"id": "p1", "status": "succeeded", "output": ["https://replicate.delivery/out.mp3"]})
+
+    with patch("app.services.replicate_jobs.get_settings", return_value=_SETTINGS), \
+         patch("app.api.routes.music.get_task", return_value=state), \
+         patch("app.services.replicate_jobs.update_task") as mock_update, \
+         patch("app.services.replicate_jobs._claim_finalization", return_value=True), \
+         patch("app.api.routes.music.finalize_replicate_job") as mock_finalize:
+        bad = client.post("/api/music/replicate-webhook/job-r", content=body, headers={"content-type": "application/json"})
+        assert bad.status_code == 403
+
+        resp = client.post("/api/music/replicate-webhook/job-r", content=body, headers=_signed_headers(body))
+        assert resp.status_code == 200
+
+    assert mock_update.call_args.kwargs["message"] == "finalizing"
+    mock_finalize.assert_called_once()
+    assert mock_finalize.call_args.kwargs["output_url"] == "https://replicate.delivery/out.mp3"
+    assert mock_finalize.call_args.kwargs["job_id"] == "job-r"
+
+
+def test_finalize_waits_for_a_running_cover_job():
+    settings = SimpleNamespace(replicate_cover_wait_seconds=60, runpod_poll_min_interval_seconds=2.0, runpod_poll_max_interval_seconds=30.0)
+    statuses = iter(
+        [
+            RunPodImageStatusResult(status="IN_QUEUE", image_url=None, raw={}),
+            RunPodImageStatusResult(status="IN_PROGRESS", image_url=None, raw={}),
+            RunPodImageStatusResult(status="COMPLETED", image_url="https://runpod.example.com/c.png", raw={}),
+        ]
+    )
+    storage = SimpleNamespace(copy_url_to_r2=lambda *a: SimpleNamespace(url="https://r2.example.com/a.mp3"))
+    with patch("app.services.replicate_jobs.get_settings", return_value=settings), \
+         patch("app.services.replicate_jobs.get_storage", return_value=storage), \
+         patch("app.services.replicate_jobs.update_task"), \
+         patch("app.services.replicate_jobs.get_runpod_image_status", side_effect=lambda **_: next(statuses)), \
+         patch("app.services.replicate_jobs.time.sleep") as mock_sleep, \
+         patch("app.services.replicate_jobs.finalize_runpod_job") as mock_finalize:
+        finalize_replicate_job(job_id="job-c", user_id="u1", output_url="https://replicate.example.com/a.mp3", runpod_image_job_id="rp_i", payload={})
+
+    assert [c.args[0] for c in mock_sleep.call_args_list] == [2.0, 4.0]
+    assert mock_finalize.call_args.kwargs["cover_image_url"] == "https://runpod.example.com/c.png"
@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+import asyncio
+from unittest.mock import patch
+
+from app.services.runpod_jobs import INFLIGHT_KEY, RunPodJobTransition
+from app.services.runpod_poller import RunPodPoller
+
+
+class FakeAsyncRedis:
+    def __init__(self):
+        self.kv: dict[str, str] = {}
+        self.zsets: dict[str, dict[str, float]] = {}
+
+    async def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.kv:
+            return None
+        self.kv[key] = value
+        return True
+
+    async def delete(self, key):
+        self.kv.pop(key, None)
+
+    async def zadd(self, key, mapping, xx=False):
+        z = self.zsets.setdefault(key, {})
+        for member, score in mapping.items():
+            if xx and member not in z:
+                continue
+            z[member] = score
+
+    async def zrem(self, key, member):
+        self.zsets.get(key, {}).pop(member, None)
+
+    async def zrangebyscore(self, key, lo, hi, start=0, num=None):
+        members = sorted((s, m) for m, s in self.zsets.get(key, {}).items() if lo <= s <= hi)
+        return [m for _, m in members][start:start + num if num else None]
+
+
+def test_poller_backs_off_while_status_is_unchanged():
+    poller = RunPodPoller(min_interval_seconds=2.0, max_interval_seconds=5.0, backoff_factor=2.0)
+    assert poller._next_interval("j", "IN_QUEUE/-") == 2.0
+    assert poller._next_interval("j", "IN_QUEUE/-") == 4.0
+    assert poller._next_interval("j", "IN_QUEUE/-") == 5.0
+    # Any change in what RunPod reports resets to the fast interval.
+    assert poller._next_interval("j", "IN_PROGRESS/-") == 2.0
+
+
+def test_poller_finalizes_and_untracks_completed_job():
+    redis = FakeAsyncRedis()
+    redis.zsets[INFLIGHT_KEY] = {"done": 0, "pending": 0}
+    finalize_kwargs = {"job_id": "done", "user_id": "u", "audio_url": "https://r2/x.mp3", "cover_image_url": None, "payload": {}}
+
+    async def fake_check(self, job_id):
+        if job_id == "done":
+            return RunPodJobTransition(status="finalizing", signature="COMPLETED/-", finalize=finalize_kwargs)
+        return RunPodJobTransition(status="running", signature="IN_QUEUE/-")
+
+    async def scenario():
+        poller = RunPodPoller(min_interval_seconds=2.0)
+        assert await poller.poll_due_once() == 2
+        await asyncio.gather(*poller._tasks)
+        return poller
+
+    with patch("app.services.runpod_poller.get_redis_async", return_value=redis), \
+         patch.object(RunPodPoller, "_check", fake_check), \
+         patch("app.services.runpod_poller.finalize_runpod_job") as mock_finalize:
+        poller = asyncio.run(scenario())
+
+    mock_finalize.assert_called_once_with(**finalize_kwargs)
+    assert "done" not in redis.zsets[INFLIGHT_KEY]
+    # Still-running job is rescheduled into the future and its lease released.
+    assert redis.zsets[INFLIGHT_KEY]["pending"] > 0
+    assert not any(k.startswith("runpod-poll-lease:") for k in redis.kv)
+    assert poller.metrics()["finalized"] == 1
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import time
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import get_settings
+from app.services.signed_url_cache import SignedUrl, SignedUrlCache
+
+
+class FakeRedis:
+    def __init__(self):
+        self.kv: dict[str, str] = {}
+        self.ttls: dict[str, int] = {}
+
+    def get(self, key):
+        return self.kv.get(key)
+
+    def set(self, key, value, ex=None):
+        self.kv[key] = value
+        self.ttls[key] = ex
+
+    def delete(self, key):
+        self.kv.pop(key, None)
+
+
+@pytest.fixture
+def fake_redis():
+    fake = FakeRedis()
+    with patch("app.services.signed_url_cache.get_redis", return_value=fake):
+        yield fake
+
+
+def _signer():
+    calls = []
+
+    def sign(key, *, ttl_seconds):
+        calls.append(key)
+        return f"https://r2.example.com/{key}?sig={len(calls)}"
+
+    return sign, calls
+
+
+def test_cache_reuses_url_until_margin_and_shares_via_redis(fake_redis):
+    sign, calls = _signer()
+    with patch("app.services.signed_url_cache.get_signed_url", side_effect=sign):
+        first = SignedUrlCache().get("audio/a.mp3")
+        assert SignedUrlCache().get("audio/a.mp3").url == first.url  # second process: Redis hit
+        cache = SignedUrlCache()
+        cache.get("audio/a.mp3")
+        cache.get("audio/a.mp3")
+    assert calls == ["audio/a.mp3"]
+    # Redis entry expires at the safety margin, not at the URL's own expiry.
+    assert fake_redis.ttls["signed-url:audio/a.mp3"] == first.max_age(now=first.expires_at - get_settings().signed_url_ttl_seconds)
+    assert first.cache_control().startswith("private, max-age=")
+
+
+def test_cache_resigns_inside_safety_margin(fake_redis):
+    sign, calls = _signer()
+    cache = SignedUrlCache()
+    with patch("app.services.signed_url_cache.get_signed_url", side_effect=sign):
+        first = cache.get("audio/a.mp3")
+        with patch("app.services.signed_url_cache.time.time", return_value=first.expires_at - 10):
+            fake_redis.kv.clear()
+            second = cache.get("audio/a.mp3")
+    assert second.url != first.url
+    assert len(calls) == 2
+
+
+def test_invalidate_drops_both_tiers(fake_redis):
+    sign, calls = _signer()
+    cache = SignedUrlCache()
+    with patch("app.services.signed_url_cache.get_signed_url", side_effect=sign):
+        first = cache.get("audio/a.mp3")
+        cache.invalidate("audio/a.mp3")
+        assert "signed-url:audio/a.mp3" not in fake_redis.kv
+        assert cache.get("audio/a.mp3").url != first.url
+    assert len(calls) == 2
+
+
+def test_files_redirect_carries_cache_control(client: TestClient):
+    signed = SignedUrl(url="https://r2.example.com/audio/a.mp3?sig=1", expires_at=time.time() + 3600)
+    with patch("app.api.routes.files.get_storage", return_value=object()), \
+         patch("app.api.routes.files.get_cached_signed_url_async", return_value=signed):
+        resp = client.get("/api/files/a.mp3", follow_redirects=False)
+    assert resp.status_code == 307
+    assert resp.headers["location"] == signed.url
+    assert resp.headers["cache-control"].startswith("private, max-age=")
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import pytest
+from sqlmodel import Session
+
+from app.core.database import engine
+from app.models.share import Share
+from app.models.song import Song
+from app.services.content_store import GC_CANDIDATES_KEY
+from app.services.storage_gc import StorageGarbageCollector
+
+NOW = datetime.now(timezone.utc)
+OLD = NOW - timedelta(days=10)
+
+
+class FakePaginator:
+    def __init__(self, objects):
+        self.objects = objects
+
+    def paginate(self, *, Bucket, Prefix, Delimiter=None, PaginationConfig=None):
+        keys = sorted(k for k in self.objects if k.startswith(Prefix))
+        if Delimiter:
+            prefixes = sorted({Prefix + k[len(Prefix):].split(Delimiter, 1)[0] + Delimiter for k in keys if Delimiter in k[len(Prefix):]})
+            yield {"CommonPrefixes": [{"Prefix": p} for p in prefixes]}
+            return
+        # Two objects per page to exercise pagination.
+        for i in range(0, len(keys), 2):
+            yield {"Contents": [{"Key": k, "LastModified": self.objects[k], "Size": 10} for k in keys[i : i + 2]]}
+
+
+class FakeS3:
+    def __init__(self, objects):
+        self.objects = dict(objects)
+        self.delete_calls = []
+
+    def get_paginator(self, name):
+        return FakePaginator(self.objects)
+
+    def head_object(self, *, Bucket, Key):
+        from botocore.exceptions import ClientError
+
+        if Key not in self.objects:
+            raise ClientError({"Error": {"Code": "404"}}, "HeadObject")
+        return {"LastModified": self.objects[Key], "ContentLength": 10}
+
+    def delete_objects(self, *, Bucket, Delete):
+        keys = [o["Key"] for o in Delete["Objects"]]
+        self.delete_calls.append(keys)
+        for k in keys:
+            self.objects.pop(k, None)
+        return {}
+
+
+class FakeRedis:
+    def __init__(self):
+        self.kv = {}
+        self.zsets = {}
+
+    def set(self, key, value, nx=False, ex=None):
+        if nx and key in self.kv:
+            return None
+        self.kv[key] = value
+        return True
+
+    def get(self, key):
+        return self.kv.get(key)
+
+    def delete(self, key):
+        self.kv.pop(key, None)
+
+    def hget(self, name, key):
+        return None
+
+    def zrange(self, name, start, end):
+        return sorted(self.zsets.get(name, {}))
+
+    def zrem(self, name, *keys):
+        for k in keys:
+            self.zsets.get(name, {}).pop(k, None)
+
+
+@pytest.fixture
+def gc_env():
+    today = NOW.date()
+    s3 = FakeS3(
+        {
+            f"songs/{(today - timedelta(days=10)).isoformat()}/live.mp3": OLD,
+            f"songs/{(today - timedelta(days=10)).isoformat()}/orphan.mp3": OLD,
+            f"songs/{today.isoformat()}/in-flight.mp3": NOW,
+            f"image/{(today - timedelta(days=10)).isoformat()}/orphan.png": OLD,
+            "avatars/old.png": OLD,
+            "audio/file.wav": OLD,
+        }
+    )
+    redis = FakeRedis()
+    redis.zsets[GC_CANDIDATES_KEY] = {"avatars/old.png": 1.0, "avatars/gone.png": 1.0}
+    referenced = {f"songs/{(today - timedelta(days=10)).isoformat()}/live.mp3", "audio/file.wav"}
+    storage = SimpleNamespace(client=s3)
+    with patch("app.services.storage_gc.get_r2_storage", return_value=storage), \
+         patch("app.services.storage_gc._get_r2_config", return_value=("", "", "", "bucket", "")), \
+         patch("app.services.storage_gc.get_redis", return_value=redis), \
+         patch("app.services.storage_gc.invalidate_signed_url"), \
+         patch.object(StorageGarbageCollector, "referenced_keys", return_value=referenced):
+        yield s3, redis
+
+
+def test_dry_run_reports_without_deleting(gc_env):
+    s3, redis = gc_env
+    report = StorageGarbageCollector(grace=timedelta(hours=48), dry_run=True).run()
+
+    assert sorted(report.orphans) == sorted(
+        [k for k in s3.objects if k.endswith("orphan.mp3") or k.endswith("orphan.png")] + ["avatars/old.png"]
+    )
+    assert report.recent == 1  # today's in-flight upload is inside the grace period
+    assert s3.delete_calls == []
+    assert not any(k.startswith("storage-gc-cursor") for k in redis.kv)
+
+
+def test_live_run_deletes_in_batches_and_advances_cursor(gc_env):
+    s3, redis = gc_env
+    report = StorageGarbageCollector(grace=timedelta(hours=48)).run()
+
+    assert report.deleted == 3
+    assert len(s3.delete_calls) == 1
+    assert "audio/file.wav" in s3.objects and any(k.endswith("live.mp3") for k in s3.objects)
+    assert redis.zsets[GC_CANDIDATES_KEY] == {}
+    assert redis.kv["storage-gc-cursor:songs/"] == (NOW.date() - timedelta(days=10)).isoformat()
+
+    # The next incremental run skips partitions before the cursor and still sees today's upload.
+    second = StorageGarbageCollector(grace=timedelta(hours=48)).run()
+    assert f"songs/{NOW.date().isoformat()}/" in second.prefixes
+    assert second.orphans == []
+
+
+def test_share_posters_are_referenced(test_user):
+    user, _token = test_user
+    storage = SimpleNamespace(public_url=lambda key: f"https://cdn.example.com/{key}")
+    with Session(engine) as db:
+        song = Song(user_id=user.id, prompt="p")
+        db.add(song)
+        db.commit()
+        share = Share(
+            song_id=song.id,
+            user_id=user.id,
+            slug=f"poster-{song.id.hex[:8]}",
+            poster_url="https://cdn.example.com/image/2024-01-01/poster.png",
+        )
+        db.add(share)
+        db.commit()
+        song_id, share_id = song.id, share.id
+
+    try:
+        with patch("app.services.storage_gc.get_r2_storage", return_value=storage), \
+             patch("app.services.storage_gc._get_r2_config", return_value=("", "", "", "bucket", "")):
+            keys = StorageGarbageCollector(grace=timedelta(hours=48)).referenced_keys()
+        assert "image/2024-01-01/poster.png" in keys
+    finally:
+        with Session(engine) as db:
+            db.delete(db.get(Share, share_id))
+            db.commit()
+            db.delete(db.get(Song, song_id))
+            db.commit()
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import hashlib
+import io
+from unittest.mock import patch
+
+import pytest
+
+from app.services.storage_service import StorageService, UploadTooLargeError
+
+MiB = 1024 * 1024
+
+
+class FakeS3Client:
+    def __init__(self, fail_on_part: int | None = None):
+        self.fail_on_part = fail_on_part
+        self.put = None
+        self.parts: list[tuple[int, int]] = []
+        self.completed = None
+        self.aborted = False
+
+    def put_object(self, *, Bucket, Key, Body, ContentType):
+        self.put = (Key, len(Body), ContentType)
+
+    def create_multipart_upload(self, *, Bucket, Key, ContentType):
+        return {"UploadId": "up-1"}
+
+    def upload_part(self, *, Bucket, Key, UploadId, PartNumber, Body):
+        if PartNumber == self.fail_on_part:
+            raise IOError("boom")
+        self.parts.append((PartNumber, len(Body)))
+        return {"ETag": f'"etag-{PartNumber}"'}
+
+    def complete_multipart_upload(self, *, Bucket, Key, UploadId, MultipartUpload):
+        self.completed = MultipartUpload["Parts"]
+
+    def abort_multipart_upload(self, *, Bucket, Key, UploadId):
+        self.aborted = True
+
+
+@pytest.fixture
+def r2_env(monkeypatch):
+    monkeypatch.setenv("R2_ENDPOINT", "https://r2.example.com")
+    monkeypatch.setenv("R2_ACCESS_KEY", "ak")
+    monkeypatch.setenv("R2_SECRET_KEY", "sk")
+    monkeypatch.setenv("R2_BUCKET_NAME", "bucket")
+    monkeypatch.setenv("R2_PUBLIC_URL", "https://cdn.example.com")
+
+
+def _chunks(total: int, size: int = 64 * 1024):
+    sent = 0
+    while sent < total:
+        n = min(size, total - sent)
+        yield b"\0" * n
+        sent += n
+
+
+def test_stream_upload_uses_multipart_for_large_streams(r2_env):
+    fake = FakeS3Client()
+    with patch("app.services.storage_service._r2_client", return_value=fake):
+        stored = StorageService().upload_stream_to_r2(_chunks(20 * MiB), ".wav", "audio/wav")
+
+    assert stored.key.startswith("songs/") and stored.key.endswith(".wav")
+    assert stored.url == f"https://cdn.example.com/{stored.key}"
+    assert fake.put is None
+    assert sorted(fake.parts) == [(1, 8 * MiB), (2, 8 * MiB), (3, 4 * MiB)]
+    assert fake.completed == [{"PartNumber": i, "ETag": f'"etag-{i}"'} for i in (1, 2, 3)]
+
+
+def test_stream_upload_small_payload_is_single_put(r2_env):
+    fake = FakeS3Client()
+    with patch("app.services.storage_service._r2_client", return_value=fake):
+        StorageService().upload_stream_to_r2(_chunks(300 * 1024), ".mp3", "audio/mpeg")
+
+    assert fake.put[1:] == (300 * 1024, "audio/mpeg")
+    assert fake.parts == []
+
+
+def test_stream_upload_aborts_on_failure(r2_env):
+    fake = FakeS3Client(fail_on_part=2)
+    with patch("app.services.storage_service._r2_client", return_value=fake):
+        with pytest.raises(RuntimeError):
+            StorageService().upload_stream_to_r2(_chunks(20 * MiB), ".wav", "audio/wav")
+    assert fake.aborted is True
+    assert fake.completed is None
+
+
+def test_large_bytes_upload_uses_parallel_multipart(r2_env):
+    calls = {}
+
+    class FakeTransferClient:
+        def upload_fileobj(self, fileobj, bucket, key, ExtraArgs, Config):
+            calls["size"] = len(fileobj.read())
+            calls["extra"] = ExtraArgs
+            calls["concurrency"] = Config.max_concurrency
+
+        def put_object(self, **kwargs):
+            calls["put"] = kwargs["Key"]
+
+    with patch("app.services.storage_service._r2_client", return_value=FakeTransferClient()):
+        storage = StorageService()
+        storage.store_bytes(content=b"x" * (17 * MiB), suffix=".wav", content_type="audio/wav")
+        assert calls["size"] == 17 * MiB
+        assert calls["extra"] == {"ContentType": "audio/wav"}
+        assert calls["concurrency"] >= 1
+        assert "put" not in calls
+
+        storage.store_bytes(content=b"x" * 1024, suffix=".png", content_type="image/png")
+        assert calls["put"].endswith(".png")
+
+
+def test_storage_service_reuses_one_client(r2_env):
+    storage = StorageService()
+    with patch("app.services.storage_service.boto3.client", side_effect=lambda *a, **k: object()) as mock_client:
+        first = storage.client
+        assert storage.client is first
+    assert mock_client.call_count == 1
+    assert mock_client.call_args.kwargs["config"].max_pool_connections >= 10
+
+
+def test_store_stream_hashes_and_uploads_in_parts(r2_env):
+    fake = FakeS3Client()
+    payload = bytes(range(256)) * (70 * 1024)  # 17.5 MiB
+    with patch("app.services.storage_service._r2_client", return_value=fake):
+        stored = StorageService().store_stream(io.BytesIO(payload), suffix=".bin", folder="files")
+
+    assert stored.key.startswith("files/")
+    assert stored.size == len(payload)
+    assert stored.sha256 == hashlib.sha256(payload).hexdigest()
+    assert sum(size for _, size in fake.parts) == len(payload)
+    assert fake.completed is not None
+
+
+def test_store_stream_enforces_max_bytes(r2_env):
+    fake = FakeS3Client()
+    with patch("app.services.storage_service._r2_client", return_value=fake):
+        storage = StorageService()
+        with pytest.raises(UploadTooLargeError):
+            storage.store_stream(io.BytesIO(b"\0" * (20 * MiB)), suffix=".bin", max_bytes=12 * MiB)
+        with pytest.raises(ValueError):
+            storage.store_stream(io.BytesIO(b""), suffix=".bin")
+    assert fake.aborted is True
+    assert fake.completed is None
@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+from unittest.mock import patch
+
+import numpy as np
+from fastapi.testclient import TestClient
+from sqlmodel import Session
+
+from app.core.database import engine
+from app.models.song import Song
+from app.services.local_storage import LocalStorageBackend
+from app.services.waveform import compute_peaks, decode_dat, encode_dat, waveform_url
+
+
+def test_compute_peaks_matches_per_window_min_max():
+    rng = np.random.default_rng(0)
+    samples = rng.integers(-32768, 32767, size=10_001, dtype=np.int16)
+    spp, peaks = compute_peaks(samples, 100)
+
+    assert spp == 101 and peaks.shape == (100, 2) and peaks.dtype == np.int8
+    for i in (0, 57, 99):
+        window = samples[i * spp : (i + 1) * spp]
+        assert peaks[i, 0] == window.min() >> 8
+        assert peaks[i, 1] == window.max() >> 8
+
+    assert compute_peaks(samples[:10], 100)[1].shape == (10, 2)
+    assert compute_peaks(np.zeros(0, dtype=np.int16), 100)[1].shape == (0, 2)
+
+
+def test_dat_blob_round_trips_with_audiowaveform_header():
+    peaks = np.array([[-128, 127], [-3, 4]], dtype=np.int8)
+    blob = encode_dat(peaks, sample_rate=22050, samples_per_pixel=512)
+
+    assert len(blob) == 20 + 4
+    assert blob[:4] == (1).to_bytes(4, "little")  # version
+    assert blob[4:8] == (1).to_bytes(4, "little")  # 8-bit flag
+    sample_rate, spp, decoded = decode_dat(blob)
+    assert (sample_rate, spp) == (22050, 512)
+    assert np.array_equal(decoded, peaks)
+
+
+def test_waveform_endpoint_serves_blob(client: TestClient, test_user, tmp_path):
+    user, token = test_user
+    storage = LocalStorageBackend(str(tmp_path))
+    blob = encode_dat(np.zeros((256, 2), dtype=np.int8), sample_rate=22050, samples_per_pixel=100)
+    url = storage.put_bytes("audio/x/peaks/256.dat", blob, "application/octet-stream")
+    with Session(engine) as db:
+        song = Song(user_id=user.id, prompt="p", waveform={"sample_rate": 22050, "peaks": {"256": url}})
+        db.add(song)
+        db.commit()
+        song_id = song.id
+    assert waveform_url({"peaks": {"1024": "b", "256": "a"}}) == "a"
+
+    try:
+        with patch("app.api.routes.songs.get_storage", return_value=storage):
+            assert client.get(f"/api/songs/{song_id}/waveform").status_code == 404  # private, anonymous
+            resp = client.get(f"/api/songs/{song_id}/waveform", headers={"Authorization": f"Bearer {token}"})
+            assert resp.status_code == 200
+            assert resp.content == blob
+            assert resp.headers["cache-control"] == "private, max-age=86400"
+            missing = client.get(
+                f"/api/songs/{song_id}/waveform?points=4096", headers={"Authorization": f"Bearer {token}"}
+            )
+            assert missing.status_code == 404
+    finally:
+        with Session(engine) as db:
+            db.delete(db.get(Song, song_id))
+            db.commit()
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import fnmatch
+import json
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import get_settings
+from app.services import worker_readiness, worker_registry
+from app.services.ace_step_service import AceStepNotInstalledError
+from app.services.worker_readiness import WorkerReadiness
+from app.services.worker_registry import READY_KEY, generation_worker_available, readiness_summary, record_worker
+
+
+class FakeRedis:
+    def __init__(self):
+        self.store: dict[str, str] = {}
+        self.ttls: dict[str, int] = {}
+        self.zsets: dict[str, dict[str, float]] = {}
+
+    def set(self, key, value, ex=None):
+        self.store[key] = value
+        self.ttls[key] = ex
+
+    def delete(self, key):
+        self.store.pop(key, None)
+
+    def scan_iter(self, match="*", count=None):
+        return [k for k in self.store if fnmatch.fnmatch(k, match)]
+
+    def mget(self, keys):
+        return [self.store.get(k) for k in keys]
+
+    def zadd(self, name, mapping):
+        self.zsets.setdefault(name, {}).update(mapping)
+
+    def zrem(self, name, *members):
+        for member in members:
+            self.zsets.get(name, {}).pop(member, None)
+
+    def zremrangebyscore(self, name, low, high):
+        zset = self.zsets.get(name, {})
+        for member, score in list(zset.items()):
+            if float(low) <= score <= float(high):
+                del zset[member]
+
+    def zcount(self, name, low, high):
+        return sum(1 for score in self.zsets.get(name, {}).values() if float(low) <= score <= float(high))
+
+
+class StubHandler:
+    def __init__(self):
+        self.generations = []
+
+    def generate(self, params, progress_cb=None):
+        self.generations.append(params.duration)
+        return None, params.sample_rate
+
+
+@pytest.fixture
+def redis():
+    fake = FakeRedis()
+    with patch.object(worker_registry, "get_redis", return_value=fake):
+        yield fake
+
+
+def _state(redis: FakeRedis, name: str) -> dict:
+    return json.loads(redis.store[f"worker-ready:{name}"])
+
+
+def test_in_process_warm_up_loads_models_before_publishing_ready(redis):
+    stub = StubHandler()
+    with patch("app.services.ace_step_service._ensure_handlers_initialized", return_value=(stub, None)) as init, patch(
+        "app.services.ace_step_service.generate_waveform", side_effect=stub.generate
+    ), patch.object(get_settings(), "worker_warmup_generation_seconds", 2):
+        readiness = WorkerReadiness("w1")
+        fields = readiness.warm_up()
+
+    init.assert_called_once()
+    assert stub.generations == [2]  # one throwaway generation to warm kernels
+    assert fields["status"] == "ready" and fields["model"] == "loaded"
+    state = _state(redis, "w1")
+    assert state["status"] == "ready" and state["inference"] == "inprocess"
+    assert redis.ttls["worker-ready:w1"] == get_settings().worker_readiness_ttl_seconds
+
+    assert READY_KEY in redis.zsets and "w1" in redis.zsets[READY_KEY]
+
+    readiness.stop()
+    assert redis.store == {} and redis.zsets[READY_KEY] == {}
+
+
+def test_missing_ace_step_is_ready_with_fallback_and_errors_are_reported(redis):
+    with patch(
+        "app.services.ace_step_service._ensure_handlers_initialized", side_effect=AceStepNotInstalledError("no torch")
+    ):
+        WorkerReadiness("fallback").warm_up()
+    with patch("app.services.ace_step_service._ensure_handlers_initialized", side_effect=OSError("disk")):
+        WorkerReadiness("broken").warm_up()
+
+    assert _state(redis, "fallback")["model"] == "fallback"
+    assert _state(redis, "broken")["error"] == "disk"
+    summary = readiness_summary()
+    assert (summary["ready"], summary["error"], summary["warming"]) == (1, 1, 0)
+    assert [w["worker"] for w in summary["workers"]] == ["broken", "fallback"]
+
+
+def test_sidecar_mode_waits_for_sidecar(redis):
+    pongs = iter([{"ready": False, "model": None, "error": None}, {"ready": True, "model": "loaded", "error": None}])
+    with patch.object(get_settings(), "ace_step_inference", "sidecar"), patch.object(
+        worker_readiness, "ping", side_effect=lambda: next(pongs)
+    ):
+        readiness = WorkerReadiness("w2")
+        readiness._stop.wait = lambda timeout: False  # don't sleep between polls
+        fields = readiness.warm_up()
+    assert (fields["status"], fields["model"]) == ("ready", "loaded")
+
+
+def test_generate_requires_ready_worker_when_configured(client: TestClient, test_user, redis):
+    assert generation_worker_available()
+    _, token = test_user
+    with patch.object(get_settings(), "generation_require_ready_worker", True):
+        assert not generation_worker_available()
+        resp = client.post(
+            "/api/generate",
+            json={"mode": "custom", "caption": "p", "lyrics": "la"},
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        assert resp.status_code == 503
+
+        record_worker("w3", {"worker": "w3", "status": "warming"}, ttl=60)
+        assert not generation_worker_available()
+        record_worker("w3", {"worker": "w3", "status": "ready"}, ttl=60)
+        assert generation_worker_available()
+        redis.zsets[READY_KEY]["w3"] = 0.0  # its heartbeat lapsed
+        assert not generation_worker_available()
+
+
+def test_shutdown_signals_release_resources_idempotently(redis):
+    from app import worker
+
+    readiness = WorkerReadiness("host:2")
+    readiness.publish(status="ready")
+    with patch.object(worker, "_readiness", readiness), \
+         patch.object(worker, "close_http_clients") as mock_close, \
+         patch.object(worker, "shutdown_variant_pool") as mock_pool:
+        # A prefork child receives both worker_process_shutdown and worker_shutdown.
+        worker.worker_process_shutdown.send(sender=None, pid=1, exitcode=0)
+        worker.worker_shutdown.send(sender=None)
+        assert worker._readiness is None
+    assert "worker-ready:host:2" not in redis.store
+    assert mock_close.call_count == 2 and mock_pool.call_count == 2